@@ -1,10 +1,12 @@
 # multi_platform_query_system_v2.py
 import re
 import json
+import math
 import time
 import os
-import pandas as pd
-import numpy as np
+import sys
+import random
+import threading
 import configparser
 import concurrent.futures
 from datetime import datetime, timedelta
@@ -12,14 +14,16 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple, Union
 import requests
 from requests import Session
-from bs4 import BeautifulSoup
 from colorama import Fore, init, Style, Back
-from openpyxl import Workbook
-from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 import warnings
 import logging
-from fake_useragent import UserAgent
+
+# 账单统一规范（字段、转换、存储、导出）与 可用/ 下的查账脚本共用一份实现
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / '可用'))
+from 账单规范 import BILL_DB_PATH, convert_bills, save_bills, write_bill_sheet
+
+# pandas / bs4 / openpyxl / fake_useragent 较重，只在用到的代码路径中延迟导入，
+# 只查余额时无需加载，缩短启动时间
 
 warnings.filterwarnings('ignore')
 
@@ -27,6 +31,65 @@ warnings.filterwarnings('ignore')
 init(autoreset=True)
 
 
+# ======================== 启动优化工具 ========================
+# 内置UA列表：fake_useragent 不可用时使用
+STATIC_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) Gecko/20100101 Firefox/133.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.6 Safari/605.1.15",
+]
+
+_ua_lock = threading.Lock()
+_ua_instance = None
+_ua_loaded = False
+
+
+def random_user_agent() -> str:
+    """返回随机UA；fake_useragent 数据集每个进程只加载一次"""
+    global _ua_instance, _ua_loaded
+    if not _ua_loaded:
+        with _ua_lock:
+            if not _ua_loaded:
+                try:
+                    from fake_useragent import UserAgent
+                    _ua_instance = UserAgent()
+                except Exception:
+                    _ua_instance = None
+                _ua_loaded = True
+
+    if _ua_instance is not None:
+        try:
+            return _ua_instance.random
+        except Exception:
+            pass
+    return random.choice(STATIC_USER_AGENTS)
+
+
+def is_missing(value: Any) -> bool:
+    """判断None/NaN空值（替代pd.isna，避免启动时加载pandas）"""
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    # pandas.NaT 等缺失值类型与自身比较不相等
+    try:
+        return bool(value != value)
+    except Exception:
+        return False
+
+
+def pad_display(text: Any, width: int, align: str = '<') -> str:
+    """按终端显示宽度补齐（中文等全角字符占两列），align 为 '<' 或 '>'"""
+    import unicodedata
+
+    text = str(text)
+    display_width = sum(2 if unicodedata.east_asian_width(ch) in ('F', 'W') else 1 for ch in text)
+    padding = ' ' * max(width - display_width, 0)
+    return text + padding if align == '<' else padding + text
+
+
 # ======================== 配置文件读取 ========================
 class ConfigManager:
     """配置文件管理器"""
@@ -159,7 +222,7 @@ class DataProcessorV2:
     @staticmethod
     def safe_str(value: Any, default: str = "") -> str:
         """安全转换为字符串，空值返回空字符串"""
-        if pd.isna(value) or value is None:
+        if is_missing(value):
             return default
 
         str_value = str(value).strip()
@@ -172,7 +235,7 @@ class DataProcessorV2:
     @staticmethod
     def safe_float(value: Any, default: str = "") -> Union[float, str]:
         """安全转换浮点数：非数字/空值返回空字符串"""
-        if pd.isna(value) or value is None:
+        if is_missing(value):
             return default
 
         str_value = str(value).strip()
@@ -192,7 +255,7 @@ class DataProcessorV2:
     @staticmethod
     def standardize_datetime(dt_str: Any) -> str:
         """标准化时间格式：YYYY-MM-DD HH:MM:SS，空值留空"""
-        if pd.isna(dt_str) or dt_str is None:
+        if is_missing(dt_str):
             return ""
 
         dt_str = str(dt_str).strip()
@@ -241,7 +304,7 @@ class DataProcessorV2:
     @staticmethod
     def standardize_operator(operator_str: Any, platform: str = "") -> str:
         """运营商标准化（空值留空）"""
-        if pd.isna(operator_str) or operator_str is None:
+        if is_missing(operator_str):
             return ""
 
         operator_str = str(operator_str).strip()
@@ -309,7 +372,7 @@ class DataProcessorV2:
     @staticmethod
     def extract_card_number(card_number: Any) -> str:
         """提取卡号，只保留数字"""
-        if pd.isna(card_number) or card_number is None:
+        if is_missing(card_number):
             return ""
 
         card_str = str(card_number).strip()
@@ -326,7 +389,7 @@ class DataProcessorV2:
     @staticmethod
     def clean_remarks(remarks: Any) -> str:
         """清理备注字段"""
-        if pd.isna(remarks) or remarks is None:
+        if is_missing(remarks):
             return ""
 
         remarks_str = str(remarks).strip()
@@ -442,6 +505,7 @@ class TianjiClientV2:
 
             # 使用BeautifulSoup进行更精确的提取
             try:
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(html, 'html.parser')
 
                 # 查找包含"余额"的所有元素
@@ -1018,7 +1082,6 @@ class MiaoYueClientV2:
         self.cfg = config
         self.common_cfg = config['common']
         self.base_url = config['miaoyue']['base_url']
-        self.ua = UserAgent()
         self.data_processor = DataProcessorV2()
         self.account_info = {}
         self.query_cache = {}
@@ -1029,7 +1092,7 @@ class MiaoYueClientV2:
             login_url = f"{self.base_url}/card/user/password/login"
             login_params = {"username": username, "password": password}
 
-            headers = {"User-Agent": self.ua.random}
+            headers = {"User-Agent": random_user_agent()}
             response = requests.post(login_url, params=login_params, headers=headers,
                                      timeout=self.common_cfg['request_timeout'])
             response.raise_for_status()
@@ -1053,7 +1116,7 @@ class MiaoYueClientV2:
         """获取余额"""
         try:
             balance_url = f"{self.base_url}/card/proxy/company/capital/account/info?currencyType=CNY"
-            headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": self.ua.random}
+            headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": random_user_agent()}
 
             response = requests.get(balance_url, headers=headers,
                                     timeout=self.common_cfg['request_timeout'])
@@ -1160,7 +1223,7 @@ class MiaoYueClientV2:
                         f"orders[0].column=createTime&orders[0].asc=false&"
                         f"current={current}&size={self.common_cfg['bill_page_size']}")
 
-            headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": self.ua.random}
+            headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": random_user_agent()}
             response = requests.get(bill_url, headers=headers,
                                     timeout=self.common_cfg['request_timeout'])
             response.raise_for_status()
@@ -1288,42 +1351,6 @@ class MiaoYueClientV2:
 class MultiPlatformManagerV2:
     """多平台管理器 V2.0（严格按照规范文档）"""
 
-    # 字段映射表（字段编码 -> 字段名称）
-    FIELD_MAPPING = {
-        'order_no': '订单号',
-        'iccid': 'ICCID',
-        'card_number': '卡号',
-        'trans_time': '交易时间',
-        'sale_price': '售价（元）',
-        'cost_price': '成本（元）',
-        'commission': '佣金（元）',
-        'customer_name': '客户名称',
-        'product_name': '套餐/产品名称',
-        'operator': '运营商',
-        'income_type': '收入类型',
-        'remark': '备注',
-        'platform': '平台',
-        'account': '账号'
-    }
-
-    # 列宽设置（字符数）
-    COLUMN_WIDTHS = {
-        '订单号': 18,
-        'ICCID': 20,
-        '卡号': 15,
-        '交易时间': 20,
-        '售价（元）': 10,
-        '成本（元）': 10,
-        '佣金（元）': 10,
-        '客户名称': 20,
-        '套餐/产品名称': 25,
-        '运营商': 10,
-        '收入类型': 10,
-        '备注': 15,
-        '平台': 10,
-        '账号': 15
-    }
-
     def __init__(self, config_path: str = "multi_platform_config_v2.ini"):
         self.config_manager = ConfigManager(config_path)
         self.config = self.config_manager.load_config()
@@ -1562,10 +1589,14 @@ class MultiPlatformManagerV2:
             xiaotaifeng_bills, xiaotaifeng_accounts = self.query_xiaotaifeng_accounts()
             miaoyue_bills, miaoyue_accounts = self.query_miaoyue_accounts()
 
-        self.all_bills = tianji_bills + xiaotaifeng_bills + miaoyue_bills
-        self.platform_bills['天机'] = tianji_bills
-        self.platform_bills['小台风'] = xiaotaifeng_bills
-        self.platform_bills['妙月'] = miaoyue_bills
+        # 统一转换为规范账单，写入共用账单库后再导出
+        self.platform_bills['天机'] = convert_bills(tianji_bills, 'v2')
+        self.platform_bills['小台风'] = convert_bills(xiaotaifeng_bills, 'v2')
+        self.platform_bills['妙月'] = convert_bills(miaoyue_bills, 'v2')
+        self.all_bills = self.platform_bills['天机'] + self.platform_bills['小台风'] + self.platform_bills['妙月']
+        added = save_bills(self.all_bills, 'V2')
+        if added:
+            print(f"{Fore.GREEN}💾 新增{added}条账单已写入账单库：{BILL_DB_PATH}")
 
         self.account_summary = tianji_accounts + xiaotaifeng_accounts + miaoyue_accounts
         self.summary_data['total_bills'] = len(self.all_bills)
@@ -1606,6 +1637,118 @@ class MultiPlatformManagerV2:
                     percentage = (bills_count / self.summary_data['total_bills']) * 100
                     print(f"   {platform}: {bills_count} 条 ({percentage:.1f}%)")
 
+    def _query_single_balance(self, platform: str, username: str, password: str) -> Dict:
+        """只登录并查询单个账号余额（跳过账单分页）"""
+        row = {'平台': platform, '账号': username, '总余额（元）': None, '可提现余额（元）': None, '状态': '成功'}
+
+        try:
+            if platform == '妙月':
+                client = MiaoYueClientV2(self.config)
+                token, login_error = client.login(username, password)
+                if not token:
+                    self.log_error(platform, username, '登录失败', login_error)
+                    row['状态'] = '登录失败'
+                    return row
+                balance, withdrawable, _, balance_error = client.get_balance(token, username)
+            else:
+                client_cls = TianjiClientV2 if platform == '天机' else XiaoTaiFengClientV2
+                client = client_cls(self.config)
+                session, login_ok, login_error = client.login(username, password)
+                if not login_ok:
+                    self.log_error(platform, username, '登录失败', login_error)
+                    row['状态'] = '登录失败'
+                    return row
+                balance, balance_error = client.get_balance(session, username)
+                withdrawable = None
+
+            if balance_error:
+                self.log_error(platform, username, '余额查询失败', balance_error)
+                row['状态'] = '余额查询失败'
+                return row
+
+            row['总余额（元）'] = balance
+            row['可提现余额（元）'] = withdrawable
+
+        except Exception as e:
+            self.log_error(platform, username, '系统异常', f"查询异常: {str(e)}")
+            row['状态'] = '系统异常'
+
+        return row
+
+    def query_balances(self) -> List[Dict]:
+        """余额快速模式：所有账号并发登录+查询余额，不查账单、不加载pandas/openpyxl"""
+        tasks = [('天机', username, password) for username, password in self.config['tianji']['accounts'].items()]
+        tasks += [('小台风', account['username'], account['password'])
+                  for account in self.config['xiaotaifeng']['accounts']]
+        tasks += [('妙月', username, password) for username, password in self.config['miaoyue']['accounts'].items()]
+
+        if not tasks:
+            return []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(16, len(tasks))) as executor:
+            futures = [executor.submit(self._query_single_balance, *task) for task in tasks]
+            # 按提交顺序收集，输出顺序与配置文件一致
+            return [future.result() for future in futures]
+
+    def print_balance_table(self, rows: List[Dict]):
+        """打印紧凑的余额表"""
+        print(f"\n{Fore.GREEN}{'=' * 60}")
+        print(f"{pad_display('平台', 8)}{pad_display('账号', 20)}"
+              f"{pad_display('总余额（元）', 14, '>')}{pad_display('可提现（元）', 14, '>')}  状态")
+        print(f"{'-' * 60}")
+
+        total = 0.0
+        for row in rows:
+            balance = row['总余额（元）']
+            withdrawable = row['可提现余额（元）']
+            balance_text = f"{balance:.2f}" if balance is not None else "-"
+            withdrawable_text = f"{withdrawable:.2f}" if withdrawable is not None else "-"
+            color = Fore.GREEN if row['状态'] == '成功' else Fore.RED
+            print(f"{color}{pad_display(row['平台'], 8)}{pad_display(row['账号'], 20)}"
+                  f"{balance_text:>14}{withdrawable_text:>14}  {row['状态']}")
+            if balance is not None:
+                total += balance
+
+        print(f"{'-' * 60}")
+        print(f"{Fore.GREEN}总余额：{total:.2f} 元（成功 {sum(1 for r in rows if r['状态'] == '成功')}/{len(rows)} 个账号）")
+        print(f"{Fore.GREEN}{'=' * 60}")
+
+    def export_balances_to_csv(self, rows: List[Dict]) -> Path:
+        """导出余额表为CSV（utf-8-sig，Excel可直接打开）"""
+        import csv
+
+        output_path = self.get_output_path()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        csv_file = output_path / f"账号余额_{timestamp}.csv"
+
+        with open(csv_file, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['平台', '账号', '总余额（元）', '可提现余额（元）', '状态'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+        print(f"{Fore.GREEN}✅ 余额表已保存：{csv_file}")
+        return csv_file
+
+    def run_balance_only(self):
+        """余额快速模式入口"""
+        print(f"{Fore.CYAN}⚡ 余额快速模式：只查询余额，跳过账单分页和Excel导出")
+        start_time = time.time()
+
+        try:
+            rows = self.query_balances()
+            if not rows:
+                print(f"{Fore.YELLOW}⚠️  配置文件中没有任何账号")
+                return
+
+            self.print_balance_table(rows)
+            self.export_balances_to_csv(rows)
+            print(f"{Fore.CYAN}用时：{time.time() - start_time:.1f}秒")
+
+        except Exception as e:
+            logger.error(f"余额查询异常: {str(e)}", exc_info=True)
+            print(f"{Fore.RED}❌ 余额查询异常：{str(e)}")
+            print(f"{Fore.RED}详细错误信息请查看日志文件：{log_file}")
+
     def export_to_excel(self):
         """导出数据到Excel（严格按照V2.0规范）"""
         if not self.all_bills and not self.account_summary:
@@ -1616,6 +1759,7 @@ class MultiPlatformManagerV2:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         excel_file = output_path / f"多平台账单汇总_V2_{timestamp}.xlsx"
 
+        from openpyxl import Workbook
         wb = Workbook()
 
         if 'Sheet' in wb.sheetnames:
@@ -1624,7 +1768,7 @@ class MultiPlatformManagerV2:
         # 1. 多平台账单汇总表（主表）
         if self.all_bills:
             ws_summary = wb.create_sheet(title="多平台账单汇总")
-            self._write_bills_to_sheet(ws_summary, self.all_bills, "多平台账单汇总", sort_by_time=True)
+            write_bill_sheet(ws_summary, self.all_bills, "多平台账单汇总", sort_by_time=True)
 
         # 2. 各平台单独工作表
         for platform in ['天机', '小台风', '妙月']:
@@ -1632,7 +1776,7 @@ class MultiPlatformManagerV2:
             if platform_bills:
                 ws_platform = wb.create_sheet(title=f"{platform}账单")
                 sort_needed = (platform == '天机')
-                self._write_bills_to_sheet(ws_platform, platform_bills, f"{platform}平台账单", sort_by_time=sort_needed)
+                write_bill_sheet(ws_platform, platform_bills, f"{platform}平台账单", sort_by_time=sort_needed)
 
         # 3. 平台账号汇总表
         if self.account_summary:
@@ -1657,101 +1801,11 @@ class MultiPlatformManagerV2:
 
         return excel_file
 
-    def _write_bills_to_sheet(self, ws, bills_data, sheet_title, sort_by_time=False):
-        """将账单数据写入工作表（严格按照V2.0规范）"""
-        if not bills_data:
-            ws.append(["无数据"])
-            return
-
-        # 转换为DataFrame
-        df = pd.DataFrame(bills_data)
-
-        # 按交易时间降序排序
-        if 'trans_time' in df.columns and sort_by_time:
-            df['trans_time_temp'] = pd.to_datetime(df['trans_time'], errors='coerce', format='%Y-%m-%d %H:%M:%S')
-            df = df.dropna(subset=['trans_time_temp'])
-            df = df.sort_values('trans_time_temp', ascending=False)
-            df = df.drop('trans_time_temp', axis=1)
-
-        # 重新排列列顺序（按照规范文档顺序）
-        column_order = ['order_no', 'iccid', 'card_number', 'trans_time', 'sale_price', 'cost_price',
-                        'commission', 'customer_name', 'product_name', 'operator', 'income_type',
-                        'remark', 'platform', 'account']
-
-        # 只保留存在的列
-        existing_columns = [col for col in column_order if col in df.columns]
-        df = df[existing_columns]
-
-        # 定义样式
-        header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-
-        data_font = Font(name='微软雅黑', size=10)
-        data_alignment_num = Alignment(horizontal='right', vertical='center')
-        data_alignment_str = Alignment(horizontal='left', vertical='center')
-        data_alignment_center = Alignment(horizontal='center', vertical='center')
-
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-
-        # 写入表头（使用字段映射）
-        for col_idx, field_code in enumerate(existing_columns, 1):
-            field_name = self.FIELD_MAPPING.get(field_code, field_code)
-            cell = ws.cell(row=1, column=col_idx, value=field_name)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
-            # 设置列宽
-            width = self.COLUMN_WIDTHS.get(field_name, 12)
-            ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-        # 写入数据
-        for row_idx, row in df.iterrows():
-            for col_idx, field_code in enumerate(existing_columns, 1):
-                cell_value = row[field_code]
-
-                # 处理空值：空字符串或None都设置为None（Excel显示为空）
-                if cell_value == "" or pd.isna(cell_value) or cell_value is None:
-                    cell_value = None
-
-                cell = ws.cell(row=row_idx + 2, column=col_idx, value=cell_value)
-                cell.font = data_font
-                cell.border = thin_border
-
-                # 设置对齐方式
-                field_name = self.FIELD_MAPPING.get(field_code, field_code)
-                if field_name in ['售价（元）', '成本（元）', '佣金（元）']:
-                    cell.alignment = data_alignment_num
-                    # 格式化为两位小数
-                    if isinstance(cell_value, (int, float)):
-                        cell.number_format = '0.00'
-                elif field_name in ['平台', '账号', '收入类型', '运营商']:
-                    cell.alignment = data_alignment_center
-                else:
-                    cell.alignment = data_alignment_str
-
-        # 自动调整行高
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row):
-            ws.row_dimensions[row[0].row].height = 20
-
-        # 添加标题
-        ws.insert_rows(1)
-        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(existing_columns))
-        title_cell = ws.cell(row=1, column=1, value=sheet_title)
-        title_cell.font = Font(name='微软雅黑', size=14, bold=True, color='000000')
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        title_cell.fill = PatternFill(start_color='FFE699', end_color='FFE699', fill_type='solid')
-
-        # 冻结表头
-        ws.freeze_panes = ws['A3']
-
     def _write_account_summary_to_sheet(self, ws):
         """写入平台账号汇总表"""
+        from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         # 表头
         headers = ['平台', '账号', '总余额（元）', '可提现余额（元）', '不可提现余额（元）',
                    f'最近{self.config["common"].get("days_for_recent", 30)}天收益（元）',
@@ -1869,6 +1923,9 @@ class MultiPlatformManagerV2:
 
     def _write_statistics_to_sheet(self, ws):
         """写入数据统计表"""
+        from openpyxl.styles import Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         net_income = self.summary_data['total_recent_income'] - self.summary_data['total_recent_refund']
 
         stats = [
@@ -1960,6 +2017,9 @@ class MultiPlatformManagerV2:
 
     def _write_error_logs_to_sheet(self, ws):
         """写入错误日志表"""
+        from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         headers = ['时间', '平台', '账号', '错误类型', '错误信息']
 
         header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
@@ -2020,6 +2080,9 @@ class MultiPlatformManagerV2:
 
     def _write_field_mapping_to_sheet(self, ws):
         """写入字段映射说明表"""
+        from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         headers = ['字段编码', '字段名称', '数据类型', '业务定义', '空值处理规则', '数据校验规则']
 
         # 字段映射数据（按照规范文档）
@@ -2184,13 +2247,12 @@ def main():
     global logger, log_file
     logger, log_file = setup_logging()
 
-    try:
-        from fake_useragent import UserAgent
-    except ImportError:
+    # 只检查依赖是否存在，不在启动时导入
+    import importlib.util
+    if importlib.util.find_spec('fake_useragent') is None:
         print(f"{Fore.YELLOW}⚠️  缺少依赖库: fake_useragent")
         print(f"{Fore.YELLOW}正在安装依赖库...def load_config(self):")
         import subprocess
-        import sys
 
         packages = ['fake_useragent', 'pandas', 'openpyxl', 'colorama', 'requests', 'beautifulsoup4']
         for package in packages:
@@ -2203,7 +2265,12 @@ def main():
         return
 
     manager = MultiPlatformManagerV2()
-    manager.run()
+
+    # python SK.py --balance：只查余额
+    if '--balance' in sys.argv[1:]:
+        manager.run_balance_only()
+    else:
+        manager.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+import csv
+import importlib.util
+import io
+import itertools
+import os
+import random
+
+import pytest
+
+pytest.importorskip('tkinter')
+pytest.importorskip('requests')
+pytest.importorskip('bs4')
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '双色球验证程序.py')
+spec = importlib.util.spec_from_file_location('双色球验证程序', MODULE_PATH)
+双色球 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(双色球)
+
+
+# ------------------------------ 投注模板解析 ------------------------------
+def test_template_parses_single_compound_and_dantuo_lines():
+    lines = [
+        (1, "方案A,1,2,3,4,5,6,7,2"),
+        (2, "方案B,1 2 3 4 5 6 7,1 2,1"),
+        (3, "方案C,1 2#3 4 5 6 7,8,3"),
+    ]
+    bets, errors, duplicates = 双色球._parse_template_lines(lines)
+
+    assert errors == [] and duplicates == []
+    assert [(bet['name'], bet['type']) for bet in bets] == [("方案A", "单式"), ("方案B", "复式"), ("方案C", "胆拖")]
+    assert bets[0]['red'] == [1, 2, 3, 4, 5, 6] and bets[0]['blue'] == [7] and bets[0]['multiple'] == 2
+    assert bets[2]['dan'] == [1, 2]
+
+
+def test_template_empty_cell_is_reported_not_raised():
+    """单式行中有空单元格时按格式错误报告，不影响其他行"""
+    lines = [(1, "方案A,1,2,3,4,5,6,7,1"), (2, "方案B,1,2,3,4,5,,7,1")]
+    bets, errors, _ = 双色球._parse_template_lines(lines)
+
+    assert [bet['name'] for bet in bets] == ["方案A"]
+    assert len(errors) == 1 and errors[0].startswith("第2行")
+
+
+def test_template_reports_every_bad_line_with_its_line_number():
+    lines = [
+        (1, "方案A,1,2,3,4,5,34,7,1"),   # 红球超出范围
+        (2, "方案B,1,1,3,4,5,6,7,1"),    # 红球重复
+        (3, "方案C,1,2,3,4,5,6,17,1"),   # 蓝球超出范围
+        (4, "方案D,1,2,3,4,5,6,7,0"),    # 倍数超出范围
+        (5, ",1,2,3,4,5,6,7,1"),         # 缺少方案名称
+        (6, "方案F,1,2,3"),              # 部分数不对
+        (7, "方案G,1,2,3,4,5,6,7,1"),
+    ]
+    bets, errors, _ = 双色球._parse_template_lines(lines)
+
+    assert [bet['name'] for bet in bets] == ["方案G"]
+    assert [error.split("：")[0] for error in errors] == [f"第{line_num}行" for line_num in range(1, 7)]
+
+
+def test_template_duplicates_keep_first_occurrence():
+    lines = [(1, "方案A,1,2,3,4,5,6,7,1"), (2, "方案B,6,5,4,3,2,1,7,1"), (3, "方案C,1,2,3,4,5,6,7,2")]
+    bets, errors, duplicates = 双色球._parse_template_lines(lines)
+
+    # 号码顺序不同视为同一方案；倍数不同则不是重复
+    assert [bet['name'] for bet in bets] == ["方案A", "方案C"]
+    assert errors == []
+    assert len(duplicates) == 1 and duplicates[0].startswith("第2行")
+
+
+# ------------------------------ 开奖历史与期号 ------------------------------
+def _draw(issue, red=(1, 2, 3, 4, 5, 6), blue=7, date="2025-10-19"):
+    return {"issue": issue, "date": date, "time": "21:15", "red": list(red), "blue": blue}
+
+
+def test_normalize_issue_unifies_source_formats():
+    assert 双色球.normalize_issue("25120") == "2025120"
+    assert 双色球.normalize_issue("2025120") == "2025120"
+    assert 双色球.normalize_issue("2025-120") == "2025120"
+    assert 双色球.normalize_issue("03001") == "2003001"
+
+
+def test_history_store_keeps_one_row_per_draw_across_issue_formats(tmp_path):
+    store = 双色球.DrawHistoryStore(str(tmp_path / "history.db"))
+    assert store.save([_draw("2025119"), _draw("2025120")], "福彩网") == 2
+    # 500彩票网的5位期号是同一期，不应新增
+    assert store.save([_draw("25120")], "500彩票网") == 0
+    assert store.save([_draw("25121")], "500彩票网") == 1
+
+    assert store.count() == 3
+    assert store.latest()["issue"] == "2025121"
+
+
+def test_history_store_migrates_old_five_digit_issues(tmp_path):
+    db_path = str(tmp_path / "history.db")
+    store = 双色球.DrawHistoryStore(db_path)
+    with store._connect() as conn:
+        conn.executemany(
+            "INSERT INTO draws (issue, date, time, red, blue) VALUES (?, '2025-10-19', '21:15', '1,2,3,4,5,6', 7)",
+            [("25120",), ("2025120",), ("25121",)])
+
+    store = 双色球.DrawHistoryStore(db_path)
+    assert [res["issue"] for res in store.recent()] == ["2025121", "2025120"]
+
+
+def test_cross_check_matches_issues_across_formats():
+    five_digit = [_draw("25120"), _draw("25121", red=(1, 2, 3, 4, 5, 7))]
+    seven_digit = [_draw("2025120"), _draw("2025121"), _draw("2025122")]
+
+    overlap, mismatched = 双色球.cross_check(five_digit, seven_digit)
+    assert overlap == 2
+    assert mismatched == ["25121"]
+
+
+# ------------------------------ 中奖计算与回测 ------------------------------
+def _random_bets(rng, count):
+    bets = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            red, dan, blue = sorted(rng.sample(range(1, 34), 6)), [], [rng.randint(1, 16)]
+        elif kind == 1:
+            red, dan, blue = sorted(rng.sample(range(1, 34), rng.randint(7, 9))), [], sorted(rng.sample(range(1, 17), 2))
+        else:
+            red = rng.sample(range(1, 34), rng.randint(7, 9))
+            dan, red = sorted(red[:2]), sorted(red[:2]) + sorted(red[2:])
+            blue = [rng.randint(1, 16)]
+        bets.append({'name': f"方案{i}", 'type': "", 'dan': dan, 'red': red, 'blue': blue,
+                     'multiple': rng.randint(1, 3)})
+    return bets
+
+
+def _random_draws(rng, count):
+    return [_draw(f"{2003001 + i}", red=sorted(rng.sample(range(1, 34), 6)), blue=rng.randint(1, 16))
+            for i in range(count)]
+
+
+def _brute_force_counts(bet, draw):
+    """把方案展开成单式逐注判断，返回各奖级注数"""
+    counts = [0] * len(双色球.PRIZE_LEVELS)
+    tuo = [n for n in bet['red'] if n not in bet['dan']]
+    for picked in itertools.combinations(tuo, 6 - len(bet['dan'])):
+        red_match = len(set(bet['dan'] + list(picked)) & set(draw['red']))
+        for blue in bet['blue']:
+            counts[双色球.PRIZE_LEVEL_INDEX[red_match, int(blue == draw['blue'])]] += 1
+    return counts
+
+
+def test_prize_engine_matches_brute_force_enumeration():
+    rng = random.Random(46)
+    bets, draws = _random_bets(rng, 30), _random_draws(rng, 40)
+    # 保证出现高奖级：让第一期开出第一个方案的号码
+    draws[0] = _draw(draws[0]['issue'], red=bets[0]['red'], blue=bets[0]['blue'][0])
+    engine = 双色球.PrizeEngine(bets, draws)
+    level_counts = engine.level_counts()
+
+    for bet_index, bet in enumerate(bets):
+        assert engine.tickets[bet_index] == 双色球.bet_ticket_count(bet)
+        for draw_index, draw in enumerate(draws):
+            counts = _brute_force_counts(bet, draw)
+            assert level_counts[bet_index, draw_index].tolist() == counts
+            prize = sum(count * value for count, value in zip(counts, 双色球.PRIZE_VALUES.tolist()))
+            assert engine.prizes[bet_index, draw_index] == prize * bet['multiple']
+            best = next((level for level in range(1, len(counts)) if counts[level]), 0)
+            assert engine.levels[bet_index, draw_index] == best
+    assert engine.levels[0, 0] == 1
+
+
+def test_run_backtest_does_not_depend_on_chunk_size(tmp_path):
+    rng = random.Random(460)
+    bets, draws = _random_bets(rng, 12), _random_draws(rng, 50)
+    outputs = []
+    for chunk_size in (1, 7, 50, 1000):
+        summary_path, detail_path = tmp_path / f"汇总{chunk_size}.csv", tmp_path / f"明细{chunk_size}.csv"
+        summary = 双色球.run_backtest(bets, draws, summary_path, detail_path, chunk_size=chunk_size)
+        outputs.append((summary, detail_path.read_text(encoding='utf-8-sig')))
+    assert all(output == outputs[0] for output in outputs[1:])
+
+    # 汇总与一次算完整段历史的结果一致；明细只包含中奖的方案和期
+    engine = 双色球.PrizeEngine(bets, draws)
+    summary, detail = outputs[0]
+    columns = 双色球.BACKTEST_SUMMARY_HEADERS
+    assert [row[columns.index("固定奖金合计")] for row in summary] == engine.bet_totals().tolist()
+    assert [row[columns.index("中奖期数")] for row in summary] == (engine.levels != 0).sum(axis=1).tolist()
+    detail_rows = list(csv.reader(io.StringIO(detail)))[1:]
+    assert len(detail_rows) == int((engine.levels != 0).sum())
+    assert all(row[3] != "未中奖" for row in detail_rows)
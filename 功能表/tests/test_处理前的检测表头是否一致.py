@@ -0,0 +1,35 @@
+import importlib.util
+import os
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '处理前的检测表头是否一致.py')
+spec = importlib.util.spec_from_file_location('处理前的检测表头是否一致', MODULE_PATH)
+检测表头 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(检测表头)
+
+
+def test_header_with_blank_cell_beats_full_data_row():
+    """表头中有空单元格时，仍按已知列名识别表头，而不是第一行完整的数据"""
+    rows = [
+        ['企业名单导出', None, None, None],
+        ['企业名称', None, '有效手机号', '所属省份'],
+        ['甲公司', '张三', '13800000001', '广东省'],
+    ]
+    assert 检测表头.detect_header_row(rows) == 1
+
+
+def test_header_detection_accepts_aliases():
+    rows = [
+        ['甲公司', '张三', '13800000001', '广东省'],
+        ['公司名称', '法人', '手机号码', '省份'],
+    ]
+    assert 检测表头.detect_header_row(rows) == 1
+
+
+def test_header_detection_falls_back_to_most_filled_row():
+    """没有任何已知列名时，退回取非空单元格最多的一行"""
+    rows = [
+        ['说明', None, None],
+        ['列A', '列B', '列C'],
+        ['1', None, '3'],
+    ]
+    assert 检测表头.detect_header_row(rows) == 1
@@ -0,0 +1,180 @@
+import importlib.util
+import os
+import random
+
+import openpyxl
+import pandas as pd
+import pytest
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '批量过滤3.0.py')
+spec = importlib.util.spec_from_file_location('批量过滤', MODULE_PATH)
+批量过滤 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(批量过滤)
+
+
+# ------------------------------ 过滤词匹配 ------------------------------
+def _first_match(words, text):
+    """逐词查找的参考实现：最早结束的命中词，同一位置结束时取最长的"""
+    hits = [(start + len(word), -len(word), word)
+            for word in words for start in range(len(text)) if text.startswith(word.lower(), start)]
+    return min(hits)[2] if hits else None
+
+
+def test_keyword_matcher_agrees_with_brute_force():
+    rng = random.Random(36)
+    alphabet = 'ab科技有限公'
+    for _ in range(300):
+        words = list({''.join(rng.choices(alphabet, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 8))})
+        matcher = 批量过滤.KeywordMatcher(words)
+        text = ''.join(rng.choices(alphabet, k=rng.randint(0, 12)))
+        assert matcher.search(text) == _first_match(words, text), (words, text)
+
+
+def test_keyword_matcher_series_is_case_insensitive_and_skips_missing():
+    matcher = 批量过滤.KeywordMatcher(['Test', '科技'])
+    names = pd.Series(['某某TEST公司', '某某科技有限公司', '普通公司', None])
+
+    assert matcher.match_series(names[:3]).tolist() == ['Test', '科技', None]
+    texts = names.astype(str).str.lower().where(names.notna())
+    assert matcher.match_texts(texts).tolist() == ['Test', '科技', None, None]
+
+
+def test_keyword_matcher_without_words_matches_nothing():
+    matcher = 批量过滤.KeywordMatcher([])
+    assert matcher.match_texts(pd.Series(['任意公司'])).tolist() == [None]
+
+
+def test_filter_word_cache_reloads_compiled_matcher(tmp_path):
+    """编译缓存载入的匹配器与重新构建的结果一致"""
+    filter_path = tmp_path / '过滤词.txt'
+    filter_path.write_text('科技 贸易 Test', encoding='utf-8')
+    built = 批量过滤.FilterWordCache(str(filter_path), verbose=False).get()
+    cached = 批量过滤.FilterWordCache(str(filter_path), verbose=False).get()
+
+    texts = pd.Series(['某某科技', '某某test', '某某餐饮'])
+    assert cached.match_texts(texts).tolist() == built.match_texts(texts).tolist() == ['科技', 'Test', None]
+
+
+# ------------------------------ 公司名称过滤规则 ------------------------------
+def test_company_reason_bits_combines_all_rules():
+    matcher = 批量过滤.KeywordMatcher(['贸易'])
+    names = pd.Series(['某某贸易有限公司', '小卖部', '某某科技有限公司北京分公司', '某某贸易分公司', '某某科技有限公司', None])
+    bits, matched = 批量过滤.company_reason_bits(names, matcher)
+
+    keyword, short, branch = 批量过滤.REASON_KEYWORD, 批量过滤.REASON_SHORT_NAME, 批量过滤.REASON_BRANCH
+    assert bits.tolist() == [keyword, short, branch, keyword | branch, 0, 0]
+    assert matched.tolist() == ['贸易', None, None, '贸易', None, None]
+
+
+def test_filter_companies_splits_rows_and_explains_reasons():
+    matcher = 批量过滤.KeywordMatcher(['贸易'])
+    df = pd.DataFrame({'企业名称': ['某某贸易分公司', '某某科技有限公司', '小卖部'], '有效手机号': ['1', '2', '3']})
+    kept, removed = 批量过滤.filter_companies(df, matcher, '企业名称')
+
+    assert kept['企业名称'].tolist() == ['某某科技有限公司']
+    assert removed['过滤原因'].tolist() == ['包含过滤词; 包含分公司', '公司名称过短']
+    assert removed['命中过滤词'].tolist() == ['贸易', '']
+
+
+def _write_sheet(path, rows):
+    wb = openpyxl.Workbook()
+    for row in rows:
+        wb.active.append(row)
+    wb.save(path)
+
+
+def test_parse_with_schema_rejects_stale_header_row(tmp_path):
+    """映射中的表头行指向数据行时不使用映射"""
+    path = tmp_path / '名单.xlsx'
+    _write_sheet(path, [['公司名称', '有效手机号'], ['甲公司', '13800000001'], ['乙公司', '13800000002']])
+    stale = {'header_row': 1, 'aliases': {'公司名称': '企业名称'}, 'positions': {'企业名称': 0, '有效手机号': 1}}
+    good = {'header_row': 0, 'aliases': {'公司名称': '企业名称'}, 'positions': {'企业名称': 0, '有效手机号': 1}}
+
+    with pd.ExcelFile(path) as xls:
+        assert 批量过滤.parse_with_schema(xls, xls.sheet_names[0], stale) is None
+        df = 批量过滤.parse_with_schema(xls, xls.sheet_names[0], good)
+    assert df.columns.tolist() == ['企业名称', '有效手机号']
+    assert len(df) == 2
+
+
+# ------------------------------ 去重 ------------------------------
+def _frame(rows):
+    return pd.DataFrame(rows, columns=['企业名称', '有效手机号'])
+
+
+def test_dedup_rows_by_phone_then_company_and_phone():
+    df = _frame([
+        ['甲公司', '13800000001'],
+        ['乙公司', '13800000001'],   # 手机号重复
+        ['丙公司', ''],
+        ['丙公司', ''],              # 无手机号时按公司名称+手机号重复
+        ['丁公司', ''],
+    ])
+    kept, removed, counts = 批量过滤.dedup_rows(df, '企业名称', '有效手机号', 批量过滤.DedupIndex())
+
+    assert kept['企业名称'].tolist() == ['甲公司', '丙公司', '丁公司']
+    assert removed['过滤原因'].tolist() == ['手机号重复', '公司名称+手机号重复']
+    assert counts == {批量过滤.DUP_PHONE: 1, 批量过滤.DUP_COMPANY_PHONE: 1, 批量过滤.DUP_COMPANY: 0}
+
+
+def test_dedup_rows_by_company_without_phone_column():
+    df = pd.DataFrame({'企业名称': ['甲公司', '乙公司', '甲公司']})
+    kept, removed, counts = 批量过滤.dedup_rows(df, '企业名称', None, 批量过滤.DedupIndex())
+
+    assert kept['企业名称'].tolist() == ['甲公司', '乙公司']
+    assert counts[批量过滤.DUP_COMPANY] == 1
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def dedup_index(request, tmp_path):
+    if request.param == 'memory':
+        index = 批量过滤.DedupIndex()
+    else:
+        index = 批量过滤.PersistentDedupIndex(str(tmp_path / '去重索引.sqlite'))
+    yield index
+    index.close()
+
+
+def test_dedup_index_sheets_of_one_file_see_each_other(dedup_index):
+    """同一文件的多个工作表在提交前也要互相去重"""
+    批量过滤.dedup_rows(_frame([['甲公司', '13800000001']]), '企业名称', '有效手机号', dedup_index)
+    kept, _, _ = 批量过滤.dedup_rows(_frame([['乙公司', '13800000001']]), '企业名称', '有效手机号', dedup_index)
+    assert kept.empty
+
+
+def test_dedup_index_commit_keeps_keys_across_files(dedup_index):
+    批量过滤.dedup_rows(_frame([['甲公司', '13800000001']]), '企业名称', '有效手机号', dedup_index)
+    dedup_index.commit()
+
+    kept, _, _ = 批量过滤.dedup_rows(_frame([['乙公司', '13800000001'], ['丙公司', '13800000002']]),
+                                    '企业名称', '有效手机号', dedup_index)
+    assert kept['企业名称'].tolist() == ['丙公司']
+
+
+def test_dedup_index_rollback_discards_failed_file_keys(dedup_index):
+    """处理失败的文件回滚后，其行不能让后续文件的行被当作重复删掉"""
+    批量过滤.dedup_rows(_frame([['甲公司', '13800000001']]), '企业名称', '有效手机号', dedup_index)
+    dedup_index.commit()
+    批量过滤.dedup_rows(_frame([['乙公司', '13800000002']]), '企业名称', '有效手机号', dedup_index)
+    dedup_index.rollback()
+
+    kept, _, _ = 批量过滤.dedup_rows(_frame([['甲公司', '13800000001'], ['乙公司', '13800000002']]),
+                                    '企业名称', '有效手机号', dedup_index)
+    assert kept['企业名称'].tolist() == ['乙公司']
+
+
+def test_persistent_dedup_index_survives_between_runs(tmp_path):
+    """磁盘索引在多次运行之间保留已提交的键，中断未提交的键不保留"""
+    db_path = str(tmp_path / '去重索引.sqlite')
+    index = 批量过滤.PersistentDedupIndex(db_path)
+    批量过滤.dedup_rows(_frame([['甲公司', '13800000001']]), '企业名称', '有效手机号', index)
+    index.commit()
+    批量过滤.dedup_rows(_frame([['乙公司', '13800000002']]), '企业名称', '有效手机号', index)
+    index.close()
+
+    index = 批量过滤.PersistentDedupIndex(db_path)
+    assert len(index) == 1
+    kept, _, _ = 批量过滤.dedup_rows(_frame([['甲公司', '13800000001'], ['乙公司', '13800000002']]),
+                                    '企业名称', '有效手机号', index)
+    index.close()
+    assert kept['企业名称'].tolist() == ['乙公司']
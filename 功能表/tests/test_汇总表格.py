@@ -0,0 +1,51 @@
+import importlib.util
+import os
+
+import openpyxl
+import pandas as pd
+import pytest
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '汇总表格.py')
+spec = importlib.util.spec_from_file_location('汇总表格', MODULE_PATH)
+汇总表格 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(汇总表格)
+
+
+def test_province_partitions_read_back(tmp_path):
+    """按省份分区输出后，整个分区目录可以直接读回"""
+    pytest.importorskip('pyarrow')
+    source = tmp_path / '源文件.xlsx'
+    source.write_bytes(b'')
+    output_dir = tmp_path / '输出'
+    writer = 汇总表格.PartitionedOutputWriter(str(output_dir), output_format='parquet', partition_by='province')
+
+    df = pd.DataFrame({
+        '公司名称': ['甲公司', '乙公司', '丙公司'],
+        '电话': ['13800000001', '13800000002', '13800000003'],
+        '所属省份': ['广东省', '浙江省', '广东省'],
+    })
+    outputs = writer.write_frame(str(source), df)
+    assert len(outputs) == 2
+
+    result = pd.read_parquet(output_dir)
+    assert len(result) == 3
+    provinces = dict(zip(result['公司名称'], result['所属省份'].astype(str)))
+    assert provinces == {'甲公司': '广东省', '乙公司': '浙江省', '丙公司': '广东省'}
+
+
+def test_stale_schema_entry_falls_back_to_header_detection(tmp_path):
+    """映射中的表头行指向数据行时不按映射读取，改为自动识别表头，数据不丢失"""
+    path = tmp_path / '名单.xlsx'
+    wb = openpyxl.Workbook()
+    for row in [['企业名称', None, '有效手机号', '所属省份'],
+                ['甲公司', '张三', '13800000001', '广东省'],
+                ['乙公司', '李四', '13800000002', '浙江省']]:
+        wb.active.append(row)
+    wb.save(path)
+    stale = {'header_row': 1, 'aliases': {}, 'positions': {'企业名称': 1, '有效手机号': 2, '所属省份': 3}}
+
+    logger = 汇总表格._MessageBuffer()
+    df, _ = 汇总表格.read_file(str(path), logger, ['企业名称', '有效手机号', '所属省份'], stale)
+
+    assert df.values.tolist() == [['甲公司', '13800000001', '广东省'], ['乙公司', '13800000002', '浙江省']]
+    assert any('表头结构映射与实际表头不符' in message for _, message in logger.messages)
@@ -1,18 +1,34 @@
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
+import csv
+import gc
 import json
+import math
 import time
 import re
 from datetime import datetime
 import os
 import sys
+import sqlite3
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkinter.scrolledtext import ScrolledText
 
 # 全局配置
 LATEST_ISSUES = 20  # 查询最近期数
+HISTORY_DB_PATH = os.path.join(os.path.expanduser('~'), "双色球开奖历史.db")  # 本地开奖历史库
+FULL_HISTORY_ISSUES = 5000  # 本地库为空时一次拉取的期数（覆盖2003年以来的全部开奖）
+DRAW_WEEKDAYS = (1, 3, 6)  # 开奖日：周二、周四、周日
+DRAW_TIME = "21:15"
+BET_PRICE = 2  # 单注金额（元）
+BACKTEST_CHUNK_ISSUES = 200  # 回测时每批计算的期数（控制内存占用）
+MAX_COMPOUND_RED = 20  # 复式/胆拖最多选择的红球数
+MAX_DAN = 5  # 胆拖最多胆码数
+MAX_MULTIPLE = 99  # 单张彩票最多投注倍数
 TEMPLATE_FILENAME = "双色球投注模板.txt"  # TXT模板文件名
 DEFAULT_FONT = ("微软雅黑", 10)
 TITLE_FONT = ("微软雅黑", 14, "bold")
@@ -27,6 +43,729 @@ COLORS = {
 }
 
 
+# ------------------------------ 本地开奖历史库 ------------------------------
+def normalize_issue(issue):
+    """期号统一为7位（4位年份+3位期序）：500彩票网为5位（如"25120"），千彩网带"-"分隔
+
+    各数据源的期号统一后才能按字符串比较先后、按期号去重和交叉校验
+    """
+    issue = str(issue).strip().replace("-", "")
+    return "20" + issue if len(issue) == 5 and issue.isdigit() else issue
+
+
+class DrawHistoryStore:
+    """本地SQLite开奖历史：按期号保存全部开奖结果，联网时只补充最新一期之后的数据"""
+
+    def __init__(self, db_path=HISTORY_DB_PATH):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS draws ("
+                "issue TEXT PRIMARY KEY, date TEXT NOT NULL, time TEXT NOT NULL, "
+                "red TEXT NOT NULL, blue INTEGER NOT NULL, source TEXT, fetched_at TEXT)"
+            )
+            # 旧数据中按500彩票网5位期号保存的开奖统一为7位（同一期已有7位记录时丢弃5位的）
+            conn.execute(
+                "INSERT OR IGNORE INTO draws SELECT '20' || issue, date, time, red, blue, source, fetched_at "
+                "FROM draws WHERE length(issue) = 5"
+            )
+            conn.execute("DELETE FROM draws WHERE length(issue) = 5")
+
+    def _connect(self):
+        # 查询在子线程执行，每次操作单独建立连接
+        return sqlite3.connect(self.db_path)
+
+    @staticmethod
+    def _row_to_result(row):
+        issue, date, open_time, red, blue = row
+        return {
+            "issue": issue,
+            "date": date,
+            "time": open_time,
+            "red": list(map(int, red.split(","))),
+            "blue": blue
+        }
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM draws").fetchone()[0]
+
+    def latest(self):
+        """返回最新一期开奖结果，库为空时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT issue, date, time, red, blue FROM draws ORDER BY issue DESC LIMIT 1"
+            ).fetchone()
+        return self._row_to_result(row) if row else None
+
+    def recent(self, limit=None):
+        """按期号倒序返回最近 limit 期（None 表示全部）"""
+        sql = "SELECT issue, date, time, red, blue FROM draws ORDER BY issue DESC"
+        with self._connect() as conn:
+            if limit is None:
+                rows = conn.execute(sql).fetchall()
+            else:
+                rows = conn.execute(sql + " LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_result(row) for row in rows]
+
+    def save(self, results, source):
+        """写入开奖结果（期号统一为7位，已存在的期号覆盖），返回新增期数"""
+        fetched_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._connect() as conn:
+            before = conn.execute("SELECT COUNT(*) FROM draws").fetchone()[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO draws (issue, date, time, red, blue, source, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(normalize_issue(res["issue"]), res["date"], res["time"], ",".join(map(str, res["red"])),
+                  res["blue"], source, fetched_at) for res in results]
+            )
+            after = conn.execute("SELECT COUNT(*) FROM draws").fetchone()[0]
+        return after - before
+
+
+def next_draw_time(last_date):
+    """根据最新一期的开奖日期，推算下一期的开奖时间"""
+    day = datetime.strptime(last_date, "%Y-%m-%d")
+    hour, minute = map(int, DRAW_TIME.split(":"))
+    while True:
+        day += timedelta(days=1)
+        if day.weekday() in DRAW_WEEKDAYS:
+            return day.replace(hour=hour, minute=minute)
+
+
+def issues_to_fetch(latest):
+    """估算需要联网拉取的期数：库为空时拉取全部历史，否则按距上期的天数估算（多取几期用于校对）"""
+    if latest is None:
+        return FULL_HISTORY_ISSUES
+    days = (datetime.now() - datetime.strptime(latest["date"], "%Y-%m-%d")).days
+    return max(days * len(DRAW_WEEKDAYS) // 7, 0) + 3
+
+
+def cross_check(results, others):
+    """比较两组开奖结果的共同期号，返回 (共同期数, 号码不一致的期号列表)
+
+    期号按 normalize_issue 统一后再比较，5位和7位期号的同一期也能对上
+    """
+    other_map = {normalize_issue(res["issue"]): res for res in others}
+    overlap = 0
+    mismatched = []
+    for res in results:
+        other = other_map.get(normalize_issue(res["issue"]))
+        if other is None:
+            continue
+        overlap += 1
+        if sorted(res["red"]) != sorted(other["red"]) or res["blue"] != other["blue"]:
+            mismatched.append(res["issue"])
+    return overlap, mismatched
+
+
+# ------------------------------ 中奖计算引擎 ------------------------------
+# 奖级表：(奖级, 奖金说明, 固定奖金)，下标0为未中奖
+PRIZE_LEVELS = [
+    ("未中奖", "0元", 0),
+    ("一等奖", "浮动(最高1000万)", 0),
+    ("二等奖", "浮动", 0),
+    ("三等奖", "3000元", 3000),
+    ("四等奖", "200元", 200),
+    ("五等奖", "10元", 10),
+    ("六等奖", "5元", 5),
+]
+PRIZE_VALUES = np.array([prize for _, _, prize in PRIZE_LEVELS], dtype=np.int64)
+PRIZE_NAMES = np.array([name for name, _, _ in PRIZE_LEVELS], dtype=object)
+# [红球命中数, 蓝球是否命中] -> 奖级下标
+PRIZE_LEVEL_INDEX = np.array([
+    [0, 6],  # 0红
+    [0, 6],  # 1红
+    [0, 6],  # 2红
+    [0, 5],  # 3红
+    [5, 4],  # 4红
+    [4, 3],  # 5红
+    [2, 1],  # 6红
+], dtype=np.uint8)
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(values):
+        """逐字节查表统计置位数（NumPy 2.0 以下没有 bitwise_count）"""
+        values = np.ascontiguousarray(values, dtype=np.uint64)
+        return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def red_mask(red_balls):
+    """号码编码为位掩码：号码n对应第n-1位（红球33位，蓝球16位）"""
+    mask = 0
+    for n in red_balls:
+        mask |= 1 << (n - 1)
+    return mask
+
+
+def bet_ticket_count(bet):
+    """方案包含的单式注数：C(拖码数, 6-胆码数) × 蓝球数"""
+    return math.comb(len(bet["red"]) - len(bet["dan"]), 6 - len(bet["dan"])) * len(bet["blue"])
+
+
+def format_bet(bet, sep="、"):
+    """投注号码说明，如 红球[1、5、…] + 蓝球[8]、胆码[1、5] 拖码[…] + 蓝球[8、12]"""
+    blue_str = sep.join(map(str, bet["blue"]))
+    if bet["dan"]:
+        tuo = [n for n in bet["red"] if n not in bet["dan"]]
+        return f"胆码[{sep.join(map(str, bet['dan']))}] 拖码[{sep.join(map(str, tuo))}] + 蓝球[{blue_str}]"
+    return f"红球[{sep.join(map(str, bet['red']))}] + 蓝球[{blue_str}]"
+
+
+def _parse_numbers(text, line_num, label, low, high):
+    """解析空格分隔的号码并校验范围和重复"""
+    numbers = []
+    for part in text.split():
+        try:
+            number = int(part)
+        except ValueError:
+            raise ValueError(f"第{line_num}行：{label}“{part}”不是整数")
+        if number < low or number > high:
+            raise ValueError(f"第{line_num}行：{label}{number}超出{low}-{high}范围")
+        numbers.append(number)
+    if len(set(numbers)) != len(numbers):
+        raise ValueError(f"第{line_num}行：{label}存在重复数字")
+    return numbers
+
+
+def parse_bet_line(line_num, stripped_line):
+    """解析模板中的一行投注方案，格式错误时抛出ValueError
+
+    单式：方案名称,红球1,…,红球6,蓝球,倍数（9个部分）
+    复式/胆拖：方案名称,红球,蓝球,倍数（4个部分，号码用空格分隔，胆拖写作“胆码#拖码”）
+    """
+    parts = stripped_line.split(',')
+    if len(parts) not in (4, 9):
+        raise ValueError(f"第{line_num}行：单式需包含9个部分、复式/胆拖需包含4个部分（当前{len(parts)}个）")
+
+    scheme_name = parts[0].strip()
+    if not scheme_name:
+        raise ValueError(f"第{line_num}行：方案名称不能为空")
+
+    if len(parts) == 9:
+        # 单式：红球、蓝球各自一列
+        red_text = " ".join(part.strip() for part in parts[1:7])
+        blue_text = parts[7].strip()
+    else:
+        red_text, blue_text = parts[1].strip(), parts[2].strip()
+
+    dan = []
+    if '#' in red_text:
+        dan_text, _, tuo_text = red_text.partition('#')
+        dan = _parse_numbers(dan_text, line_num, "胆码", 1, 33)
+        tuo = _parse_numbers(tuo_text, line_num, "拖码", 1, 33)
+        if not 1 <= len(dan) <= MAX_DAN:
+            raise ValueError(f"第{line_num}行：胆码需1-{MAX_DAN}个（当前{len(dan)}个）")
+        if set(dan) & set(tuo):
+            raise ValueError(f"第{line_num}行：胆码与拖码不能重复")
+        red_balls = dan + tuo
+        if not 7 <= len(red_balls) <= MAX_COMPOUND_RED:
+            raise ValueError(f"第{line_num}行：胆码+拖码需7-{MAX_COMPOUND_RED}个（当前{len(red_balls)}个）")
+    else:
+        red_balls = _parse_numbers(red_text, line_num, "红球", 1, 33)
+        if not 6 <= len(red_balls) <= MAX_COMPOUND_RED:
+            raise ValueError(f"第{line_num}行：红球需6-{MAX_COMPOUND_RED}个（当前{len(red_balls)}个）")
+
+    blue_balls = _parse_numbers(blue_text, line_num, "蓝球", 1, 16)
+    if not blue_balls:
+        raise ValueError(f"第{line_num}行：至少需要1个蓝球")
+
+    try:
+        multiple = int(parts[-1].strip())
+    except ValueError:
+        raise ValueError(f"第{line_num}行：倍数不是整数")
+    if not 1 <= multiple <= MAX_MULTIPLE:
+        raise ValueError(f"第{line_num}行：倍数需1-{MAX_MULTIPLE}")
+
+    if dan:
+        bet_type = "胆拖"
+    elif len(red_balls) > 6 or len(blue_balls) > 1:
+        bet_type = "复式"
+    else:
+        bet_type = "单式"
+
+    return {
+        'name': scheme_name,
+        'type': bet_type,
+        'dan': dan,
+        'red': red_balls,
+        'blue': blue_balls,
+        'multiple': multiple
+    }
+
+
+def shape_level_counts(dan_size, tuo_size, blue_size):
+    """某种方案规格（胆码数, 拖码数, 蓝球数）在各命中情况下的各奖级注数表
+
+    设胆码命中 hd 个、拖码命中 ht 个，需从拖码中选 6-胆码数 个，则红球命中 r 个的注数为
+    C(ht, r-hd) × C(拖码数-ht, 6-胆码数-(r-hd))，再按蓝球是否命中分到各奖级。
+    返回 [命中情况编号, 奖级] 的注数表，编号见 PrizeEngine.hit_keys。
+    """
+    need = 6 - dan_size
+    table = np.zeros((6 * 7 * 2, len(PRIZE_LEVELS)), dtype=np.int64)
+    for dan_hit in range(dan_size + 1):
+        for tuo_hit in range(min(6, tuo_size) + 1):
+            for blue_hit in (0, 1):
+                key = (dan_hit * 7 + tuo_hit) * 2 + blue_hit
+                for from_tuo in range(need + 1):
+                    ways = math.comb(tuo_hit, from_tuo) * math.comb(tuo_size - tuo_hit, need - from_tuo)
+                    red_match = dan_hit + from_tuo
+                    table[key, PRIZE_LEVEL_INDEX[red_match, 1]] += ways * blue_hit
+                    table[key, PRIZE_LEVEL_INDEX[red_match, 0]] += ways * (blue_size - blue_hit)
+    return table
+
+
+class PrizeEngine:
+    """向量化中奖计算：号码按位与后统计置位数，一次算出所有方案 × 所有期的中奖情况
+
+    单式、复式和胆拖统一处理：每期只需胆码命中数、拖码命中数和蓝球是否命中（合成一个命中情况编号），
+    各奖级注数按方案规格用组合数预先算成表（见 shape_level_counts），再按编号查表，
+    每期计算量与方案大小无关，不需要展开成单式。
+    计算结果保存在实例中，界面表格和保存报告直接复用。
+    """
+
+    def __init__(self, bets, draws):
+        self.bets = bets
+        self.draws = draws
+        dan_masks = np.array([red_mask(bet["dan"]) for bet in bets], dtype=np.uint64)
+        tuo_masks = np.array([red_mask(set(bet["red"]) - set(bet["dan"])) for bet in bets], dtype=np.uint64)
+        blue_masks = np.array([red_mask(bet["blue"]) for bet in bets], dtype=np.uint64)
+        multiples = np.array([bet["multiple"] for bet in bets], dtype=np.int64)
+        draw_masks = np.array([red_mask(res["red"]) for res in draws], dtype=np.uint64)
+        draw_blue = np.array([1 << (res["blue"] - 1) for res in draws], dtype=np.uint64)
+
+        # 相同规格的方案共用一张注数表
+        shapes = {}
+        shape_ids = []
+        for bet in bets:
+            shape = (len(bet["dan"]), len(bet["red"]) - len(bet["dan"]), len(bet["blue"]))
+            shape_ids.append(shapes.setdefault(shape, len(shapes)))
+        self.shape_ids = np.array(shape_ids, dtype=np.int64)
+        self.count_tables = np.array([shape_level_counts(*shape) for shape in shapes]).reshape(
+            len(shapes), 6 * 7 * 2, len(PRIZE_LEVELS))
+        prize_tables = self.count_tables @ PRIZE_VALUES
+        level_tables = np.zeros(prize_tables.shape, dtype=np.uint8)  # 最高奖级（未中奖为0）
+        for level in range(len(PRIZE_LEVELS) - 1, 0, -1):
+            level_tables[self.count_tables[:, :, level] > 0] = level
+
+        self.tickets = self.count_tables[self.shape_ids, 0].sum(axis=1)  # 各方案注数
+        self.costs = BET_PRICE * self.tickets * multiples  # 各方案每期投注金额
+
+        # 方案 × 开奖期 矩阵：命中情况编号 = (胆码命中数 × 7 + 拖码命中数) × 2 + 蓝球是否命中
+        dan_hits = popcount(dan_masks[:, None] & draw_masks[None, :]).astype(np.int64)
+        tuo_hits = popcount(tuo_masks[:, None] & draw_masks[None, :]).astype(np.int64)
+        blue_hit = ((blue_masks[:, None] & draw_blue[None, :]) != 0).astype(np.int64)
+        self.hit_keys = (dan_hits * 7 + tuo_hits) * 2 + blue_hit
+
+        rows = self.shape_ids[:, None]
+        self.levels = level_tables[rows, self.hit_keys]
+        self.prizes = prize_tables[rows, self.hit_keys] * multiples[:, None]
+
+    def level_counts(self):
+        """各奖级的中奖注数 [方案, 期, 奖级]（下标0为不中奖的注数）"""
+        return self.count_tables[self.shape_ids[:, None], self.hit_keys]
+
+    def level_name(self, bet_index, draw_index):
+        """奖级说明：单式为奖级名称，复式/胆拖列出各奖级注数"""
+        if self.tickets[bet_index] == 1:
+            return PRIZE_LEVELS[self.levels[bet_index, draw_index]][0]
+        counts = self.count_tables[self.shape_ids[bet_index], self.hit_keys[bet_index, draw_index]]
+        won = [f"{PRIZE_LEVELS[level][0]}×{counts[level]}" for level in range(1, len(PRIZE_LEVELS)) if counts[level]]
+        return "、".join(won) if won else PRIZE_LEVELS[0][0]
+
+    def bet_totals(self):
+        """各方案的总奖金"""
+        return self.prizes.sum(axis=1)
+
+    def winning_pairs(self):
+        """所有中奖的 (方案下标, 开奖期下标)，按方案、期的顺序"""
+        return zip(*np.nonzero(self.levels))
+
+
+# ------------------------------ 投注模板批量加载 ------------------------------
+TEMPLATE_FILETYPES = [("投注模板", "*.txt *.csv *.xlsx"), ("TXT文件", "*.txt"), ("CSV文件", "*.csv"),
+                      ("Excel文件", "*.xlsx"), ("所有文件", "*.*")]
+TEMPLATE_ERROR_PREVIEW = 20  # 弹窗中最多列出的错误条数（完整内容见错误报告文件）
+
+
+def _cell_text(value):
+    """表格单元格转文本（Excel中的整数常被读成浮点数）"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _join_cells(rows):
+    """表格行按英文逗号连接成与TXT模板相同的格式，跳过以“方案名称”开头的表头行"""
+    for line_num, row in enumerate(rows, 1):
+        cells = [_cell_text(value) for value in row]
+        while cells and not cells[-1]:
+            cells.pop()
+        if cells and cells[0] != "方案名称":
+            yield line_num, ",".join(cells)
+
+
+def iter_template_lines(file_path):
+    """逐行读取投注模板（TXT/CSV/XLSX），返回 (行号, 内容)，跳过空行和以“#”开头的注释行"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".xlsx":
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            lines = list(_join_cells(wb.worksheets[0].iter_rows(values_only=True)))
+        finally:
+            wb.close()
+    elif ext == ".csv":
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            lines = list(_join_cells(csv.reader(f)))
+    else:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            lines = [(line_num, line.strip()) for line_num, line in enumerate(f, 1)]
+    return [(line_num, text) for line_num, text in lines if text and not text.startswith('#')]
+
+
+def load_bet_template_file(file_path):
+    """批量解析投注模板，返回 (方案列表, 错误列表, 重复列表)，不会因单行错误中断
+
+    单式行（方案名称后跟8个纯数字）整批转成NumPy数组，一次完成范围、重复和倍数校验；
+    其余行及未通过批量校验的行逐行用 parse_bet_line 解析，以得到带行号的具体错误说明。
+    胆码、红球、蓝球和倍数完全相同的方案视为重复，只保留最先出现的一个。
+    """
+    lines = iter_template_lines(file_path)
+    # 批量创建大量小对象时暂停循环垃圾回收，避免反复扫描已创建的方案（约快2-3倍）
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _parse_template_lines(lines)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _parse_template_lines(lines):
+    """load_bet_template_file 的解析部分（lines 为 iter_template_lines 的结果）"""
+    bets = [None] * len(lines)
+    keys = np.zeros((len(lines), 4), dtype=np.uint64)  # 去重键：胆码、红球、蓝球的位掩码和倍数
+
+    # 1. 单式行批量转换和校验
+    fast_rows, fast_names, fast_numbers = [], [], []
+    for row, (_, text) in enumerate(lines):
+        name, _, numbers_text = text.partition(',')
+        parts = numbers_text.split(',')
+        digits = "".join(parts)
+        # 只接受每段1-3位的ASCII数字，保证整批转换不会出错或溢出（空单元格等交给逐行解析报错）
+        if (len(parts) == 8 and name.strip() and all(parts) and digits.isascii() and digits.isdigit()
+                and max(map(len, parts)) <= 3):
+            fast_rows.append(row)
+            fast_names.append(name.strip())
+            fast_numbers.append(parts)
+    slow_rows = set(range(len(lines))) - set(fast_rows)
+    if fast_rows:
+        numbers = np.array(fast_numbers, dtype=np.int64)
+        red, blue, multiple = numbers[:, :6], numbers[:, 6], numbers[:, 7]
+        valid = (
+            ((red >= 1) & (red <= 33)).all(axis=1)
+            & (np.diff(np.sort(red, axis=1), axis=1) != 0).all(axis=1)
+            & (blue >= 1) & (blue <= 16)
+            & (multiple >= 1) & (multiple <= MAX_MULTIPLE)
+        )
+        fast_rows = np.array(fast_rows)
+        slow_rows.update(fast_rows[~valid].tolist())
+        valid_rows = fast_rows[valid]
+        red, blue, multiple = red[valid], blue[valid], multiple[valid]
+        keys[valid_rows, 1] = np.bitwise_or.reduce(np.uint64(1) << (red - 1).astype(np.uint64), axis=1)
+        keys[valid_rows, 2] = np.uint64(1) << (blue - 1).astype(np.uint64)
+        keys[valid_rows, 3] = multiple
+        for row, name, red_balls, blue_ball, times in zip(
+                valid_rows.tolist(), np.array(fast_names, dtype=object)[valid].tolist(),
+                red.tolist(), blue.tolist(), multiple.tolist()):
+            bets[row] = {'name': name, 'type': "单式", 'dan': [], 'red': red_balls, 'blue': [blue_ball],
+                         'multiple': times}
+
+    # 2. 其余行逐行解析，收集全部错误
+    errors = []
+    for row in sorted(slow_rows):
+        try:
+            bet = parse_bet_line(*lines[row])
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        bets[row] = bet
+        keys[row] = (red_mask(bet["dan"]), red_mask(bet["red"]), red_mask(bet["blue"]), bet["multiple"])
+
+    # 3. 按号码去重（保留最先出现的方案）
+    rows = np.array([row for row, bet in enumerate(bets) if bet is not None], dtype=np.int64)
+    duplicates = []
+    if len(rows):
+        _, first, inverse = np.unique(keys[rows], axis=0, return_index=True, return_inverse=True)
+        first_of = first[inverse.ravel()]
+        for position in np.nonzero(first_of != np.arange(len(rows)))[0]:
+            row, kept_row = int(rows[position]), int(rows[first_of[position]])
+            duplicates.append(
+                f"第{lines[row][0]}行：“{bets[row]['name']}”与第{lines[kept_row][0]}行“{bets[kept_row]['name']}”号码相同，已忽略"
+            )
+            bets[row] = None
+
+    return [bet for bet in bets if bet is not None], errors, duplicates
+
+
+def write_template_report(report_path, file_path, errors, duplicates):
+    """把模板的全部错误和重复方案写入报告文件"""
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(f"投注模板：{file_path}\n")
+        f.write(f"检查时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"【格式错误】共{len(errors)}行\n")
+        f.writelines(f"{error}\n" for error in errors)
+        f.write(f"\n【重复方案】共{len(duplicates)}个\n")
+        f.writelines(f"{duplicate}\n" for duplicate in duplicates)
+
+
+# ------------------------------ 全历史回测 ------------------------------
+BACKTEST_SUMMARY_HEADERS = (
+    ["方案名称", "类型", "投注号码", "注数", "倍数", "回测期数", "中奖期数"]
+    + [name for name, _, _ in PRIZE_LEVELS[1:]]
+    + ["固定奖金合计", "投注成本", "盈亏", "返奖率", "最长连续未中奖期数", "最近中奖期号"]
+)
+BACKTEST_DETAIL_HEADERS = ["期号", "开奖日期", "方案名称", "奖级", "本期奖金", "累计奖金", "累计成本", "累计盈亏"]
+
+
+def run_backtest(bets, draws, summary_path, detail_path, chunk_size=BACKTEST_CHUNK_ISSUES, progress=None):
+    """用全部开奖历史回测所有方案，按期分批向量化计算并流式写出CSV
+
+    draws 按期号正序；汇总CSV每个方案一行（各奖级次数、奖金与成本、最长连续未中奖），
+    明细CSV只记录中奖的方案和期（含截至该期的累计奖金/成本），逐批追加写入，不在内存中保留全部明细。
+    progress(已完成期数, 总期数) 用于报告进度。返回汇总行列表。
+    """
+    n_bets = len(bets)
+    level_counts = np.zeros((n_bets, len(PRIZE_LEVELS)), dtype=np.int64)
+    cum_prize = np.zeros(n_bets, dtype=np.int64)
+    cum_cost = np.zeros(n_bets, dtype=np.int64)
+    dry_run = np.zeros(n_bets, dtype=np.int64)  # 截至当前的连续未中奖期数
+    longest_dry = np.zeros(n_bets, dtype=np.int64)
+    last_hit = [""] * n_bets
+    hit_draws = np.zeros(n_bets, dtype=np.int64)  # 中奖期数
+    names = [bet["name"] for bet in bets]
+
+    with open(detail_path, "w", newline="", encoding="utf-8-sig") as detail_file:
+        writer = csv.writer(detail_file)
+        writer.writerow(BACKTEST_DETAIL_HEADERS)
+
+        for start in range(0, len(draws), chunk_size):
+            chunk = draws[start:start + chunk_size]
+            engine = PrizeEngine(bets, chunk)
+            prizes = engine.prizes
+            won = engine.levels != 0
+            width = len(chunk)
+
+            # 奖级分布（按中奖注数统计）
+            level_counts += engine.level_counts().sum(axis=1)
+
+            # 连续未中奖：每期距上一次中奖的期数（批内未中过奖的接上一批的计数）
+            positions = np.arange(width)
+            last_win = np.maximum.accumulate(np.where(won, positions, -1), axis=1)
+            runs = np.where(last_win >= 0, positions - last_win, positions + 1 + dry_run[:, None])
+            longest_dry = np.maximum(longest_dry, runs.max(axis=1))
+            dry_run = runs[:, -1]
+
+            hit_draws += won.sum(axis=1)
+            hit_rows = won.any(axis=1)
+            last_hit_index = width - 1 - np.argmax(won[:, ::-1], axis=1)
+            for bet_index in np.nonzero(hit_rows)[0]:
+                last_hit[bet_index] = chunk[last_hit_index[bet_index]]["issue"]
+
+            # 累计奖金与成本，只写出中奖的明细（按期、方案的顺序）
+            prize_curve = cum_prize[:, None] + np.cumsum(prizes, axis=1)
+            cost_curve = cum_cost[:, None] + engine.costs[:, None] * (positions + 1)
+            cum_prize = prize_curve[:, -1]
+            cum_cost = cost_curve[:, -1]
+            draw_indexes, bet_indexes = np.nonzero(won.T)
+            level_names = PRIZE_NAMES[engine.levels[bet_indexes, draw_indexes]]
+            # 复式/胆拖需列出各奖级注数，只有这部分逐条生成说明
+            for i in np.nonzero(engine.tickets[bet_indexes] > 1)[0]:
+                level_names[i] = engine.level_name(bet_indexes[i], draw_indexes[i])
+            win_prizes = prizes[bet_indexes, draw_indexes].tolist()
+            win_prize_curve = prize_curve[bet_indexes, draw_indexes].tolist()
+            win_cost_curve = cost_curve[bet_indexes, draw_indexes].tolist()
+            writer.writerows(
+                (chunk[draw_index]["issue"], chunk[draw_index]["date"], names[bet_index], level_name,
+                 prize, prize_total, cost_total, prize_total - cost_total)
+                for draw_index, bet_index, level_name, prize, prize_total, cost_total in zip(
+                    draw_indexes.tolist(), bet_indexes.tolist(), level_names,
+                    win_prizes, win_prize_curve, win_cost_curve)
+            )
+
+            if progress:
+                progress(start + width, len(draws))
+
+    summary = []
+    for bet_index, bet in enumerate(bets):
+        cost = int(cum_cost[bet_index])
+        prize = int(cum_prize[bet_index])
+        summary.append(
+            [bet["name"], bet["type"], format_bet(bet, " "), bet_ticket_count(bet), bet["multiple"],
+             len(draws), int(hit_draws[bet_index])]
+            + [int(count) for count in level_counts[bet_index, 1:]]
+            + [prize, cost, prize - cost, f"{prize / cost:.2%}" if cost else "-",
+               int(longest_dry[bet_index]), last_hit[bet_index]]
+        )
+
+    with open(summary_path, "w", newline="", encoding="utf-8-sig") as summary_file:
+        writer = csv.writer(summary_file)
+        writer.writerow(BACKTEST_SUMMARY_HEADERS)
+        writer.writerows(summary)
+
+    return summary
+
+
+# ------------------------------ 分页表格与报告 ------------------------------
+RESULT_PAGE_SIZE = 200  # 表格每页显示的行数
+
+
+class TreePager:
+    """Treeview分页显示：只插入当前页的行，行内容按需生成，数据量再大界面也不卡顿"""
+
+    def __init__(self, parent, tree, page_size=RESULT_PAGE_SIZE):
+        self.tree = tree
+        self.page_size = page_size
+        self.row_count = 0
+        self.row_at = None
+        self.page = 0
+
+        self.frame = ttk.Frame(parent)
+        self.btn_prev = ttk.Button(self.frame, text="上一页", command=self.prev_page)
+        self.btn_next = ttk.Button(self.frame, text="下一页", command=self.next_page)
+        self.lbl_page = ttk.Label(self.frame, text="")
+        self.btn_prev.grid(row=0, column=0, padx=(0, 5))
+        self.lbl_page.grid(row=0, column=1, padx=5)
+        self.btn_next.grid(row=0, column=2, padx=(5, 0))
+
+    @property
+    def page_count(self):
+        return max(1, math.ceil(self.row_count / self.page_size))
+
+    def set_rows(self, row_count, row_at):
+        """设置数据源：row_count为总行数，row_at(下标)返回该行的values"""
+        self.row_count = row_count
+        self.row_at = row_at
+        self.page = 0
+        self.show_page()
+
+    def show_page(self):
+        """清空表格并插入当前页的行"""
+        self.tree.delete(*self.tree.get_children())
+        start = self.page * self.page_size
+        for index in range(start, min(start + self.page_size, self.row_count)):
+            self.tree.insert("", tk.END, values=self.row_at(index))
+        self.tree.yview_moveto(0)
+
+        self.lbl_page.config(text=f"第{self.page + 1}/{self.page_count}页（共{self.row_count}行）")
+        self.btn_prev.config(state=tk.NORMAL if self.page > 0 else tk.DISABLED)
+        self.btn_next.config(state=tk.NORMAL if self.page + 1 < self.page_count else tk.DISABLED)
+
+    def prev_page(self):
+        if self.page > 0:
+            self.page -= 1
+            self.show_page()
+
+    def next_page(self):
+        if self.page + 1 < self.page_count:
+            self.page += 1
+            self.show_page()
+
+
+def group_records_by_issue(winning_records):
+    """中奖记录按期号分组（保持原有顺序）"""
+    issue_groups = {}
+    for record in winning_records:
+        issue_groups.setdefault(record["issue"], []).append(record)
+    return issue_groups
+
+
+def write_winning_report(save_path, bets, results, engine, total_prizes, winning_records, progress=None):
+    """把开奖详情报告逐段写入文件（在后台线程中调用，progress(已完成期数, 总期数)回报进度）"""
+    total_all = sum(total_prizes)
+    with open(save_path, 'w', encoding='utf-8') as f:
+        f.write("=" * 80 + "\n")
+        f.write("双色球开奖详情报告".center(80) + "\n")
+        f.write(f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write("=" * 80 + "\n\n")
+
+        # 最新开奖结果
+        if results:
+            latest = results[0]
+            red_str = " ".join(f"{n:02d}" for n in latest["red"])
+            f.write("【最新一期开奖结果】\n")
+            f.write(f"期号:    第{latest['issue']}期\n")
+            f.write(f"日期:    {latest['date']}\n")
+            f.write(f"时间:    {latest['time']}\n")
+            f.write(f"开奖号码: 红球[{red_str}] + 蓝球{latest['blue']:02d}\n\n")
+            f.write("-" * 80 + "\n\n")
+
+        # 投注方案
+        f.write("【您的投注方案】\n")
+        for i, bet in enumerate(bets, 1):
+            f.write(f"方案{i}：{bet['name']}（{bet['type']}，{bet_ticket_count(bet)}注）\n"
+                    f"  号码：{format_bet(bet)}\n"
+                    f"  倍数：{bet['multiple']}倍\n"
+                    f"  总奖金：{total_prizes[i - 1]}元\n\n")
+        f.write("-" * 80 + "\n\n")
+
+        # 中奖统计
+        f.write("【中奖统计汇总】\n")
+        f.write(f"参与方案数：{len(bets)} 个\n")
+        f.write(f"查询期数：{len(results)} 期\n")
+        f.write(f"总中奖金额：{total_all} 元\n")
+        f.write(f"平均每期奖金：{total_all / len(results):.2f} 元\n\n")
+        f.write("-" * 80 + "\n\n")
+
+        # 完整开奖记录（逐期写出，避免整份报告在内存中拼接）
+        f.write(f"【最近{len(results)}期开奖记录】\n")
+        f.write(f"{'期号':<10} {'日期':<12} {'时间':<6} {'开奖号码':<25} {'各方案中奖情况'}\n")
+        f.write("-" * 100 + "\n")
+        for draw_index, res in enumerate(results):
+            red_str = " ".join(f"{n:02d}" for n in res["red"])
+            numbers_str = f"红球[{red_str}] + 蓝球{res['blue']:02d}"
+            scheme_results = ", ".join(
+                f"{bet['name']}:{engine.level_name(bet_index, draw_index)}" for bet_index, bet in enumerate(bets)
+            )
+            f.write(f"{res['issue']:<10} {res['date']:<12} {res['time']:<6} {numbers_str:<25} {scheme_results}\n")
+            if progress and (draw_index + 1) % 20 == 0:
+                progress(draw_index + 1, len(results))
+        f.write("\n" + "-" * 80 + "\n\n")
+
+        # 详细中奖记录
+        f.write("【详细中奖记录】\n")
+        if winning_records:
+            for issue, records in group_records_by_issue(winning_records).items():
+                first_record = records[0]
+                f.write(f"\n► 第{issue}期（{first_record['date']} {first_record['time']}）\n")
+                f.write(f"  开奖号码：{first_record['winning_numbers']}\n")
+                for idx, record in enumerate(records, 1):
+                    f.write(f"  {idx}. {record['scheme']}\n"
+                            f"     投注：{record['bet_text']}（{record['multiple']}倍）\n"
+                            f"     奖项：{record['level']}，奖金{record['prize']}元\n")
+        else:
+            f.write("  ⚠️  暂无中奖记录，继续加油！\n")
+
+        # 兑奖须知
+        f.write("\n" + "=" * 80 + "\n")
+        f.write("【兑奖须知】\n")
+        f.write("  1. 中奖后需在开奖日起60天内到当地福利彩票销售站点或中心兑奖\n")
+        f.write("  2. 单注奖金1万元及以上需缴纳20%个人偶然所得税（由兑奖机构代扣）\n")
+        f.write("  3. 兑奖唯一凭证为官方纸质彩票，本电子报告仅作查询参考，不具备兑奖效力\n")
+        f.write("  4. 官方查询渠道：中国福利彩票网（www.cwl.gov.cn）、福彩官方APP\n")
+        f.write("  5. 理性购彩，量力而行，享受彩票的娱乐属性\n")
+        f.write("=" * 80)
+    if progress:
+        progress(len(results), len(results))
+
+
 class LotteryApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -40,6 +779,8 @@ class LotteryApp(tk.Tk):
         self.lottery_results = []  # 获取的开奖数据
         self.winning_records = []  # 中奖记录
         self.total_prizes = []  # 总奖金
+        self.prize_engine = None  # 最近一次的中奖计算结果（报告复用）
+        self.history_store = DrawHistoryStore()  # 本地开奖历史库
 
         # 初始化界面
         self._setup_style()
@@ -49,6 +790,7 @@ class LotteryApp(tk.Tk):
         # 禁用初始状态下不可用的按钮
         self.btn_query.config(state=tk.DISABLED)
         self.btn_save.config(state=tk.DISABLED)
+        self.btn_backtest.config(state=tk.DISABLED)
 
     def _setup_style(self):
         """设置界面样式"""
@@ -174,6 +916,12 @@ class LotteryApp(tk.Tk):
             style="Secondary.TButton",
             command=self.save_winning_details
         )
+        self.btn_backtest = ttk.Button(
+            self.btn_frame,
+            text="全历史回测",
+            style="Secondary.TButton",
+            command=self.start_backtest_thread
+        )
 
         # 3. 投注方案展示区域
         self.bet_frame = ttk.LabelFrame(self, text="我的投注方案", style="Info.TLabel")
@@ -181,17 +929,21 @@ class LotteryApp(tk.Tk):
         self.tree_bets = ttk.Treeview(
             self.bet_frame,
             style="Lottery.Treeview",
-            columns=("name", "red", "blue", "multiple"),
+            columns=("name", "type", "red", "blue", "tickets", "multiple"),
             show="headings"
         )
         # 设置投注方案表格列
         self.tree_bets.heading("name", text="方案名称", anchor=tk.CENTER)
+        self.tree_bets.heading("type", text="类型", anchor=tk.CENTER)
         self.tree_bets.heading("red", text="红球", anchor=tk.CENTER)
         self.tree_bets.heading("blue", text="蓝球", anchor=tk.CENTER)
+        self.tree_bets.heading("tickets", text="注数", anchor=tk.CENTER)
         self.tree_bets.heading("multiple", text="投注倍数", anchor=tk.CENTER)
         self.tree_bets.column("name", width=200, anchor=tk.CENTER)
+        self.tree_bets.column("type", width=60, anchor=tk.CENTER)
         self.tree_bets.column("red", width=300, anchor=tk.CENTER)
-        self.tree_bets.column("blue", width=80, anchor=tk.CENTER)
+        self.tree_bets.column("blue", width=100, anchor=tk.CENTER)
+        self.tree_bets.column("tickets", width=80, anchor=tk.CENTER)
         self.tree_bets.column("multiple", width=100, anchor=tk.CENTER)
         # 投注方案滚动条
         self.scroll_bets = ttk.Scrollbar(
@@ -200,6 +952,7 @@ class LotteryApp(tk.Tk):
             command=self.tree_bets.yview
         )
         self.tree_bets.configure(yscrollcommand=self.scroll_bets.set)
+        self.bet_pager = TreePager(self.bet_frame, self.tree_bets)
 
         # 4. 开奖结果展示区域
         self.result_frame = ttk.LabelFrame(self, text="开奖结果与中奖情况", style="Info.TLabel")
@@ -228,6 +981,7 @@ class LotteryApp(tk.Tk):
             command=self.tree_results.yview
         )
         self.tree_results.configure(yscrollcommand=self.scroll_results.set)
+        self.result_pager = TreePager(self.result_frame, self.tree_results)
 
         # 5. 中奖汇总区域
         self.summary_frame = ttk.LabelFrame(self, text="中奖汇总", style="Info.TLabel")
@@ -263,13 +1017,15 @@ class LotteryApp(tk.Tk):
         self.btn_load.grid(row=0, column=1, padx=(0, 10), sticky="w")
         self.btn_query.grid(row=0, column=2, padx=(0, 10), sticky="w")
         self.btn_save.grid(row=0, column=3, padx=(0, 10), sticky="w")
+        self.btn_backtest.grid(row=0, column=4, padx=(0, 10), sticky="w")
         # 按钮区域右对齐填充
-        self.btn_frame.grid_columnconfigure(4, weight=1)
+        self.btn_frame.grid_columnconfigure(5, weight=1)
 
         # 投注方案区域
         self.bet_frame.grid(row=2, column=0, columnspan=4, padx=20, pady=(0, 10), sticky="nsew")
         self.tree_bets.grid(row=0, column=0, sticky="nsew")
         self.scroll_bets.grid(row=0, column=1, sticky="ns")
+        self.bet_pager.frame.grid(row=1, column=0, columnspan=2, pady=(5, 0), sticky="e")
         self.bet_frame.grid_rowconfigure(0, weight=1)
         self.bet_frame.grid_columnconfigure(0, weight=1)
 
@@ -277,6 +1033,7 @@ class LotteryApp(tk.Tk):
         self.result_frame.grid(row=3, column=0, columnspan=4, padx=20, pady=(0, 10), sticky="nsew")
         self.tree_results.grid(row=0, column=0, sticky="nsew")
         self.scroll_results.grid(row=0, column=1, sticky="ns")
+        self.result_pager.frame.grid(row=1, column=0, columnspan=2, pady=(5, 0), sticky="e")
         self.result_frame.grid_rowconfigure(0, weight=1)
         self.result_frame.grid_columnconfigure(0, weight=1)
 
@@ -309,13 +1066,16 @@ class LotteryApp(tk.Tk):
 # 双色球投注模板（TXT版）
 # 编辑说明：
 # 1. 每行代表1个投注方案，空行和以"#"开头的行会被忽略
-# 2. 方案格式：方案名称,红球1,红球2,红球3,红球4,红球5,红球6,蓝球,投注倍数
-# 3. 格式要求：
-#    - 红球：6个1-33的不重复整数（用英文逗号分隔）
-#    - 蓝球：1个1-16的整数
-#    - 倍数：正整数（≥1，代表投注倍数）
+# 2. 单式格式：方案名称,红球1,红球2,红球3,红球4,红球5,红球6,蓝球,投注倍数
+# 3. 复式/胆拖格式：方案名称,红球,蓝球,投注倍数（同一栏内的号码用空格分隔）
+#    - 复式：红球6-20个、蓝球1-16个，例如：复式方案,1 5 10 15 20 25 30,8 12,1
+#    - 胆拖：红球写作“胆码#拖码”，胆码1-5个、胆码+拖码7-20个，例如：胆拖方案,1 5#10 15 20 25 30,8,1
+# 4. 格式要求：
+#    - 红球：1-33的不重复整数
+#    - 蓝球：1-16的不重复整数
+#    - 倍数：1-99的整数（代表投注倍数）
 #    - 名称：可自定义（不包含英文逗号）
-# 4. 示例如下（可直接修改或复制新增方案）
+# 5. 示例如下（可直接修改或复制新增方案）
 
 # 方案示例1
 我的守号方案,1,5,10,15,20,25,8,1
@@ -323,6 +1083,12 @@ class LotteryApp(tk.Tk):
 # 方案示例2
 随机选号方案,2,6,11,16,21,26,12,2
 
+# 方案示例3（复式：7个红球、2个蓝球，共14注）
+复式方案,3 7 12 17 22 27 32,5 9,1
+
+# 方案示例4（胆拖：胆码2个、拖码5个，共5注）
+胆拖方案,1 5#10 15 20 25 30,8,1
+
 # 新增方案请按照上述格式添加（示例：）
 # 幸运方案,3,7,12,17,22,27,5,3
 """
@@ -342,11 +1108,11 @@ class LotteryApp(tk.Tk):
             messagebox.showerror("生成失败", f"模板生成出错：{str(e)}")
 
     def load_bet_template(self):
-        """加载投注模板（支持手动选择文件）"""
+        """加载投注模板（支持手动选择TXT/CSV/XLSX文件，解析在后台线程中进行）"""
         # 打开文件选择对话框
         file_path = filedialog.askopenfilename(
             title="选择投注模板",
-            filetypes=[("TXT文件", "*.txt"), ("所有文件", "*.*")],
+            filetypes=TEMPLATE_FILETYPES,
             initialdir=os.path.join(os.path.expanduser('~'), 'Desktop'),
             initialfile=TEMPLATE_FILENAME
         )
@@ -354,79 +1120,58 @@ class LotteryApp(tk.Tk):
         if not file_path:
             return  # 用户取消选择
 
-        try:
-            valid_bets = []
-            line_num = 0
-
-            # 读取并解析模板
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line_num += 1
-                    stripped_line = line.strip()
-                    if not stripped_line or stripped_line.startswith('#'):
-                        continue
-
-                    # 验证格式
-                    parts = stripped_line.split(',')
-                    if len(parts) != 9:
-                        raise ValueError(f"第{line_num}行：需包含9个部分（当前{len(parts)}个）")
-
-                    # 提取字段
-                    scheme_name = parts[0].strip()
-                    if not scheme_name:
-                        raise ValueError(f"第{line_num}行：方案名称不能为空")
-
-                    # 验证红球
-                    red_balls = []
-                    for i, part in enumerate(parts[1:7], 1):
-                        try:
-                            red_num = int(part.strip())
-                        except ValueError:
-                            raise ValueError(f"第{line_num}行：第{i}个红球不是整数")
-                        if red_num < 1 or red_num > 33:
-                            raise ValueError(f"第{line_num}行：第{i}个红球超出1-33范围")
-                        red_balls.append(red_num)
-                    if len(set(red_balls)) != 6:
-                        raise ValueError(f"第{line_num}行：红球存在重复数字")
-
-                    # 验证蓝球
-                    try:
-                        blue_ball = int(parts[7].strip())
-                    except ValueError:
-                        raise ValueError(f"第{line_num}行：蓝球不是整数")
-                    if blue_ball < 1 or blue_ball > 16:
-                        raise ValueError(f"第{line_num}行：蓝球超出1-16范围")
-
-                    # 验证倍数
-                    try:
-                        multiple = int(parts[8].strip())
-                    except ValueError:
-                        raise ValueError(f"第{line_num}行：倍数不是整数")
-                    if multiple < 1:
-                        raise ValueError(f"第{line_num}行：倍数需≥1")
-
-                    valid_bets.append({
-                        'name': scheme_name,
-                        'red': red_balls,
-                        'blue': blue_ball,
-                        'multiple': multiple
-                    })
+        self.btn_load.config(state=tk.DISABLED)
+        self.update_status("🔍 正在解析投注模板...", "info")
+        threading.Thread(target=self.load_template_task, args=(file_path,), daemon=True).start()
 
+    def load_template_task(self, file_path):
+        """后台解析模板（在子线程中运行），有错误或重复时生成完整报告"""
+        try:
+            valid_bets, errors, duplicates = load_bet_template_file(file_path)
+            report_path = None
+            if errors or duplicates:
+                report_path = os.path.splitext(file_path)[0] + "_检查报告.txt"
+                write_template_report(report_path, file_path, errors, duplicates)
+            self.after(0, lambda: self.finish_load_template(valid_bets, errors, duplicates, report_path))
+        except Exception as e:
+            self.after(0, lambda err=str(e): self.handle_load_error(err))
+
+    def finish_load_template(self, valid_bets, errors, duplicates, report_path):
+        """模板解析完成后更新界面"""
+        self.btn_load.config(state=tk.NORMAL)
+        if errors:
+            preview = "\n".join(errors[:TEMPLATE_ERROR_PREVIEW])
+            if len(errors) > TEMPLATE_ERROR_PREVIEW:
+                preview += f"\n……共{len(errors)}处错误"
+            message = f"模板中有{len(errors)}行格式错误：\n{preview}\n\n完整报告：{report_path}"
             if not valid_bets:
-                raise ValueError("模板中无有效投注方案")
-
-            # 更新全局变量和界面
-            self.user_bets = valid_bets
-            self.update_bet_tree()
-            self.update_status(f"✅ 成功加载{len(valid_bets)}个投注方案", "info")
-            messagebox.showinfo("加载成功", f"共加载{len(valid_bets)}个投注方案")
+                self.handle_load_error(message)
+                return
+            if not messagebox.askyesno("模板存在错误", f"{message}\n\n是否忽略错误行，加载其余{len(valid_bets)}个方案？"):
+                self.update_status(f"⚠️ 模板有{len(errors)}行错误，未加载", "warning")
+                return
+        if not valid_bets:
+            self.handle_load_error("模板中无有效投注方案")
+            return
 
-            # 启用查询按钮
-            self.btn_query.config(state=tk.NORMAL)
+        # 更新全局变量和界面
+        self.user_bets = valid_bets
+        self.update_bet_tree()
+        status = f"✅ 成功加载{len(valid_bets)}个投注方案"
+        if duplicates:
+            status += f"（忽略{len(duplicates)}个重复方案，详见{report_path}）"
+        self.update_status(status, "info")
+        messagebox.showinfo("加载成功", f"共加载{len(valid_bets)}个投注方案" +
+                            (f"\n已忽略{len(duplicates)}个号码重复的方案" if duplicates else ""))
+
+        # 启用查询按钮
+        self.btn_query.config(state=tk.NORMAL)
+        self.btn_backtest.config(state=tk.NORMAL)
 
-        except Exception as e:
-            self.update_status(f"❌ 加载模板失败：{str(e)}", "warning")
-            messagebox.showerror("加载失败", f"模板解析出错：{str(e)}")
+    def handle_load_error(self, error_msg):
+        self.btn_load.config(state=tk.NORMAL)
+        self.update_status(f"❌ 加载模板失败：{error_msg.splitlines()[0]}", "warning")
+        messagebox.showerror("加载失败", f"模板解析出错：{error_msg}")
 
     def start_query_thread(self):
         """启动查询线程（避免界面卡住）"""
@@ -452,71 +1197,202 @@ class LotteryApp(tk.Tk):
 
         except Exception as e:
             # 异常处理（回到主线程更新界面）
-            self.after(0, lambda: self.handle_query_error(str(e)))
+            self.after(0, lambda err=str(e): self.handle_query_error(err))
+
+    def start_backtest_thread(self):
+        """选择导出目录后在子线程执行全历史回测"""
+        output_dir = filedialog.askdirectory(
+            title="选择回测结果保存目录",
+            initialdir=os.path.join(os.path.expanduser('~'), 'Desktop')
+        )
+        if not output_dir:
+            return
+
+        self.btn_query.config(state=tk.DISABLED)
+        self.btn_backtest.config(state=tk.DISABLED)
+        self.update_status("🔍 正在更新开奖历史并回测...（请稍候）", "info")
+        threading.Thread(target=self.run_backtest_task, args=(output_dir,), daemon=True).start()
+
+    def run_backtest_task(self, output_dir):
+        """全历史回测（子线程执行）：结果直接写CSV，界面只显示各方案汇总"""
+        try:
+            # 先补充最新开奖，再取本地全部历史（按期号正序）
+            self.fetch_lottery_results()
+            draws = list(reversed(self.history_store.recent()))
+            if not draws:
+                raise Exception("本地没有开奖历史")
+
+            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            summary_path = os.path.join(output_dir, f"双色球回测汇总_{timestamp}.csv")
+            detail_path = os.path.join(output_dir, f"双色球回测中奖明细_{timestamp}.csv")
+
+            def progress(done, total):
+                self.after(0, lambda: self.update_status(f"🔍 回测中：{done}/{total} 期", "info"))
+
+            summary = run_backtest(self.user_bets, draws, summary_path, detail_path, progress=progress)
+            self.after(0, lambda: self.show_backtest_summary(summary, draws, summary_path, detail_path))
+        except Exception as e:
+            self.after(0, lambda err=str(e): self.handle_backtest_error(err))
+
+    def show_backtest_summary(self, summary, draws, summary_path, detail_path):
+        """在汇总区域显示回测结果"""
+        columns = dict(zip(BACKTEST_SUMMARY_HEADERS, zip(*summary)))
+        content = "=== 双色球全历史回测 ===\n"
+        content += f"回测范围：第{draws[0]['issue']}期 ~ 第{draws[-1]['issue']}期，共 {len(draws)} 期\n"
+        content += f"参与方案：{len(summary)} 个\n"
+        content += f"汇总文件：{summary_path}\n"
+        content += f"中奖明细文件：{detail_path}\n\n"
+        for i, row in enumerate(summary):
+            record = {header: values[i] for header, values in columns.items()}
+            distribution = "，".join(f"{name}{record[name]}次" for name, _, _ in PRIZE_LEVELS[1:] if record[name])
+            content += f"{i + 1}. {record['方案名称']}\n"
+            content += f"   中奖 {record['中奖期数']} 期：{distribution or '无'}\n"
+            content += (f"   固定奖金 {record['固定奖金合计']} 元 / 成本 {record['投注成本']} 元，"
+                        f"盈亏 {record['盈亏']} 元（返奖率 {record['返奖率']}）\n")
+            content += f"   最长连续未中奖：{record['最长连续未中奖期数']} 期\n\n"
+        content += "注：一、二等奖为浮动奖金，未计入固定奖金合计\n"
+
+        self.txt_summary.config(state=tk.NORMAL)
+        self.txt_summary.delete(1.0, tk.END)
+        self.txt_summary.insert(1.0, content)
+        self.txt_summary.config(state=tk.DISABLED)
+
+        self.update_status(f"✅ 回测完成！共 {len(draws)} 期，结果已导出", "info")
+        self.btn_query.config(state=tk.NORMAL)
+        self.btn_backtest.config(state=tk.NORMAL)
+
+    def handle_backtest_error(self, error_msg):
+        """处理回测错误"""
+        self.update_status(f"❌ 回测失败：{error_msg}", "warning")
+        self.btn_query.config(state=tk.NORMAL)
+        self.btn_backtest.config(state=tk.NORMAL)
+        messagebox.showerror("回测失败", f"回测出错：{error_msg}")
 
     def fetch_lottery_results(self):
-        """多源获取彩票结果（复用原有逻辑）"""
+        """从本地开奖历史库返回最近 LATEST_ISSUES 期，必要时先联网补充新开奖的期数
+
+        本地最新一期之后还没到下一次开奖时间时不联网；联网失败但本地有数据时使用本地数据（离线可用）
+        """
+        store = self.history_store
+        latest = store.latest()
+
+        if latest is None or datetime.now() >= next_draw_time(latest["date"]):
+            try:
+                source_name, results = self.fetch_remote_results(issues_to_fetch(latest))
+                if latest is not None:
+                    results = [res for res in results if res["issue"] >= latest["issue"]]
+                added = store.save(results, source_name)
+                self.after(0, lambda s=source_name, n=added: self.update_status(
+                    f"✅ 已从{s}更新开奖历史，新增{n}期", "info"))
+            except Exception as e:
+                if latest is None:
+                    raise
+                self.after(0, lambda err=str(e): self.update_status(
+                    f"⚠️ 联网更新失败，使用本地开奖历史：{err[:20]}...", "warning"))
+
+        return store.recent(LATEST_ISSUES)
+
+    def fetch_remote_results(self, count):
+        """同时向所有数据源获取最近 count 期彩票结果，返回 (数据源名称, 按期号倒序的结果)
+
+        结果与本地已有的开奖历史或另一个数据源的共同期号号码一致才采用（交叉校验），
+        号码不一致的数据源会被忽略；采用后不再等待其余数据源。
+        所有可用数据源都无法交叉校验时（如首次使用只有一个源可用），采用最先返回的结果。
+        """
         sources = [
             ("中国福彩网API", self.fetch_cwl_gov_results),
             ("500彩票网爬虫", self.fetch_500_data),
             ("网易彩票API", self.fetch_netease_data),
             ("千彩网API", self.fetch_296o_data)
         ]
+        local_results = self.history_store.recent(10)
 
-        for source_name, fetch_func in sources:
-            try:
-                self.after(0, lambda s=source_name: self.update_status(f"🔍 尝试从{s}获取数据...", "info"))
-                results = fetch_func()
-                if results:
-                    sorted_results = sorted(results, key=lambda x: x["issue"], reverse=True)
-                    return sorted_results
-            except Exception as e:
-                self.after(0, lambda s=source_name, err=str(e): self.update_status(f"❌ {s}获取失败：{err[:20]}...",
-                                                                                   "warning"))
+        self.after(0, lambda: self.update_status(f"🔍 正在同时从{len(sources)}个数据源获取数据...", "info"))
+        executor = ThreadPoolExecutor(max_workers=len(sources))
+        futures = {executor.submit(fetch_func, count): source_name for source_name, fetch_func in sources}
+        candidates = []  # 已返回且未发现问题、但尚未交叉校验的结果
+
+        try:
+            for future in as_completed(futures):
+                source_name = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self.after(0, lambda s=source_name, err=str(e): self.update_status(
+                        f"❌ {s}获取失败：{err[:20]}...", "warning"))
+                    continue
+                if not results:
+                    self.after(0, lambda s=source_name: self.update_status(f"❌ {s}未返回数据", "warning"))
+                    continue
+                results = sorted(results, key=lambda x: x["issue"], reverse=True)
+
+                # 与本地历史校验
+                overlap, mismatched = cross_check(results, local_results)
+                if mismatched:
+                    self.after(0, lambda s=source_name, m=mismatched: self.update_status(
+                        f"⚠️ {s}的第{m[0]}期等{len(m)}期号码与本地历史不一致，已忽略", "warning"))
+                    continue
+                if overlap:
+                    return source_name, results
+
+                # 与其他数据源校验
+                confirmed_by = None
+                for other_name, other_results in candidates:
+                    overlap, mismatched = cross_check(results, other_results)
+                    if mismatched:
+                        self.after(0, lambda s=source_name, o=other_name, m=mismatched: self.update_status(
+                            f"⚠️ {s}与{o}的第{m[0]}期等{len(m)}期号码不一致", "warning"))
+                    elif overlap and confirmed_by is None:
+                        confirmed_by = (other_name, other_results)
+                if confirmed_by is not None:
+                    # 两个数据源一致，采用期数较多的一组
+                    return max([(source_name, results), confirmed_by], key=lambda item: len(item[1]))
+                candidates.append((source_name, results))
+        finally:
+            # 不再等待其余数据源（已在请求中的线程会在各自超时后结束）
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if candidates:
+            source_name, results = candidates[0]
+            self.after(0, lambda s=source_name: self.update_status(f"⚠️ 仅{s}的数据可用，未能交叉校验", "warning"))
+            return source_name, results
 
         raise Exception("所有数据源均不可用，请检查网络或稍后重试")
 
     def analyze_winning(self):
-        """分析中奖情况（复用原有逻辑）"""
+        """分析中奖情况（向量化计算所有方案 × 所有期，结果缓存在 self.prize_engine）"""
         valid_bets = self.user_bets
         results = self.lottery_results
 
-        total_prizes = []
-        winning_records = []
+        engine = PrizeEngine(valid_bets, results)
+        self.prize_engine = engine
+        total_prizes = engine.bet_totals().tolist()
 
-        for bet in valid_bets:
-            bet_total = 0
-            for res in results:
-                level, prize_str, prize_val = self.check_prize(
-                    bet["red"], bet["blue"], res["red"], res["blue"]
-                )
-                total = prize_val * bet["multiple"] if level != "未中奖" else 0
-                bet_total += total
-
-                if level != "未中奖":
-                    red_str = " ".join(f"{n:02d}" for n in res["red"])
-                    numbers_str = f"{red_str} + {res['blue']:02d}"
-                    winning_records.append({
-                        "issue": res["issue"],
-                        "date": res["date"],
-                        "time": res["time"],
-                        "scheme": bet["name"],
-                        "red": bet["red"],
-                        "blue": bet["blue"],
-                        "multiple": bet["multiple"],
-                        "prize": total,
-                        "level": level,
-                        "winning_numbers": numbers_str
-                    })
-            total_prizes.append(bet_total)
+        winning_records = []
+        for bet_index, draw_index in engine.winning_pairs():
+            bet = valid_bets[bet_index]
+            res = results[draw_index]
+            red_str = " ".join(f"{n:02d}" for n in res["red"])
+            numbers_str = f"{red_str} + {res['blue']:02d}"
+            winning_records.append({
+                "issue": res["issue"],
+                "date": res["date"],
+                "time": res["time"],
+                "scheme": bet["name"],
+                "bet_text": format_bet(bet),
+                "multiple": bet["multiple"],
+                "prize": int(engine.prizes[bet_index, draw_index]),
+                "level": engine.level_name(bet_index, draw_index),
+                "winning_numbers": numbers_str
+            })
 
         return total_prizes, winning_records, results
 
     # ------------------------------ 数据获取函数（复用原有逻辑） ------------------------------
-    def fetch_cwl_gov_results(self):
+    def fetch_cwl_gov_results(self, count=LATEST_ISSUES):
         try:
             url = "http://www.cwl.gov.cn/cwl_admin/front/cwlkj/searchKjxx/findDrawNotice"
-            params = {"name": "ssq", "issueCount": LATEST_ISSUES, "issueStart": "", "issueEnd": "", "dayStart": "",
+            params = {"name": "ssq", "issueCount": count, "issueStart": "", "issueEnd": "", "dayStart": "",
                       "dayEnd": ""}
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
@@ -537,18 +1413,18 @@ class LotteryApp(tk.Tk):
                     if open_time == "00:00":
                         open_time = "21:15"
                     results.append({
-                        "issue": item["code"],
+                        "issue": normalize_issue(item["code"]),
                         "date": item["date"][:10],
                         "time": open_time,
                         "red": red_balls,
                         "blue": blue_ball
                     })
-                return results[:LATEST_ISSUES]
+                return results[:count]
         except Exception:
             pass
         return None
 
-    def fetch_500_data(self):
+    def fetch_500_data(self, count=LATEST_ISSUES):
         try:
             url = "https://datachart.500.com/ssq/history/newinc/history.php?start=00001&end=99999"
             headers = {
@@ -561,7 +1437,7 @@ class LotteryApp(tk.Tk):
                 return None
 
             results = []
-            for row in table.find_all('tr')[:LATEST_ISSUES]:
+            for row in table.find_all('tr')[:count]:
                 cols = row.find_all('td')
                 if len(cols) < 16:
                     continue
@@ -573,7 +1449,7 @@ class LotteryApp(tk.Tk):
                     dt = datetime.strptime(date, "%Y-%m-%d")
                     if dt.weekday() in [1, 3, 6]:
                         results.append({
-                            "issue": issue,
+                            "issue": normalize_issue(issue),
                             "date": date,
                             "time": "21:15",
                             "red": red_balls,
@@ -583,10 +1459,10 @@ class LotteryApp(tk.Tk):
         except Exception:
             return None
 
-    def fetch_netease_data(self):
+    def fetch_netease_data(self, count=LATEST_ISSUES):
         try:
             url = "https://cailele.tech/lottery/ssq"
-            params = {"limit": LATEST_ISSUES}
+            params = {"limit": count}
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"}
             response = requests.get(url, params=params, headers=headers, timeout=8)
@@ -604,20 +1480,20 @@ class LotteryApp(tk.Tk):
                         dt = datetime.strptime(item["lottery_date"], "%Y-%m-%d")
                         if dt.weekday() in [1, 3, 6]:
                             results.append({
-                                "issue": item["lottery_no"],
+                                "issue": normalize_issue(item["lottery_no"]),
                                 "date": item["lottery_date"],
                                 "time": "21:15",
                                 "red": red_balls,
                                 "blue": blue_ball
                             })
-                return results[:LATEST_ISSUES]
+                return results[:count]
         except Exception:
             return None
 
-    def fetch_296o_data(self):
+    def fetch_296o_data(self, count=LATEST_ISSUES):
         try:
             url = "https://api.296o.com/api"
-            params = {"code": "ssq", "rows": LATEST_ISSUES, "format": "json"}
+            params = {"code": "ssq", "rows": count, "format": "json"}
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"}
             response = requests.get(url, params=params, headers=headers, timeout=8)
@@ -635,49 +1511,36 @@ class LotteryApp(tk.Tk):
                         dt = datetime.strptime(item["opentime"][:10], "%Y-%m-%d")
                         if dt.weekday() in [1, 3, 6]:
                             results.append({
-                                "issue": item["expect"].replace("-", ""),
+                                "issue": normalize_issue(item["expect"]),
                                 "date": item["opentime"][:10],
                                 "time": "21:15",
                                 "red": red_balls,
                                 "blue": blue_ball
                             })
-                return results[:LATEST_ISSUES]
+                return results[:count]
         except Exception:
             return None
 
     def check_prize(self, user_red, user_blue, prize_red, prize_blue):
-        """判断中奖等级（复用原有逻辑）"""
+        """判断单注中奖等级（与 PrizeEngine 使用同一张奖级表）"""
         red_match = len(set(user_red) & set(prize_red))
         blue_match = user_blue == prize_blue
-
-        if red_match == 6 and blue_match:
-            return "一等奖", "浮动(最高1000万)", 0
-        elif red_match == 6:
-            return "二等奖", "浮动", 0
-        elif red_match == 5 and blue_match:
-            return "三等奖", "3000元", 3000
-        elif red_match == 5 or (red_match == 4 and blue_match):
-            return "四等奖", "200元", 200
-        elif red_match == 4 or (red_match == 3 and blue_match):
-            return "五等奖", "10元", 10
-        elif blue_match:
-            return "六等奖", "5元", 5
-        return "未中奖", "0元", 0
+        return PRIZE_LEVELS[PRIZE_LEVEL_INDEX[red_match, int(blue_match)]]
 
     # ------------------------------ 界面更新函数 ------------------------------
     def update_bet_tree(self):
-        """更新投注方案表格"""
-        # 清空现有数据
-        for item in self.tree_bets.get_children():
-            self.tree_bets.delete(item)
-
-        # 添加新数据
-        for bet in self.user_bets:
-            red_str = "、".join(map(str, bet["red"]))
-            self.tree_bets.insert(
-                "", tk.END,
-                values=(bet["name"], red_str, bet["blue"], bet["multiple"])
-            )
+        """更新投注方案表格（分页显示）"""
+        def row_at(index):
+            bet = self.user_bets[index]
+            if bet["dan"]:
+                tuo = [n for n in bet["red"] if n not in bet["dan"]]
+                red_str = f"胆 {'、'.join(map(str, bet['dan']))} 拖 {'、'.join(map(str, tuo))}"
+            else:
+                red_str = "、".join(map(str, bet["red"]))
+            return (bet["name"], bet["type"], red_str, "、".join(map(str, bet["blue"])),
+                    bet_ticket_count(bet), bet["multiple"])
+
+        self.bet_pager.set_rows(len(self.user_bets), row_at)
 
     def update_result_interface(self):
         """更新开奖结果和中奖汇总界面"""
@@ -703,44 +1566,26 @@ class LotteryApp(tk.Tk):
             messagebox.showinfo("查询完成", "未查询到中奖记录，继续加油！")
 
     def update_result_tree(self):
-        """更新开奖结果表格（只显示有中奖的期数）"""
-        # 清空现有数据
-        for item in self.tree_results.get_children():
-            self.tree_results.delete(item)
-
-        # 筛选有中奖的期数
-        winning_issues = set(record["issue"] for record in self.winning_records)
-        result_data = []
-
-        for res in self.lottery_results:
-            if res["issue"] not in winning_issues:
-                continue  # 跳过无中奖的期数
+        """更新开奖结果表格（只显示有中奖的期数，分页显示，行内容直接取自中奖计算结果）"""
+        engine = self.prize_engine
+        results = self.lottery_results
+        bets = self.user_bets
+        winning_draws = np.nonzero(engine.levels.any(axis=0))[0]
 
-            # 格式化开奖号码
+        def row_at(index):
+            draw_index = int(winning_draws[index])
+            res = results[draw_index]
             red_str = " ".join(f"{n:02d}" for n in res["red"])
             numbers_str = f"红球[{red_str}] + 蓝球{res['blue']:02d}"
-
             # 汇总该期所有方案的中奖情况
-            prize_info = []
-            for i, bet in enumerate(self.user_bets):
-                level, _, _ = self.check_prize(bet["red"], bet["blue"], res["red"], res["blue"])
-                if level != "未中奖":
-                    prize_info.append(f"{bet['name']}：{level}")
-
-            result_data.append({
-                "issue": res["issue"],
-                "date": res["date"],
-                "time": res["time"],
-                "numbers": numbers_str,
-                "prize": " | ".join(prize_info) if prize_info else "未中奖"
-            })
+            prize_info = [
+                f"{bets[bet_index]['name']}：{engine.level_name(bet_index, draw_index)}"
+                for bet_index in np.nonzero(engine.levels[:, draw_index])[0]
+            ]
+            return (res["issue"], res["date"], res["time"], numbers_str,
+                    " | ".join(prize_info) if prize_info else "未中奖")
 
-        # 添加数据到表格
-        for data in result_data:
-            self.tree_results.insert(
-                "", tk.END,
-                values=(data["issue"], data["date"], data["time"], data["numbers"], data["prize"])
-            )
+        self.result_pager.set_rows(len(winning_draws), row_at)
 
     def update_summary_text(self):
         """更新中奖汇总文本"""
@@ -748,53 +1593,48 @@ class LotteryApp(tk.Tk):
         self.txt_summary.config(state=tk.NORMAL)
         self.txt_summary.delete(1.0, tk.END)
 
-        # 构建汇总内容
+        # 构建汇总内容（各段先放入列表，最后一次拼接）
         total_all = sum(self.total_prizes)
-        content = f"=== 双色球中奖汇总报告 ===\n"
-        content += f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        content += f"查询期数：{len(self.lottery_results)} 期\n"
-        content += f"参与方案：{len(self.user_bets)} 个\n"
-        content += f"总中奖金额：{total_all} 元\n"
-        content += f"平均每期奖金：{total_all / len(self.lottery_results):.2f} 元\n\n"
+        lines = [
+            "=== 双色球中奖汇总报告 ===\n",
+            f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"查询期数：{len(self.lottery_results)} 期\n",
+            f"参与方案：{len(self.user_bets)} 个\n",
+            f"总中奖金额：{total_all} 元\n",
+            f"平均每期奖金：{total_all / len(self.lottery_results):.2f} 元\n\n",
+        ]
 
         # 方案详情
-        content += "=== 各方案中奖详情 ===\n"
+        lines.append("=== 各方案中奖详情 ===\n")
         for i, (bet, total) in enumerate(zip(self.user_bets, self.total_prizes), 1):
-            red_str = "、".join(map(str, bet["red"]))
-            content += f"{i}. {bet['name']}\n"
-            content += f"   投注：红球[{red_str}] + 蓝球{bet['blue']}（{bet['multiple']}倍）\n"
-            content += f"   奖金：{total} 元\n\n"
+            lines.append(f"{i}. {bet['name']}（{bet['type']}，{bet_ticket_count(bet)}注）\n")
+            lines.append(f"   投注：{format_bet(bet)}（{bet['multiple']}倍）\n")
+            lines.append(f"   奖金：{total} 元\n\n")
 
         # 中奖记录（如有）
+        lines.append("=== 详细中奖记录 ===\n")
         if self.winning_records:
-            content += "=== 详细中奖记录 ===\n"
             # 按期号分组
-            issue_groups = {}
-            for record in self.winning_records:
-                if record["issue"] not in issue_groups:
-                    issue_groups[record["issue"]] = []
-                issue_groups[record["issue"]].append(record)
-
+            issue_groups = group_records_by_issue(self.winning_records)
             for issue, records in sorted(issue_groups.items(), reverse=True):
                 first = records[0]
-                content += f"第{issue}期（{first['date']} {first['time']}）\n"
-                content += f"   开奖号码：{first['winning_numbers']}\n"
+                lines.append(f"第{issue}期（{first['date']} {first['time']}）\n")
+                lines.append(f"   开奖号码：{first['winning_numbers']}\n")
                 for idx, record in enumerate(records, 1):
-                    content += f"   {idx}. {record['scheme']}：{record['level']}（{record['prize']}元）\n"
-                content += "\n"
+                    lines.append(f"   {idx}. {record['scheme']}：{record['level']}（{record['prize']}元）\n")
+                lines.append("\n")
         else:
-            content += "=== 详细中奖记录 ===\n"
-            content += "   暂无中奖记录，继续加油！\n"
+            lines.append("   暂无中奖记录，继续加油！\n")
 
         # 兑奖须知
-        content += "=== 兑奖须知 ===\n"
-        content += "1. 中奖后需在开奖日起60天内到当地福彩站点兑奖\n"
-        content += "2. 单注奖金1万元及以上需缴纳20%个人偶然所得税\n"
-        content += "3. 兑奖唯一凭证为官方纸质彩票，本报告仅作参考\n"
-        content += "4. 理性购彩，量力而行，享受娱乐属性\n"
+        lines.append("=== 兑奖须知 ===\n")
+        lines.append("1. 中奖后需在开奖日起60天内到当地福彩站点兑奖\n")
+        lines.append("2. 单注奖金1万元及以上需缴纳20%个人偶然所得税\n")
+        lines.append("3. 兑奖唯一凭证为官方纸质彩票，本报告仅作参考\n")
+        lines.append("4. 理性购彩，量力而行，享受娱乐属性\n")
 
         # 插入内容
-        self.txt_summary.insert(1.0, content)
+        self.txt_summary.insert(1.0, "".join(lines))
         self.txt_summary.config(state=tk.DISABLED)
 
     def update_status(self, text, status_type="info"):
@@ -812,7 +1652,7 @@ class LotteryApp(tk.Tk):
         messagebox.showerror("查询失败", f"获取开奖数据出错：{error_msg}")
 
     def save_winning_details(self):
-        """保存查询结果到文件"""
+        """保存查询结果到文件（报告在后台线程中逐段写入，界面不卡顿）"""
         if not self.lottery_results or not self.user_bets:
             messagebox.showwarning("保存失败", "暂无查询结果可保存")
             return
@@ -828,98 +1668,33 @@ class LotteryApp(tk.Tk):
         if not save_path:
             return
 
+        self.btn_save.config(state=tk.DISABLED)
+        self.update_status("🔍 正在生成报告...", "info")
+        # 传入当前结果的引用，后台生成期间重新查询不影响本次报告
+        args = (save_path, self.user_bets, self.lottery_results, self.prize_engine,
+                self.total_prizes, self.winning_records)
+        threading.Thread(target=self.save_report_task, args=args, daemon=True).start()
+
+    def save_report_task(self, save_path, *report_data):
+        """后台生成报告（在子线程中运行）"""
         try:
-            # 构建保存内容
-            content = "=" * 80 + "\n"
-            content += "双色球开奖详情报告".center(80) + "\n"
-            content += f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            content += "=" * 80 + "\n\n"
-
-            # 最新开奖结果
-            if self.lottery_results:
-                latest = self.lottery_results[0]
-                red_str = " ".join(f"{n:02d}" for n in latest["red"])
-                content += "【最新一期开奖结果】\n"
-                content += f"期号:    第{latest['issue']}期\n"
-                content += f"日期:    {latest['date']}\n"
-                content += f"时间:    {latest['time']}\n"
-                content += f"开奖号码: 红球[{red_str}] + 蓝球{latest['blue']:02d}\n\n"
-                content += "-" * 80 + "\n\n"
-
-            # 投注方案
-            content += "【您的投注方案】\n"
-            for i, bet in enumerate(self.user_bets, 1):
-                red_str = "、".join(map(str, bet["red"]))
-                content += f"方案{i}：{bet['name']}\n"
-                content += f"  红球：{red_str}\n"
-                content += f"  蓝球：{bet['blue']}\n"
-                content += f"  倍数：{bet['multiple']}倍\n"
-                content += f"  总奖金：{self.total_prizes[i - 1]}元\n\n"
-            content += "-" * 80 + "\n\n"
-
-            # 中奖统计
-            total_all = sum(self.total_prizes)
-            content += "【中奖统计汇总】\n"
-            content += f"参与方案数：{len(self.user_bets)} 个\n"
-            content += f"查询期数：{len(self.lottery_results)} 期\n"
-            content += f"总中奖金额：{total_all} 元\n"
-            content += f"平均每期奖金：{total_all / len(self.lottery_results):.2f} 元\n\n"
-            content += "-" * 80 + "\n\n"
-
-            # 完整开奖记录
-            content += "【最近20期开奖记录】\n"
-            content += f"{'期号':<10} {'日期':<12} {'时间':<6} {'开奖号码':<25} {'各方案中奖情况'}\n"
-            content += "-" * 100 + "\n"
-            for res in self.lottery_results:
-                red_str = " ".join(f"{n:02d}" for n in res["red"])
-                numbers_str = f"红球[{red_str}] + 蓝球{res['blue']:02d}"
-                scheme_results = []
-                for bet in self.user_bets:
-                    level, _, _ = self.check_prize(bet["red"], bet["blue"], res["red"], res["blue"])
-                    scheme_results.append(f"{bet['name']}:{level}")
-                content += f"{res['issue']:<10} {res['date']:<12} {res['time']:<6} {numbers_str:<25} {', '.join(scheme_results)}\n"
-            content += "\n" + "-" * 80 + "\n\n"
-
-            # 详细中奖记录
-            content += "【详细中奖记录】\n"
-            if self.winning_records:
-                issue_groups = {}
-                for record in self.winning_records:
-                    if record["issue"] not in issue_groups:
-                        issue_groups[record["issue"]] = []
-                    issue_groups[record["issue"]].append(record)
-
-                for issue, records in issue_groups.items():
-                    first_record = records[0]
-                    content += f"\n► 第{issue}期（{first_record['date']} {first_record['time']}）\n"
-                    content += f"  开奖号码：{first_record['winning_numbers']}\n"
-                    for idx, record in enumerate(records, 1):
-                        content += f"  {idx}. {record['scheme']}\n"
-                        content += f"     投注：红球{record['red']} + 蓝球{record['blue']}（{record['multiple']}倍）\n"
-                        content += f"     奖项：{record['level']}，奖金{record['prize']}元\n"
-            else:
-                content += "  ⚠️  暂无中奖记录，继续加油！\n"
+            def progress(done, total):
+                self.after(0, lambda: self.update_status(f"🔍 正在生成报告：{done}/{total} 期", "info"))
 
-            # 兑奖须知
-            content += "\n" + "=" * 80 + "\n"
-            content += "【兑奖须知】\n"
-            content += "  1. 中奖后需在开奖日起60天内到当地福利彩票销售站点或中心兑奖\n"
-            content += "  2. 单注奖金1万元及以上需缴纳20%个人偶然所得税（由兑奖机构代扣）\n"
-            content += "  3. 兑奖唯一凭证为官方纸质彩票，本电子报告仅作查询参考，不具备兑奖效力\n"
-            content += "  4. 官方查询渠道：中国福利彩票网（www.cwl.gov.cn）、福彩官方APP\n"
-            content += "  5. 理性购彩，量力而行，享受彩票的娱乐属性\n"
-            content += "=" * 80
-
-            # 保存文件
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            write_winning_report(save_path, *report_data, progress=progress)
+            self.after(0, lambda: self.finish_save_report(save_path))
+        except Exception as e:
+            self.after(0, lambda err=str(e): self.handle_save_error(err))
 
-            self.update_status(f"✅ 结果已保存至：{save_path}", "info")
-            messagebox.showinfo("保存成功", f"查询结果已保存到：\n{save_path}")
+    def finish_save_report(self, save_path):
+        self.btn_save.config(state=tk.NORMAL)
+        self.update_status(f"✅ 结果已保存至：{save_path}", "info")
+        messagebox.showinfo("保存成功", f"查询结果已保存到：\n{save_path}")
 
-        except Exception as e:
-            self.update_status(f"❌ 保存失败：{str(e)}", "warning")
-            messagebox.showerror("保存失败", f"文件保存出错：{str(e)}")
+    def handle_save_error(self, error_msg):
+        self.btn_save.config(state=tk.NORMAL)
+        self.update_status(f"❌ 保存失败：{error_msg}", "warning")
+        messagebox.showerror("保存失败", f"文件保存出错：{error_msg}")
 
 
 # ------------------------------ 程序入口 ------------------------------
@@ -1,7 +1,19 @@
 import os
+import re
+import csv
+import json
+import hashlib
+import mmap
+import multiprocessing
+import zipfile
+import posixpath
 import pandas as pd
 import time
-from collections import defaultdict
+from collections import Counter, defaultdict
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+from openpyxl import load_workbook
 
 # 文件夹路径
 folder_path = r"G:\优仙 工作\文档处理\input-gl"
@@ -9,89 +21,410 @@ folder_path = r"G:\优仙 工作\文档处理\input-gl"
 # 支持的文件扩展名
 SUPPORTED_EXTS = ['.xlsx', '.xls', '.csv', '.tsv']
 
-# 存储所有表头信息
-all_headers = []
-total_rows = 0
+# 查找表头时最多扫描的行数（部分导出文件表头前有标题行/说明行）
+HEADER_SCAN_ROWS = 20
 
-print(f"开始分析文件夹: {folder_path}\n")
+# 分析结果缓存：(路径, 大小, 修改时间) 未变的文件直接使用上次的表头和行数
+CACHE_FILE = os.path.join(folder_path, '_表头检测缓存.json')
+CACHE_VERSION = 3
 
-# 遍历文件夹中的所有文件
-for root, dirs, files in os.walk(folder_path):
-    for file in files:
-        file_extension = os.path.splitext(file)[1].lower()
-        file_path = os.path.join(root, file)
+# 表头结构映射：供 汇总表格.py / 批量过滤3.0.py 直接按列位置读取，跳过逐文件的表头识别
+SCHEMA_MAP_FILE = os.path.join(folder_path, '_表头结构映射.json')
+SCHEMA_MAP_VERSION = 1
+
+# 常见的同义表头 -> 标准列名（比较前会先去掉空白并统一全角括号）
+COLUMN_ALIASES = {
+    '公司名称': '企业名称',
+    '企业名': '企业名称',
+    '经营状态': '登记状态',
+    '企业状态': '登记状态',
+    '法人': '法定代表人',
+    '法人代表': '法定代表人',
+    '省份': '所属省份',
+    '所在省份': '所属省份',
+    '城市': '所属城市',
+    '所在城市': '所属城市',
+    '区县': '所属区县',
+    '所在区县': '所属区县',
+    '手机号': '有效手机号',
+    '手机号码': '有效手机号',
+    '联系电话': '有效手机号',
+}
+
+# 扫描文件的进程数，默认使用全部CPU核心
+MAX_WORKERS = os.cpu_count() or 1
+
+
+# 已知的标准列名，用于识别表头行
+KNOWN_COLUMNS = set(COLUMN_ALIASES.values())
 
-        if file_extension not in SUPPORTED_EXTS:
-            continue
 
+def detect_header_row(rows):
+    """在前几行中找出包含已知列名（含同义表头）最多的一行作为表头，返回行下标
+
+    表头中个别单元格为空时，按非空单元格数会被第一行完整的数据行抢先，所以按列名命中数判断；
+    所有行都没有命中已知列名时，才退回取非空单元格最多的一行（标题行通常只有一两个单元格）。
+    """
+    best_row, best_hits = 0, 0
+    filled_row, filled_count = 0, 0
+    for idx, row in enumerate(rows):
+        if idx >= HEADER_SCAN_ROWS:
+            break
+        values = [value for value in row if value is not None and str(value).strip() not in ('', 'nan')]
+        hits = len(KNOWN_COLUMNS.intersection(normalize_header(value) for value in values))
+        if hits > best_hits:
+            best_row, best_hits = idx, hits
+        if len(values) > filled_count:
+            filled_row, filled_count = idx, len(values)
+    return best_row if best_hits else filled_row
+
+
+def read_headers(file_path, file_extension):
+    """先定位表头行，只解析表头这一行，返回 (表头列表, 表头行下标)"""
+    if file_extension == '.xlsx':
+        # 只读模式只读取前几行，行下标与工作表实际行号一致（空行也计入）
+        wb = load_workbook(file_path, read_only=True, data_only=True)
         try:
-            # 获取文件大小（MB）
-            file_size = os.path.getsize(file_path) / (1024 * 1024)
-
-            # 根据文件扩展名选择读取方法
-            if file_extension in ['.xlsx', '.xls']:
-                # 读取第一行（表头）和行数
-                df = pd.read_excel(file_path, nrows=1)
-                headers = df.columns.tolist()
-                num_rows = len(pd.read_excel(file_path, usecols=[0]))  # 仅读取第一列计算行数
-            elif file_extension == '.csv':
-                # 读取第一行（表头）和行数
-                df = pd.read_csv(file_path, nrows=1)
-                headers = df.columns.tolist()
-                # 高效计算CSV行数
-                with open(file_path, 'r') as f:
-                    num_rows = sum(1 for line in f) - 1  # 减1是减去表头
-            elif file_extension == '.tsv':
-                # 读取第一行（表头）和行数
-                df = pd.read_csv(file_path, sep='\t', nrows=1)
-                headers = df.columns.tolist()
-                # 高效计算TSV行数
-                with open(file_path, 'r') as f:
-                    num_rows = sum(1 for line in f) - 1  # 减1是减去表头
-
-            # 记录总行数
-            total_rows += num_rows
-
-            # 记录表头信息
-            all_headers.append({
-                'file': file,
-                'headers': headers,
-                'num_columns': len(headers),
-                'num_rows': num_rows
-            })
-
-            # 打印文件信息
-            print(f"文件名: {file}")
-            print(f"  - 第一行(表头): {headers[:5]}...")
-            print(f"  - 列数: {len(headers)}")
-            print(f"  - 文件大小: {file_size:.2f} MB")
-            print(f"  - 行数: {num_rows:,}")
-            print()
-
-        except Exception as e:
-            print(f"✗ 分析文件 {file} 时出错: {str(e)}\n")
-
-# 分析表头一致性
-if all_headers:
-    # 计算表头完全一致的文件组
-    header_groups = defaultdict(list)
-    for info in all_headers:
-        header_tuple = tuple(info['headers'])
-        header_groups[header_tuple].append(info['file'])
-
-    # 打印表头分析结果
-    print("\n===== 表头分析结果 =====")
-    print(f"总文件数: {len(all_headers)}")
-    print(f"总记录数: {total_rows:,}")
-
-    if len(header_groups) == 1:
-        print("✅ 所有表格的表头完全一致！")
+            ws = wb.worksheets[0]
+            ws.reset_dimensions()
+            preview = list(ws.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True))
+        finally:
+            wb.close()
+        header_row = detect_header_row(preview)
+        # 保留列位置：去掉行尾空单元格，中间的空表头与 pandas 一样命名为 Unnamed: n
+        row = list(preview[header_row]) if preview else []
+        while row and row[-1] is None:
+            row.pop()
+        headers = [value if value is not None else f'Unnamed: {idx}' for idx, value in enumerate(row)]
+    elif file_extension == '.xls':
+        preview = pd.read_excel(file_path, header=None, nrows=HEADER_SCAN_ROWS, dtype=object)
+        header_row = detect_header_row(preview.itertuples(index=False))
+        headers = pd.read_excel(file_path, header=header_row, nrows=0).columns.tolist()
     else:
-        print(f"❌ 发现 {len(header_groups)} 种不同的表头结构:")
-        for i, (headers, files) in enumerate(header_groups.items(), 1):
-            print(f"  {i}. 表头结构: {list(headers)[:5]}...")
-            print(f"     包含文件数: {len(files)}")
-            print(f"     示例文件: {files[:3]}...")
-            print()
-else:
-    print("没有找到可分析的表格文件！")
\ No newline at end of file
+        sep = '\t' if file_extension == '.tsv' else ','
+        with open(file_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            header_row = detect_header_row(csv.reader(f, delimiter=sep))
+        headers = pd.read_csv(file_path, sep=sep, skiprows=header_row, nrows=0).columns.tolist()
+    return headers, header_row
+
+
+# ---------- 只读元数据的快速行数统计 ----------
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _first_sheet_xml_path(zf):
+    """从 workbook.xml 和关系文件中找到第一个工作表的XML路径（与 pd.read_excel 默认读取的表一致）"""
+    workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    first_sheet = workbook.find(f'{_NS_MAIN}sheets/{_NS_MAIN}sheet')
+    rel_id = first_sheet.get(f'{_NS_REL}id')
+
+    rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(f'{_NS_PKG_REL}Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError("找不到第一个工作表")
+
+
+def count_xlsx_rows(file_path):
+    """读取xlsx第一个工作表的最后一行行号，不解析单元格内容
+
+    优先使用表头之前的 <dimension ref="A1:Z1000"> 元数据（只读到这里就停止）；
+    没有维度信息时流式扫描 <row r="..."> 取最大行号。
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        with zf.open(_first_sheet_xml_path(zf)) as sheet_xml:
+            last_row = 0
+            sheet_data = None
+            for event, elem in ElementTree.iterparse(sheet_xml, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    if tag == f'{_NS_MAIN}sheetData':
+                        sheet_data = elem
+                    elif tag == f'{_NS_MAIN}dimension':
+                        match = re.search(r'(\d+)$', elem.get('ref', ''))
+                        # 只有 "A1" 的维度信息往往是写入工具没有更新，不可信
+                        if match and ':' in elem.get('ref', ''):
+                            return int(match.group(1))
+                    elif tag == f'{_NS_MAIN}row':
+                        row_number = elem.get('r')
+                        last_row = int(row_number) if row_number else last_row + 1
+                elif tag == f'{_NS_MAIN}row' and sheet_data is not None:
+                    # start事件时单元格还没解析完，只能在end时清理；
+                    # 只清空<row>的话空元素仍挂在sheetData下，要从父节点上摘掉才能释放内存
+                    sheet_data.clear()
+            return last_row
+
+
+def count_text_lines(file_path):
+    """用mmap按字节统计CSV/TSV行数，不做文本解码"""
+    if os.path.getsize(file_path) == 0:
+        return 0
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = mm.count(b'\n') if hasattr(mm, 'count') else _count_newlines(mm)
+        # 最后一行没有换行符时也算一行
+        if mm[-1:] != b'\n':
+            lines += 1
+        return lines
+
+
+def _count_newlines(mm, chunk_size=16 * 1024 * 1024):
+    """Python 3.12 以前 mmap 没有 count 方法，分块统计"""
+    lines = 0
+    for start in range(0, len(mm), chunk_size):
+        lines += mm[start:start + chunk_size].count(b'\n')
+    return lines
+
+
+def count_data_rows(file_path, file_extension, header_row):
+    """统计表头以下的数据行数"""
+    if file_extension == '.xlsx':
+        return max(count_xlsx_rows(file_path) - header_row - 1, 0)
+    if file_extension == '.xls':
+        # xls 为二进制格式，没有可单独读取的行数元数据，只读取第一列计数
+        return len(pd.read_excel(file_path, header=header_row, usecols=[0]))
+    return max(count_text_lines(file_path) - header_row - 1, 0)
+
+
+def analyze_file(file_path):
+    """分析单个文件的表头和行数（进程池工作函数），出错时返回错误信息而不抛出"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    try:
+        # 先定位表头行，只解析表头
+        headers, header_row = read_headers(file_path, file_extension)
+
+        # 只读元数据/原始字节统计行数
+        num_rows = count_data_rows(file_path, file_extension, header_row)
+
+        # 表头统一转为字符串，便于写入JSON缓存
+        headers = [header if isinstance(header, str) else str(header) for header in headers]
+        return {'headers': headers, 'header_row': header_row, 'num_rows': num_rows}
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def load_cache(cache_file):
+    """读取分析结果缓存，文件不存在、损坏或版本不符时返回空缓存"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.pop('_version', None) != CACHE_VERSION:
+        return {}
+    return cache
+
+
+def save_json(path, data):
+    """先写临时文件再替换，避免中断时文件损坏"""
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, path)
+
+
+def save_cache(cache_file, cache):
+    save_json(cache_file, {'_version': CACHE_VERSION, **cache})
+
+
+def scan_folder(folder_path, max_workers=MAX_WORKERS, cache_file=CACHE_FILE):
+    """并行分析文件夹中的所有表格文件，未变化的文件直接读取缓存
+
+    返回按遍历顺序排列的 [(file_path, file_size, result), ...]
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in SUPPORTED_EXTS:
+                file_paths.append(os.path.join(root, file))
+
+    cache = load_cache(cache_file)
+    signatures = {}
+    to_analyze = []
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        signatures[file_path] = {'size': stat.st_size, 'mtime': stat.st_mtime}
+        entry = cache.get(os.path.abspath(file_path))
+        if not (entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime):
+            to_analyze.append(file_path)
+
+    print(f"共 {len(file_paths)} 个文件，缓存命中 {len(file_paths) - len(to_analyze)} 个，"
+          f"需要分析 {len(to_analyze)} 个\n")
+
+    errors = {}
+    if to_analyze:
+        if max_workers > 1 and len(to_analyze) > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(analyze_file, to_analyze, chunksize=4))
+        else:
+            results = [analyze_file(file_path) for file_path in to_analyze]
+
+        # 只缓存成功的结果，出错的文件下次重新分析
+        for file_path, result in zip(to_analyze, results):
+            if 'error' in result:
+                errors[file_path] = result
+            else:
+                cache[os.path.abspath(file_path)] = {**signatures[file_path], **result}
+
+    # 只保留本次仍存在且分析成功的文件，已删除文件的缓存一并清理
+    cache = {os.path.abspath(file_path): cache[os.path.abspath(file_path)]
+             for file_path in file_paths
+             if file_path not in errors and os.path.abspath(file_path) in cache}
+    save_cache(cache_file, cache)
+
+    scanned = []
+    for file_path in file_paths:
+        result = errors.get(file_path) or cache[os.path.abspath(file_path)]
+        scanned.append((file_path, signatures[file_path]['size'] / (1024 * 1024), result))
+    return scanned
+
+
+def normalize_header(header):
+    """表头标准化：去掉空白、统一全角括号，再按同义词表映射到标准列名"""
+    name = re.sub(r'\s+', '', str(header)).replace('（', '(').replace('）', ')')
+    return COLUMN_ALIASES.get(name, name)
+
+
+def header_fingerprint(headers):
+    """表头结构指纹：原始表头（含顺序）的短哈希"""
+    return hashlib.md5('\x1f'.join(headers).encode('utf-8')).hexdigest()[:12]
+
+
+def build_schema_map(scanned, folder_path):
+    """根据扫描结果生成表头结构映射
+
+    canonical_columns 以最常见的表头结构为准，其他结构中多出的列依次追加；
+    每个文件记录表头行、同义表头映射、标准列名 -> 原始列位置，以及缺失列和是否换序。
+    """
+    analyzed = [(file_path, result) for file_path, _, result in scanned if 'error' not in result]
+
+    fingerprint_counts = Counter(header_fingerprint(result['headers']) for _, result in analyzed)
+    schemas = {}
+    for _, result in analyzed:
+        fingerprint = header_fingerprint(result['headers'])
+        if fingerprint not in schemas:
+            schemas[fingerprint] = {'columns': result['headers'], 'files': fingerprint_counts[fingerprint]}
+
+    # 标准列顺序：最常见结构在前，其余结构中的新列按出现顺序追加
+    canonical_columns = []
+    for fingerprint, _ in fingerprint_counts.most_common():
+        for header in schemas[fingerprint]['columns']:
+            name = normalize_header(header)
+            if name not in canonical_columns and not name.startswith('Unnamed:'):
+                canonical_columns.append(name)
+
+    files = {}
+    for file_path, result in analyzed:
+        headers = result['headers']
+        positions = {}
+        aliases = {}
+        for idx, header in enumerate(headers):
+            name = normalize_header(header)
+            if name.startswith('Unnamed:') or name in positions:
+                continue
+            positions[name] = idx
+            if name != header:
+                aliases[header] = name
+
+        present = [name for name in canonical_columns if name in positions]
+        files[os.path.relpath(file_path, folder_path).replace(os.sep, '/')] = {
+            'size': result['size'],
+            'mtime': result['mtime'],
+            'fingerprint': header_fingerprint(headers),
+            'header_row': result['header_row'],
+            'aliases': aliases,
+            'positions': positions,
+            'missing': [name for name in canonical_columns if name not in positions],
+            'reordered': [positions[name] for name in present] != sorted(positions[name] for name in present)
+        }
+
+    return {
+        'version': SCHEMA_MAP_VERSION,
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'canonical_columns': canonical_columns,
+        'schemas': schemas,
+        'files': files
+    }
+
+
+def main():
+    # 存储所有表头信息
+    all_headers = []
+    total_rows = 0
+
+    print(f"开始分析文件夹: {folder_path}\n")
+
+    scanned = scan_folder(folder_path)
+    for file_path, file_size, result in scanned:
+        file = os.path.basename(file_path)
+
+        if 'error' in result:
+            print(f"✗ 分析文件 {file} 时出错: {result['error']}\n")
+            continue
+
+        headers = result['headers']
+        header_row = result['header_row']
+        num_rows = result['num_rows']
+
+        # 记录总行数
+        total_rows += num_rows
+
+        # 记录表头信息
+        all_headers.append({
+            'file': file,
+            'headers': headers,
+            'num_columns': len(headers),
+            'num_rows': num_rows,
+            'header_row': header_row
+        })
+
+        # 打印文件信息
+        print(f"文件名: {file}")
+        print(f"  - 表头(第{header_row + 1}行): {headers[:5]}...")
+        print(f"  - 列数: {len(headers)}")
+        print(f"  - 文件大小: {file_size:.2f} MB")
+        print(f"  - 行数: {num_rows:,}")
+        print()
+
+    # 分析表头一致性
+    if all_headers:
+        # 计算表头完全一致的文件组
+        header_groups = defaultdict(list)
+        for info in all_headers:
+            header_tuple = tuple(info['headers'])
+            header_groups[header_tuple].append(info['file'])
+
+        # 打印表头分析结果
+        print("\n===== 表头分析结果 =====")
+        print(f"总文件数: {len(all_headers)}")
+        print(f"总记录数: {total_rows:,}")
+
+        if len(header_groups) == 1:
+            print("✅ 所有表格的表头完全一致！")
+        else:
+            print(f"❌ 发现 {len(header_groups)} 种不同的表头结构:")
+            for i, (headers, files) in enumerate(header_groups.items(), 1):
+                print(f"  {i}. 表头结构: {list(headers)[:5]}...")
+                print(f"     包含文件数: {len(files)}")
+                print(f"     示例文件: {files[:3]}...")
+                print()
+        # 输出表头结构映射，供合并/过滤工具直接按列位置读取
+        schema_map = build_schema_map(scanned, folder_path)
+        save_json(SCHEMA_MAP_FILE, schema_map)
+        aliased = sum(1 for entry in schema_map['files'].values() if entry['aliases'])
+        reordered = sum(1 for entry in schema_map['files'].values() if entry['reordered'])
+        offset = sum(1 for entry in schema_map['files'].values() if entry['header_row'] > 0)
+        print("\n===== 表头结构映射 =====")
+        print(f"标准列: {schema_map['canonical_columns'][:10]}...")
+        print(f"使用同义表头的文件: {aliased} 个，列顺序不同的文件: {reordered} 个，表头不在第一行的文件: {offset} 个")
+        print(f"已保存: {SCHEMA_MAP_FILE}")
+    else:
+        print("没有找到可分析的表格文件！")
+
+
+if __name__ == "__main__":
+    # Windows下打包为exe时多进程需要
+    multiprocessing.freeze_support()
+    main()
@@ -1,10 +1,21 @@
+import numpy as np
 import pandas as pd
 import re
 import os
 import sys
+import sqlite3
 import glob
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment, Font
+import json
+import hashlib
+import pickle
+import io
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle
 from openpyxl.utils import get_column_letter
 from contextlib import contextmanager
 from typing import List, Optional, Tuple, Dict, Set
@@ -15,42 +26,108 @@ filter_filename = '筛选文件过滤词.txt'  # 过滤词文件名，可修改
 input_folder = os.path.join(base_dir, 'input-gl')
 output_folder = os.path.join(base_dir, 'output-gl')
 filtered_output_folder = os.path.join(base_dir, 'output-filtered')  # 被过滤内容的输出目录
+schema_map_filename = '_表头结构映射.json'  # 表头检测工具生成的结构映射（存在时直接使用）
+SCHEMA_KEY_COLUMNS = ['企业名称', '有效手机号']  # 使用映射前需校验的列（过滤和去重依赖这两列）
+cross_file_dedup = False  # True: 整个输入文件夹内跨文件去重（保留最先出现的行）；False: 每个工作表内单独去重
+persistent_dedup = False  # True: 使用磁盘去重索引，跨文件、跨多次运行去重（优先于 cross_file_dedup）
+dedup_index_file = os.path.join(base_dir, '模板', '去重索引.sqlite')  # 磁盘去重索引位置，删除即可重新开始
+max_workers = os.cpu_count() or 1  # 并行处理文件的进程数（跨文件去重时按顺序逐个处理）
+
+# 安装了 python-calamine 时用 calamine 引擎读取（.xlsx/.xls 均支持，速度快得多），否则回退 openpyxl/xlrd
+CALAMINE_AVAILABLE = importlib.util.find_spec('python_calamine') is not None
+
+class FormattedExcelWriter:
+    """write-only 模式写出带格式的工作簿
+
+    标题/数据格式注册为命名样式，每列复用同一个已设置样式的单元格逐行写出；
+    行高用工作表默认行高，列宽按前 WIDTH_SAMPLE_ROWS 行估算，写出成本与写原始数据相当。
+    """
+
+    WIDTH_SAMPLE_ROWS = 100
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.wb = Workbook(write_only=True)
+
+        # 标题加粗加大、内容居中
+        header_style = NamedStyle(name='标题')
+        header_style.font = Font(name='微软雅黑', size=14, bold=True)
+        header_style.alignment = Alignment(horizontal='center', vertical='center')
+        data_style = NamedStyle(name='数据')
+        data_style.alignment = Alignment(horizontal='center', vertical='center')
+        self.wb.add_named_style(header_style)
+        self.wb.add_named_style(data_style)
+
+    def write_sheet(self, sheet_name: str, df: pd.DataFrame):
+        ws = self.wb.create_sheet(title=sheet_name)
+        headers = [str(col) for col in df.columns]
+
+        # 行高、列宽必须在写入第一行之前设置
+        ws.sheet_format.defaultRowHeight = 18
+        ws.sheet_format.customHeight = True
+        ws.row_dimensions[1].height = 30
+        sample = df.head(self.WIDTH_SAMPLE_ROWS)
+        for idx, header in enumerate(headers):
+            lengths = sample.iloc[:, idx].dropna().astype(str).str.len()
+            max_length = max(len(header), int(lengths.max()) if len(lengths) else 0)
+            ws.column_dimensions[get_column_letter(idx + 1)].width = min((max_length + 2) * 1.2, 50)
+
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.style = '标题'
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        # 每列一个样式单元格，逐行只替换值（append 时立即写出，可以复用）
+        row_cells = []
+        for _ in headers:
+            cell = WriteOnlyCell(ws)
+            cell.style = '数据'
+            row_cells.append(cell)
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            for cell, value in zip(row_cells, row):
+                cell.value = value
+            ws.append(row_cells)
+
+    def close(self):
+        # 至少保留一个工作表，否则无法保存
+        if not self.wb.worksheets:
+            self.wb.create_sheet()
+        self.wb.save(self.file_path)
 
-# 修复：添加ExcelWriter兼容处理（避免openpyxl版本差异报错）
 @contextmanager
-def excel_writer(file_path: str) -> pd.ExcelWriter:
-    """上下文管理器确保正确释放Excel资源"""
-    writer = None
-    try:
-        # 兼容openpyxl不同版本的引擎参数
-        writer = pd.ExcelWriter(file_path, engine='openpyxl', mode='w')
-        yield writer
-    except Exception as e:
-        raise RuntimeError(f"Excel写入器创建失败: {str(e)}")
-    finally:
-        if writer is not None:
-            try:
-                writer.close()
-            except:
-                writer.save()  # 降级处理，确保文件保存
+def excel_writer(file_path: str):
+    """上下文管理器：正常结束时保存工作簿"""
+    writer = FormattedExcelWriter(file_path)
+    yield writer
+    writer.close()
 
-def load_filter_words(file_path: str) -> Tuple[List[str], Dict[str, List[str]]]:
-    """加载过滤词文件（按空格分隔）并去重，返回去重后的列表和重复词字典"""
+def load_filter_words(file_path: str, raw: Optional[bytes] = None) -> Tuple[List[str], Dict[str, List[str]]]:
+    """加载过滤词文件（按空格分隔）并去重，返回去重后的列表和重复词字典
+
+    raw 为已读取的文件内容，提供时不再读文件；各编码在内存中依次尝试解码
+    """
     encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'utf-16-le']
     all_words = []
 
     # 读取文件内容
+    if raw is None:
+        try:
+            with open(file_path, 'rb') as file:
+                raw = file.read()
+        except Exception as e:
+            raise RuntimeError(f"读取过滤词文件失败: {str(e)}")
+
     for encoding in encodings:
         try:
-            with open(file_path, 'r', encoding=encoding) as file:
-                content = file.read()
-                all_words = [word.strip() for word in content.split() if word.strip()]
-                print(f"成功以{encoding}编码读取过滤词文件")
-                break
+            content = raw.decode(encoding)
         except UnicodeDecodeError:
             continue
-        except Exception as e:
-            raise RuntimeError(f"读取过滤词文件失败: {str(e)}")
+        all_words = [word.strip() for word in content.split() if word.strip()]
+        print(f"成功以{encoding}编码读取过滤词文件")
+        break
 
     if not all_words:
         raise ValueError(f"无法解码文件 {file_path} 或文件内容为空，尝试过的编码: {', '.join(encodings)}")
@@ -86,6 +163,146 @@ def load_filter_words(file_path: str) -> Tuple[List[str], Dict[str, List[str]]]:
 
     return unique_list, actual_duplicates
 
+class KeywordMatcher:
+    """Aho-Corasick 多模式匹配器（不区分大小写）
+
+    过滤词文件加载后只构建一次自动机，匹配时每行文本只扫描一遍，
+    耗时与文本长度成正比，不随过滤词数量增长；同时返回命中的过滤词。
+    """
+
+    def __init__(self, words: List[str]):
+        self.words = list(words)
+        self._goto: List[Dict[str, int]] = [{}]  # 状态转移表
+        self._fail: List[int] = [0]  # 失配指针
+        self._output: List[Optional[str]] = [None]  # 到达该状态时命中的过滤词（保留原始写法）
+
+        for word in self.words:
+            state = 0
+            for ch in word.lower():
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(None)
+                state = next_state
+            if self._output[state] is None:
+                self._output[state] = word
+
+        # 按层（BFS）计算失配指针，并把后缀状态的命中词继承下来
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                if self._output[next_state] is None:
+                    self._output[next_state] = self._output[self._fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def search(self, text: str) -> Optional[str]:
+        """返回文本中最先出现的过滤词，未命中返回None"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+    def match_series(self, series: pd.Series) -> pd.Series:
+        """对整列匹配，返回每行命中的过滤词（未命中为None）"""
+        return self.match_texts(series.astype(str).str.lower())
+
+    def match_texts(self, texts: pd.Series) -> pd.Series:
+        """对已转为小写的文本列匹配，空值不命中"""
+        if not self.words:
+            return pd.Series([None] * len(texts), index=texts.index, dtype=object)
+        search = self.search
+        return pd.Series([search(text) if isinstance(text, str) else None for text in texts],
+                         index=texts.index, dtype=object)
+
+class FilterWordCache:
+    """过滤词匹配器缓存
+
+    编译好的匹配器按过滤词文件内容的 SHA-256 保存到缓存文件，内容未变时直接载入，
+    不再逐个编码解码、去重和构建自动机；get() 每次只检查文件大小和修改时间，
+    文件变化时自动重新加载（热更新），所有工作表、文件和多次运行共用。
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, filter_path: str, verbose: bool = True):
+        self.filter_path = filter_path
+        self.cache_path = os.path.splitext(filter_path)[0] + '.编译缓存.pkl'
+        self.verbose = verbose
+        self.matcher: Optional[KeywordMatcher] = None
+        self.file_hash: Optional[str] = None
+        self._signature = None
+
+    def get(self) -> KeywordMatcher:
+        """返回当前过滤词文件对应的匹配器，文件有变化时先重新加载"""
+        stat = os.stat(self.filter_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self.matcher is None or signature != self._signature:
+            if self.matcher is not None and self.verbose:
+                print("过滤词文件已变化，重新加载")
+            self._load()
+            self._signature = signature
+        return self.matcher
+
+    def _load(self):
+        with open(self.filter_path, 'rb') as f:
+            raw = f.read()
+        file_hash = hashlib.sha256(raw).hexdigest()
+        if file_hash == self.file_hash:
+            return
+
+        matcher = self._read_cache(file_hash)
+        if matcher is not None:
+            if self.verbose:
+                print(f"已载入编译好的过滤词缓存: {len(matcher)} 个过滤词")
+        else:
+            words, _ = load_filter_words(self.filter_path, raw)
+            matcher = KeywordMatcher(words)
+            self._write_cache(file_hash, matcher)
+
+        self.matcher = matcher
+        self.file_hash = file_hash
+
+    def _read_cache(self, file_hash: str) -> Optional[KeywordMatcher]:
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            return None
+        if cached.get('version') != self.CACHE_VERSION or cached.get('file_hash') != file_hash:
+            return None
+        matcher = KeywordMatcher.__new__(KeywordMatcher)
+        matcher.__dict__.update(cached['tables'])
+        return matcher
+
+    def _write_cache(self, file_hash: str, matcher: KeywordMatcher):
+        # 只保存自动机的表（普通列表/字典），与脚本以何种模块名运行无关；
+        # 先写临时文件再替换，多个进程同时重建时也不会读到半个文件
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': self.CACHE_VERSION, 'file_hash': file_hash, 'tables': vars(matcher)},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"写入过滤词缓存失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
 def clean_phone_number(phone: str) -> str:
     """清理单个手机号"""
     if not phone or pd.isna(phone):
@@ -100,64 +317,201 @@ def process_phone_column(series: pd.Series) -> pd.Series:
     """处理整个手机号列"""
     return series.apply(clean_phone_number)
 
-def count_chinese_chars(text: str) -> int:
-    """计算字符串中的中文字符数量"""
-    if not text or pd.isna(text):
-        return 0
-    return len(re.findall(
-        r'[\u4e00-\u9fff\u3400-\u4dbf\U00020000-\U0002a6df\U0002a700-\U0002b73f\U0002b740-\U0002b81f\U0002b820-\U0002ceaf]',
-        str(text)))
-
-def filter_companies(df: pd.DataFrame, filter_words: List[str], company_col: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+# 中文字符（含扩展区）；写成实际字符而非原始字符串中的\u转义，pyarrow字符串列的正则引擎也能识别
+CHINESE_CHAR_PATTERN = '[\u4e00-\u9fff\u3400-\u4dbf\U00020000-\U0002a6df\U0002a700-\U0002b73f\U0002b740-\U0002b81f\U0002b820-\U0002ceaf]'
+
+# 过滤原因位标记
+REASON_KEYWORD = 1
+REASON_SHORT_NAME = 2
+REASON_BRANCH = 4
+
+def rule_short_name(texts: pd.Series) -> pd.Series:
+    """公司名称长度在3个中文字以内（空值不算）"""
+    return texts.str.count(CHINESE_CHAR_PATTERN).le(3) & texts.notna()
+
+def rule_branch(texts: pd.Series) -> pd.Series:
+    """公司名称包含“分公司”"""
+    return texts.str.contains('分公司', na=False, regex=False)
+
+# 名称规则：(位标记, 过滤原因, 统计说明, 规则函数)，新增规则在此登记即可
+# 过滤词规则需要匹配器并记录命中词，单独处理，位标记为 REASON_KEYWORD
+COMPANY_FILTER_RULES = [
+    (REASON_SHORT_NAME, '公司名称过短', '公司名称≤3个中文字', rule_short_name),
+    (REASON_BRANCH, '包含分公司', "包含'分公司'", rule_branch),
+]
+REASON_LABELS = [(REASON_KEYWORD, '包含过滤词')] + [(bit, label) for bit, label, _, _ in COMPANY_FILTER_RULES]
+
+def reason_text(bits: int) -> str:
+    """把过滤原因位标记转换为文字说明"""
+    return '; '.join(label for bit, label in REASON_LABELS if bits & bit)
+
+def company_reason_bits(names: pd.Series, matcher: KeywordMatcher) -> Tuple[np.ndarray, pd.Series]:
+    """对公司名称列执行全部过滤规则，返回每行的过滤原因位标记和命中的过滤词"""
+    # 文本只转换一次：转为字符串并统一小写，空值保持为空
+    texts = names.astype(str).str.lower().where(names.notna())
+
+    matched_words = matcher.match_texts(texts)
+    bits = np.where(matched_words.notna().to_numpy(), REASON_KEYWORD, 0).astype(np.uint8)
+    for bit, _, _, rule in COMPANY_FILTER_RULES:
+        bits |= np.where(rule(texts).to_numpy(dtype=bool), bit, 0).astype(np.uint8)
+    return bits, matched_words
+
+def filter_companies(df: pd.DataFrame, matcher: KeywordMatcher, company_col: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """过滤公司名称，包括过滤词和短名称，返回过滤后的数据和被过滤掉的数据"""
     if company_col not in df.columns:
         return df, pd.DataFrame()
 
-    original_count = len(df)
+    bits, matched_words = company_reason_bits(df[company_col], matcher)
+    mask_total = bits != 0
 
-    # 过滤包含过滤词的公司（修复：空过滤词列表时跳过）
-    if filter_words:
-        pattern = '|'.join(map(re.escape, filter_words))
-        mask_keywords = df[company_col].astype(str).str.contains(
-            pattern, case=False, na=False, regex=True
-        )
-    else:
-        mask_keywords = pd.Series([False] * len(df))
-
-    # 过滤公司名称长度在3个中文字以内的
-    mask_short_names = df[company_col].apply(
-        lambda x: count_chinese_chars(str(x)) <= 3 if pd.notna(x) else False
-    )
-
-    # 过滤包含"分公司"的公司
-    mask_branch = df[company_col].astype(str).str.contains(
-        "分公司", case=False, na=False, regex=False
-    )
-
-    # 为被过滤的行添加过滤原因
-    df_with_reason = df.copy()
-    df_with_reason['过滤原因'] = ''
-    df_with_reason.loc[mask_keywords, '过滤原因'] += '包含过滤词; '
-    df_with_reason.loc[mask_short_names, '过滤原因'] += '公司名称过短; '
-    df_with_reason.loc[mask_branch, '过滤原因'] += '包含分公司; '
-    df_with_reason['过滤原因'] = df_with_reason['过滤原因'].str.rstrip('; ')
-
-    # 组合三种过滤条件
-    mask_total = mask_keywords | mask_short_names | mask_branch
-
-    # 计算过滤数量
-    keyword_filtered = mask_keywords.sum()
-    short_name_filtered = mask_short_names.sum()
-    branch_filtered = mask_branch.sum()
-    total_filtered = mask_total.sum()
+    # 只为被过滤的行生成过滤原因文字（位标记组合很少，逐个组合转换）
+    removed = df[mask_total].copy()
+    removed_bits = pd.Series(bits[mask_total], index=removed.index)
+    removed['过滤原因'] = removed_bits.map({int(b): reason_text(int(b)) for b in np.unique(bits[mask_total])})
+    removed['命中过滤词'] = matched_words[mask_total].fillna('')
 
     # 打印过滤统计
-    print(f"   - 包含过滤词的公司: {keyword_filtered} 个")
-    print(f"   - 公司名称≤3个中文字: {short_name_filtered} 个")
-    print(f"   - 包含'分公司'的公司: {branch_filtered} 个")
-    print(f"   - 总过滤公司数量: {total_filtered} 个")
+    print(f"   - 包含过滤词的公司: {np.count_nonzero(bits & REASON_KEYWORD)} 个")
+    for bit, _, description, _ in COMPANY_FILTER_RULES:
+        print(f"   - {description}的公司: {np.count_nonzero(bits & bit)} 个")
+    print(f"   - 总过滤公司数量: {np.count_nonzero(mask_total)} 个")
+
+    return df[~mask_total], removed
+
+# 去重原因代码（0 表示保留）
+DUP_PHONE = 1
+DUP_COMPANY_PHONE = 2
+DUP_COMPANY = 3
+DUP_REASON_TEXT = {
+    DUP_PHONE: '手机号重复',
+    DUP_COMPANY_PHONE: '公司名称+手机号重复',
+    DUP_COMPANY: '公司名称重复',
+}
+
+def hash_keys(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """把键列一次性哈希为 uint64 数组"""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+class DedupIndex:
+    """去重索引：按键类型记录已保留行的键哈希，可在多个工作表/文件之间共用
+
+    与 PersistentDedupIndex 一样，当前文件登记的键先暂存，commit 后才并入索引；
+    处理失败的文件 rollback 后不会留下键，后续文件的行不会被当作它的重复行删掉。
+    """
+
+    def __init__(self):
+        self._seen: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, List[np.ndarray]] = {}
+
+    def duplicated(self, kind: str, hashes: np.ndarray) -> np.ndarray:
+        """返回每个哈希是否已出现过（包括索引中已有的、当前文件已登记的和本批中靠前的）"""
+        dup = pd.Series(hashes).duplicated(keep='first').to_numpy()
+        for known in [self._seen.get(kind), *self._pending.get(kind, [])]:
+            if known is not None and len(known):
+                dup = dup | np.isin(hashes, known)
+        return dup
+
+    def add(self, kind: str, hashes: np.ndarray):
+        """登记保留行的键哈希（调用 commit 后才并入索引）"""
+        self._pending.setdefault(kind, []).append(hashes)
+
+    def commit(self):
+        for kind, pending in self._pending.items():
+            seen = self._seen.get(kind)
+            self._seen[kind] = np.concatenate(pending if seen is None else [seen, *pending])
+        self._pending.clear()
+
+    def rollback(self):
+        self._pending.clear()
+
+    def close(self):
+        pass
+
+class PersistentDedupIndex:
+    """磁盘去重索引（SQLite）：接口同 DedupIndex，键哈希保存在数据库中
+
+    每次只把当前工作表的键放进临时表与索引做连接查询，内存占用与历史数据量无关；
+    整个文件处理并保存成功后才提交，失败的文件不会在索引中留下键。
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS dedup_keys (kind TEXT NOT NULL, hash INTEGER NOT NULL, '
+                          'PRIMARY KEY (kind, hash)) WITHOUT ROWID')
+        self.conn.execute('CREATE TEMP TABLE batch_keys (hash INTEGER PRIMARY KEY)')
+        self.conn.commit()
+
+    @staticmethod
+    def _signed(hashes: np.ndarray) -> np.ndarray:
+        """uint64 哈希按位转为 int64，才能存入 SQLite 的 INTEGER"""
+        return np.ascontiguousarray(hashes, dtype=np.uint64).view(np.int64)
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM dedup_keys').fetchone()[0]
+
+    def duplicated(self, kind: str, hashes: np.ndarray) -> np.ndarray:
+        """返回每个哈希是否已出现过（包括索引中已有的和本批中靠前的）"""
+        dup = pd.Series(hashes).duplicated(keep='first').to_numpy()
+        signed = self._signed(hashes)
+        if not len(signed):
+            return dup
+
+        cur = self.conn.cursor()
+        cur.execute('DELETE FROM batch_keys')
+        cur.executemany('INSERT INTO batch_keys (hash) VALUES (?)', ((h,) for h in np.unique(signed).tolist()))
+        seen = [row[0] for row in cur.execute(
+            'SELECT b.hash FROM batch_keys b JOIN dedup_keys k ON k.kind = ? AND k.hash = b.hash', (kind,))]
+        if seen:
+            dup = dup | np.isin(signed, np.array(seen, dtype=np.int64))
+        return dup
+
+    def add(self, kind: str, hashes: np.ndarray):
+        """登记保留行的键哈希（调用 commit 后才写入磁盘）"""
+        self.conn.executemany('INSERT OR IGNORE INTO dedup_keys (kind, hash) VALUES (?, ?)',
+                              ((kind, h) for h in self._signed(hashes).tolist()))
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+def dedup_rows(df: pd.DataFrame, company_col: Optional[str], phone_col: Optional[str],
+               index: DedupIndex) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[int, int]]:
+    """单遍去重：键列只哈希一次，为每行确定保留/去重原因，再一次性拆分保留行和移除行
+
+    有手机号列时：非空手机号按手机号去重，空手机号按公司名称+手机号去重；
+    没有手机号列时按公司名称去重。返回 (保留行, 移除行, {去重原因代码: 行数})
+    """
+    reasons = np.zeros(len(df), dtype=np.uint8)
+
+    if phone_col:
+        has_phone = (df[phone_col] != "").to_numpy()
+        phone_hashes = hash_keys(df, [phone_col])
+        reasons[has_phone & index.duplicated('phone', phone_hashes)] = DUP_PHONE
+        if company_col:
+            combined_hashes = hash_keys(df, [company_col, phone_col])
+            reasons[~has_phone & index.duplicated('company_phone', combined_hashes)] = DUP_COMPANY_PHONE
+        keep = reasons == 0
+        index.add('phone', phone_hashes[keep & has_phone])
+        if company_col:
+            index.add('company_phone', combined_hashes[keep & ~has_phone])
+    else:
+        company_hashes = hash_keys(df, [company_col])
+        reasons[index.duplicated('company', company_hashes)] = DUP_COMPANY
+        keep = reasons == 0
+        index.add('company', company_hashes[keep])
 
-    return df[~mask_total], df_with_reason[mask_total]
+    removed = df[~keep].copy()
+    removed['过滤原因'] = pd.Series(reasons[~keep], index=removed.index).map(DUP_REASON_TEXT)
+    counts = {code: int(np.count_nonzero(reasons == code)) for code in DUP_REASON_TEXT}
+    return df[keep], removed, counts
 
 def find_target_column(df: pd.DataFrame, keywords: List[str]) -> Optional[str]:
     """查找包含所有关键词的列"""
@@ -167,41 +521,54 @@ def find_target_column(df: pd.DataFrame, keywords: List[str]) -> Optional[str]:
             return col
     return None
 
-def format_excel_worksheet(ws):
-    """美化Excel工作表格式"""
-    # 设置标题行格式
-    header_font = Font(name='微软雅黑', size=14, bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    # 设置数据行格式
-    data_alignment = Alignment(horizontal='center', vertical='center')
-    for row in ws.iter_rows(min_row=2):
-        for cell in row:
-            cell.alignment = data_alignment
-
-    # 调整行高
-    ws.row_dimensions[1].height = 30
-    for row_idx in range(2, ws.max_row + 1):
-        ws.row_dimensions[row_idx].height = 18
-
-    # 优化列宽调整（修复：处理空值导致的报错）
-    max_rows_to_check = min(100, ws.max_row)
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-
-        for cell in col[:max_rows_to_check + 1]:
-            try:
-                cell_value = str(cell.value) if cell.value is not None else ""
-                if len(cell_value) > max_length:
-                    max_length = len(cell_value)
-            except:
-                pass
-
-        adjusted_width = (max_length + 2) * 1.2
-        ws.column_dimensions[column].width = min(adjusted_width, 50)
+def load_schema_map(folder: str) -> Dict[str, dict]:
+    """读取表头结构映射，返回 {文件路径: 映射条目}，只保留大小和修改时间未变化的文件"""
+    try:
+        with open(os.path.join(folder, schema_map_filename), 'r', encoding='utf-8') as f:
+            schema_map = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    schemas = {}
+    for rel_path, entry in schema_map.get('files', {}).items():
+        file_path = os.path.join(folder, *rel_path.split('/'))
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+            schemas[os.path.normcase(file_path)] = entry
+    return schemas
+
+def schema_matches_header(schema: dict, header_values: list) -> bool:
+    """校验映射条目：公司名称/手机号列在映射位置上的表头单元格必须就是该列（或其同义表头）
+
+    映射中的表头行识别错误时按其读取会丢掉真正的表头和第一行数据，校验不通过时不使用映射
+    """
+    aliases = schema.get('aliases', {})
+    checked = [col for col in SCHEMA_KEY_COLUMNS if col in schema['positions']]
+    if not checked:
+        return False
+    for col in checked:
+        idx = schema['positions'][col]
+        if idx >= len(header_values):
+            return False
+        value = str(header_values[idx])
+        if value.strip() != col and aliases.get(value, aliases.get(value.strip())) != col:
+            return False
+    return True
+
+def parse_with_schema(xls: pd.ExcelFile, sheet_name: str, schema: dict) -> Optional[pd.DataFrame]:
+    """按映射中的表头行读取工作表，并把同义表头按列位置换成标准列名；表头与映射不符时返回None"""
+    df = xls.parse(sheet_name, header=schema['header_row'])
+    if not schema_matches_header(schema, list(df.columns)):
+        return None
+    columns = list(df.columns)
+    for canonical, idx in schema['positions'].items():
+        if idx < len(columns):
+            columns[idx] = canonical
+    df.columns = columns
+    return df
 
 def save_filtered_data(filtered_data: Dict[str, pd.DataFrame], output_path: str):
     """保存被过滤掉的数据到Excel文件"""
@@ -212,30 +579,37 @@ def save_filtered_data(filtered_data: Dict[str, pd.DataFrame], output_path: str)
         with excel_writer(output_path) as writer:
             for sheet_name, df in filtered_data.items():
                 if not df.empty:
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            # 美化格式
-            wb = writer.book
-            for sheet_name in wb.sheetnames:
-                ws = wb[sheet_name]
-                format_excel_worksheet(ws)
+                    writer.write_sheet(sheet_name, df)
         print(f"√ 已保存被过滤数据到: {output_path}")
     except Exception as e:
         print(f"保存被过滤数据失败: {str(e)}")
 
 def process_excel_file(input_path: str, output_path: str, filtered_output_path: str,
-                       filter_words: List[str]) -> Tuple[int, Dict[str, int]]:
-    """处理单个Excel文件，返回处理的工作表数量和统计信息"""
+                       matcher: KeywordMatcher, schema: Optional[dict] = None,
+                       dedup_index: Optional[DedupIndex] = None) -> Tuple[int, Dict[str, int]]:
+    """处理单个Excel文件，返回处理的工作表数量和统计信息
+
+    schema 为表头结构映射中该文件的条目（只描述第一个工作表），提供时按其表头行和列位置读取；
+    dedup_index 为跨文件共用的去重索引，为None时每个工作表单独去重
+    """
     processed_sheets = 0
     sheet_stats = {}
     filtered_data = {}
 
     try:
-        # 修复：支持老版本Excel格式（.xls）
-        with pd.ExcelFile(input_path, engine='xlrd' if input_path.endswith('.xls') else None) as xls:
+        # 优先使用 calamine 引擎；否则老版本Excel格式（.xls）用 xlrd
+        if CALAMINE_AVAILABLE:
+            engine = 'calamine'
+        else:
+            engine = 'xlrd' if input_path.endswith('.xls') else None
+        with pd.ExcelFile(input_path, engine=engine) as xls:
             with excel_writer(output_path) as writer:
-                for sheet_name in xls.sheet_names:
-                    df = xls.parse(sheet_name)
+                for sheet_index, sheet_name in enumerate(xls.sheet_names):
+                    df = parse_with_schema(xls, sheet_name, schema) if schema and sheet_index == 0 else None
+                    if schema and sheet_index == 0 and df is None:
+                        print(f"※ 表头结构映射与实际表头不符（第{schema['header_row'] + 1}行），改为按第一行表头读取")
+                    if df is None:
+                        df = xls.parse(sheet_name)
                     original_rows = len(df)
                     print(f"\n正在处理工作表 [{sheet_name}] - 原始行数: {original_rows}")
 
@@ -244,7 +618,7 @@ def process_excel_file(input_path: str, output_path: str, filtered_output_path:
                     filtered_df = pd.DataFrame()
 
                     if company_col:
-                        df, filtered_df = filter_companies(df, filter_words, company_col)
+                        df, filtered_df = filter_companies(df, matcher, company_col)
                         filtered_rows = len(df)
                         filtered_count = original_rows - filtered_rows
                         print(f"√ 已过滤公司名称列：{company_col}，过滤掉 {filtered_count} 行")
@@ -266,66 +640,24 @@ def process_excel_file(input_path: str, output_path: str, filtered_output_path:
 
                     # 去重处理
                     duplicate_removed = 0
-                    if phone_col:
-                        before_duplicate = len(df)
-                        non_empty_mask = df[phone_col] != ""
-                        df_non_empty = df[non_empty_mask]
-                        df_empty = df[~non_empty_mask]
-
-                        # 对非空手机号去重
-                        duplicates_mask = df_non_empty.duplicated(subset=[phone_col], keep='first')
-                        duplicates_removed = df_non_empty[duplicates_mask]
-                        if not duplicates_removed.empty:
-                            duplicates_removed = duplicates_removed.copy()
-                            duplicates_removed['过滤原因'] = duplicates_removed.get('过滤原因', '') + '手机号重复; '
-                            if sheet_name in filtered_data:
-                                filtered_data[sheet_name] = pd.concat([filtered_data[sheet_name], duplicates_removed])
-                            else:
-                                filtered_data[sheet_name] = duplicates_removed
-
-                        df_non_empty = df_non_empty.drop_duplicates(subset=[phone_col])
-                        df = pd.concat([df_non_empty, df_empty])
-                        duplicate_removed = before_duplicate - len(df)
-                        print(f"√ 已根据手机号去重，移除重复行: {duplicate_removed} 行")
-
-                        # 公司名称+手机号去重
-                        if company_col:
-                            before_duplicate_combined = len(df)
-                            combined_duplicates_mask = df.duplicated(subset=[company_col, phone_col], keep='first')
-                            combined_duplicates_removed = df[combined_duplicates_mask]
-                            if not combined_duplicates_removed.empty:
-                                combined_duplicates_removed = combined_duplicates_removed.copy()
-                                combined_duplicates_removed['过滤原因'] = combined_duplicates_removed.get('过滤原因', '') + '公司名称+手机号重复; '
-                                if sheet_name in filtered_data:
-                                    filtered_data[sheet_name] = pd.concat([filtered_data[sheet_name], combined_duplicates_removed])
-                                else:
-                                    filtered_data[sheet_name] = combined_duplicates_removed
-
-                            df = df.drop_duplicates(subset=[company_col, phone_col])
-                            additional_removed = before_duplicate_combined - len(df)
-                            duplicate_removed += additional_removed
-                            print(f"√ 已根据公司名称+手机号去重，额外移除重复行: {additional_removed} 行")
-                    elif company_col:
-                        # 仅公司名称去重
-                        before_duplicate = len(df)
-                        duplicates_mask = df.duplicated(subset=[company_col], keep='first')
-                        duplicates_removed = df[duplicates_mask]
-                        if not duplicates_removed.empty:
-                            duplicates_removed = duplicates_removed.copy()
-                            duplicates_removed['过滤原因'] = duplicates_removed.get('过滤原因', '') + '公司名称重复; '
-                            if sheet_name in filtered_data:
-                                filtered_data[sheet_name] = pd.concat([filtered_data[sheet_name], duplicates_removed])
-                            else:
-                                filtered_data[sheet_name] = duplicates_removed
-
-                        df = df.drop_duplicates(subset=[company_col])
-                        duplicate_removed = before_duplicate - len(df)
-                        print(f"√ 已根据公司名称去重，移除重复行: {duplicate_removed} 行")
+                    if phone_col or company_col:
+                        index = dedup_index if dedup_index is not None else DedupIndex()
+                        df, duplicates_df, dup_counts = dedup_rows(df, company_col, phone_col, index)
+                        duplicate_removed = len(duplicates_df)
+                        if phone_col:
+                            print(f"√ 已根据手机号去重，移除重复行: {dup_counts[DUP_PHONE]} 行")
+                            if company_col:
+                                print(f"√ 已根据公司名称+手机号去重，额外移除重复行: {dup_counts[DUP_COMPANY_PHONE]} 行")
+                        else:
+                            print(f"√ 已根据公司名称去重，移除重复行: {dup_counts[DUP_COMPANY]} 行")
+
+                        if not duplicates_df.empty:
+                            filtered_data[sheet_name] = pd.concat([filtered_df, duplicates_df]) if not filtered_df.empty else duplicates_df
                     else:
                         print("※ 未找到公司名称列和手机号列，跳过去重")
 
                     # 保存结果
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+                    writer.write_sheet(sheet_name, df)
                     processed_sheets += 1
 
                     # 记录统计
@@ -336,12 +668,6 @@ def process_excel_file(input_path: str, output_path: str, filtered_output_path:
                         'duplicates_removed': duplicate_removed
                     }
 
-                # 美化格式
-                wb = writer.book
-                for sheet_name in wb.sheetnames:
-                    ws = wb[sheet_name]
-                    format_excel_worksheet(ws)
-
         # 保存被过滤数据
         save_filtered_data(filtered_data, filtered_output_path)
 
@@ -351,13 +677,32 @@ def process_excel_file(input_path: str, output_path: str, filtered_output_path:
 
     return processed_sheets, sheet_stats
 
-def process_folder(input_folder: str, output_folder: str, filtered_output_folder: str, filter_words: List[str]):
+# 子进程的过滤词缓存（从编译缓存文件载入匹配器，不随每个任务重复序列化）
+_worker_filter_cache: Optional[FilterWordCache] = None
+
+def _init_worker(filter_path: str):
+    global _worker_filter_cache
+    _worker_filter_cache = FilterWordCache(filter_path, verbose=False)
+
+def _process_file_job(job: Tuple[str, str, str, Optional[dict]]) -> Tuple[Optional[Tuple[int, Dict[str, int]]], str, Optional[str]]:
+    """在子进程中处理单个文件，捕获输出文字，返回 (处理结果, 输出文字, 错误信息)"""
+    input_path, output_path, filtered_output_path, schema = job
+    log = io.StringIO()
+    try:
+        with redirect_stdout(log):
+            result = process_excel_file(input_path, output_path, filtered_output_path,
+                                        _worker_filter_cache.get(), schema)
+        return result, log.getvalue(), None
+    except Exception as e:
+        return None, log.getvalue(), str(e)
+
+def process_folder(input_folder: str, output_folder: str, filtered_output_folder: str, filter_cache: FilterWordCache):
     """处理整个文件夹中的Excel文件"""
     os.makedirs(output_folder, exist_ok=True)
     os.makedirs(filtered_output_folder, exist_ok=True)
 
     # 获取所有Excel文件（修复：区分.xlsx和.xls）
-    excel_files = glob.glob(os.path.join(input_folder, '*.xlsx')) + glob.glob(os.path.join(input_folder, '*.xls'))
+    excel_files = sorted(glob.glob(os.path.join(input_folder, '*.xlsx')) + glob.glob(os.path.join(input_folder, '*.xls')))
 
     if not excel_files:
         print(f"在文件夹 {input_folder} 中未找到Excel文件")
@@ -366,32 +711,82 @@ def process_folder(input_folder: str, output_folder: str, filtered_output_folder
     total_files = len(excel_files)
     print(f"\n找到 {total_files} 个Excel文件需要处理")
 
-    for i, input_path in enumerate(excel_files, 1):
+    # 跨文件去重时所有文件共用一个去重索引；磁盘索引还会保留历次运行的键
+    if persistent_dedup:
+        dedup_index = PersistentDedupIndex(dedup_index_file)
+        print(f"去重范围: 跨文件、跨运行（磁盘索引 {dedup_index_file}，已有 {len(dedup_index)} 个键）")
+    elif cross_file_dedup:
+        dedup_index = DedupIndex()
+        print("去重范围: 整个输入文件夹（跨文件）")
+    else:
+        dedup_index = None
+
+    # 表头检测工具生成的结构映射：命中的文件不再依赖第一行表头和列名关键词
+    schemas = load_schema_map(input_folder)
+    if schemas:
+        print(f"使用表头结构映射: {len(schemas)} 个文件")
+
+    print(f"Excel读取引擎: {'calamine' if CALAMINE_AVAILABLE else 'openpyxl/xlrd'}")
+
+    jobs = []
+    for input_path in excel_files:
         filename = os.path.basename(input_path)
-        output_path = os.path.join(output_folder, filename)
-        filtered_filename = f"filtered_{filename}"
-        filtered_output_path = os.path.join(filtered_output_folder, filtered_filename)
+        jobs.append((input_path, os.path.join(output_folder, filename),
+                     os.path.join(filtered_output_folder, f"filtered_{filename}"),
+                     schemas.get(os.path.normcase(input_path))))
+
+    # 跨文件去重要求按文件顺序登记键，只能逐个处理；否则多进程并行，结果按文件顺序输出
+    workers = min(max_workers, total_files) if dedup_index is None else 1
+    if workers > 1:
+        print(f"并行处理进程数: {workers}")
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(filter_cache.filter_path,))
+        outcomes = executor.map(_process_file_job, jobs)
+    else:
+        executor = None
+        outcomes = None
+
+    try:
+        for i, (input_path, output_path, filtered_output_path, schema) in enumerate(jobs, 1):
+            filename = os.path.basename(input_path)
 
-        print(f"\n{'=' * 60}")
-        print(f"处理文件 [{i}/{total_files}]: {filename}")
-        print(f"输出文件: {output_path}")
-        print(f"被过滤数据文件: {filtered_output_path}")
+            if outcomes is not None:
+                result, log, error = next(outcomes)
 
-        try:
-            sheets_processed, sheet_stats = process_excel_file(
-                input_path, output_path, filtered_output_path, filter_words
-            )
-            print(f"√ 文件处理完成! 共处理 {sheets_processed} 个工作表")
-
-            # 打印统计
-            for sheet, stats in sheet_stats.items():
-                print(f"  - {sheet}:")
-                print(f"     原始行数: {stats['original']}")
-                print(f"     过滤后行数: {stats['filtered']}")
-                print(f"     过滤移除行数: {stats['removed']}")
-                print(f"     去重移除行数: {stats['duplicates_removed']}")
-        except Exception as e:
-            print(f"处理文件 {filename} 失败: {str(e)}")
+            print(f"\n{'=' * 60}")
+            print(f"处理文件 [{i}/{total_files}]: {filename}")
+            print(f"输出文件: {output_path}")
+            print(f"被过滤数据文件: {filtered_output_path}")
+
+            try:
+                if outcomes is not None:
+                    print(log, end='')
+                    if error is not None:
+                        raise RuntimeError(error)
+                    sheets_processed, sheet_stats = result
+                else:
+                    sheets_processed, sheet_stats = process_excel_file(
+                        input_path, output_path, filtered_output_path, filter_cache.get(), schema, dedup_index
+                    )
+                if dedup_index is not None:
+                    dedup_index.commit()
+                print(f"√ 文件处理完成! 共处理 {sheets_processed} 个工作表")
+
+                # 打印统计
+                for sheet, stats in sheet_stats.items():
+                    print(f"  - {sheet}:")
+                    print(f"     原始行数: {stats['original']}")
+                    print(f"     过滤后行数: {stats['filtered']}")
+                    print(f"     过滤移除行数: {stats['removed']}")
+                    print(f"     去重移除行数: {stats['duplicates_removed']}")
+            except Exception as e:
+                if dedup_index is not None:
+                    dedup_index.rollback()
+                print(f"处理文件 {filename} 失败: {str(e)}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if dedup_index is not None:
+            dedup_index.close()
 
     print(f"\n{'=' * 60}")
     print(f"所有文件处理完成!")
@@ -435,19 +830,21 @@ def main():
             print("请在该文件中添加过滤词，用空格分隔，然后重新运行程序")
             return
 
-        # 加载过滤词
-        filter_words, duplicate_words = load_filter_words(filter_path)
-        if not filter_words:
+        # 加载过滤词（内容未变时直接载入编译好的匹配器），所有文件共用，处理过程中文件变化会自动重新加载
+        filter_cache = FilterWordCache(filter_path)
+        matcher = filter_cache.get()
+        if not len(matcher):
             print("警告: 过滤词文件为空，将不会过滤任何公司名称")
         else:
-            print(f"已加载 {len(filter_words)} 个过滤词")
+            print(f"已加载 {len(matcher)} 个过滤词")
 
         # 处理文件夹
-        process_folder(input_folder, output_folder, filtered_output_folder, filter_words)
+        process_folder(input_folder, output_folder, filtered_output_folder, filter_cache)
 
     except Exception as e:
         print(f"\n错误发生：{str(e)}", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -1,12 +1,21 @@
 import os
+import re
+import csv
+import json
+import hashlib
+import importlib.util
 import pandas as pd
 import time
 from tqdm import tqdm
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
 
 
 # 配置日志记录
@@ -37,119 +46,332 @@ def setup_logger(log_file):
     return logger
 
 
+# 查找表头时最多扫描的行数（部分导出文件表头前有标题行/说明行）
+HEADER_SCAN_ROWS = 20
+
+
+def detect_header_row(rows, required_columns):
+    """在前几行中找出包含最多需要列的那一行作为表头，返回行下标（从0开始）"""
+    required = set(required_columns)
+    best_row, best_hits = 0, 0
+    for idx, row in enumerate(rows):
+        if idx >= HEADER_SCAN_ROWS:
+            break
+        hits = len(required.intersection(str(value).strip() for value in row if value is not None))
+        if hits > best_hits:
+            best_row, best_hits = idx, hits
+            if hits == len(required):
+                break
+    return best_row
+
+
+# 表头检测工具（处理前的检测表头是否一致.py）生成的表头结构映射文件名
+SCHEMA_MAP_NAME = '_表头结构映射.json'
+
+
+def load_schema_map(folder_path):
+    """读取输入文件夹中的表头结构映射，返回 {文件路径: 映射条目}
+
+    只保留大小和修改时间与当前文件一致的条目，文件变化后自动回退到逐文件识别表头。
+    """
+    map_path = os.path.join(folder_path, SCHEMA_MAP_NAME)
+    try:
+        with open(map_path, 'r', encoding='utf-8') as f:
+            schema_map = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    schemas = {}
+    for rel_path, entry in schema_map.get('files', {}).items():
+        file_path = os.path.join(folder_path, *rel_path.split('/'))
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+            schemas[file_path] = entry
+    return schemas
+
+
+def schema_matches_header(schema, header_values, required_columns):
+    """校验映射条目：需要的列在映射位置上的表头单元格必须就是该列（或其同义表头）
+
+    映射中的表头行识别错误时记录的是数据行的位置，按其读取会得到全空的列，
+    校验不通过时应回退到逐文件识别表头。映射中一个需要的列都没有时也视为不通过。
+    """
+    aliases = schema.get('aliases', {})
+    checked = [col for col in required_columns if col in schema['positions']]
+    if not checked:
+        return False
+    for col in checked:
+        idx = schema['positions'][col]
+        value = header_values[idx] if idx < len(header_values) else None
+        if value is None:
+            return False
+        text = str(value).strip()
+        if text != col and aliases.get(str(value), aliases.get(text)) != col:
+            return False
+    return True
+
+
+def validate_schema(schema, header_values, required_columns, file_path, logger):
+    """映射条目通过校验时原样返回，否则记录警告并返回None（回退到逐文件识别表头）"""
+    if schema_matches_header(schema, header_values, required_columns):
+        return schema
+    if logger:
+        logger.warning(f"文件 {os.path.basename(file_path)} 的表头结构映射与实际表头不符"
+                       f"（第{schema['header_row'] + 1}行），改为自动识别表头")
+    return None
+
+
+def read_delimited_header(file_path, sep, header_row):
+    """读取CSV/TSV指定行的单元格（用于校验表头结构映射）"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        for idx, row in enumerate(csv.reader(f, delimiter=sep)):
+            if idx == header_row:
+                return row
+    return []
+
+
+def schema_usecols(schema, required_columns):
+    """按映射得到需要列的原始位置（升序）和对应的标准列名"""
+    positions = schema['positions']
+    pairs = sorted((positions[col], col) for col in required_columns if col in positions)
+    return [idx for idx, _ in pairs], [col for _, col in pairs]
+
+
+def read_delimited_projected(file_path, sep, required_columns, schema=None, logger=None):
+    """先定位表头行，再用usecols只解析需要的列（CSV/TSV）"""
+    if schema:
+        schema = validate_schema(schema, read_delimited_header(file_path, sep, schema['header_row']),
+                                 required_columns, file_path, logger)
+    if schema:
+        # 有表头结构映射时直接按列位置读取，并把同义表头换成标准列名
+        usecols, names = schema_usecols(schema, required_columns)
+        df = pd.read_csv(file_path, sep=sep, dtype=object, skiprows=schema['header_row'], usecols=usecols)
+        df.columns = names
+        return df
+
+    with open(file_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        header_row = detect_header_row(csv.reader(f, delimiter=sep), required_columns)
+
+    return pd.read_csv(file_path, sep=sep, dtype=object, skiprows=header_row,
+                       usecols=lambda col: str(col).strip() in required_columns)
+
+
+def _rgb(color):
+    """取颜色的RGB值；主题色/索引色没有RGB值时返回None"""
+    rgb = getattr(color, 'rgb', None) if color is not None else None
+    return rgb if isinstance(rgb, str) else None
+
+
+def extract_header_style(cell):
+    """提取表头单元格样式为可序列化的字典"""
+    return {
+        'font': {
+            'name': cell.font.name,
+            'size': cell.font.size,
+            'bold': cell.font.bold,
+            'italic': cell.font.italic,
+            'color': _rgb(cell.font.color)
+        },
+        'alignment': {
+            'horizontal': cell.alignment.horizontal,
+            'vertical': cell.alignment.vertical,
+            'wrap_text': cell.alignment.wrap_text
+        },
+        'border': {
+            'left': cell.border.left.style,
+            'right': cell.border.right.style,
+            'top': cell.border.top.style,
+            'bottom': cell.border.bottom.style
+        },
+        'fill': {
+            'fill_type': cell.fill.fill_type,
+            'start_color': _rgb(cell.fill.start_color)
+        }
+    }
+
+
+def read_xlsx_single_pass(file_path, required_columns, schema=None, logger=None):
+    """只读模式流式读取xlsx一遍，同时获得数据和表头格式（表头行自动定位，或取自表头结构映射）
+
+    映射条目与实际表头不符时通过 logger 记录警告并改为自动定位表头行。
+    返回 (df, format_info, missing_columns)，df 只包含 required_columns 中存在的列
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        # 部分导出工具写入的维度信息不准确，按实际行内容读取
+        ws.reset_dimensions()
+
+        if schema:
+            # 表头行和列位置直接取自映射（同义表头已映射为标准列名），先确认该行确实是表头
+            header_row = schema['header_row']
+            header_cells = next(ws.iter_rows(min_row=header_row + 1, max_row=header_row + 1), ())
+            schema = validate_schema(schema, [cell.value for cell in header_cells], required_columns,
+                                     file_path, logger)
+        if schema:
+            column_index = {col: schema['positions'][col] for col in required_columns if col in schema['positions']}
+        else:
+            # 先定位表头行，只扫描前 HEADER_SCAN_ROWS 行
+            header_row = detect_header_row(ws.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True),
+                                           required_columns)
+            header_cells = next(ws.iter_rows(min_row=header_row + 1, max_row=header_row + 1), ())
+            header_values = [str(cell.value).strip() if cell.value is not None else None for cell in header_cells]
+
+            # 需要的列 -> 列下标（同名列取第一个）
+            column_index = {}
+            for idx, value in enumerate(header_values):
+                if value in required_columns and value not in column_index:
+                    column_index[value] = idx
+
+        existing_columns = [col for col in required_columns if col in column_index]
+        missing_columns = [col for col in required_columns if col not in column_index]
+        indices = [column_index[col] for col in existing_columns]
+
+        # 表头样式和数字格式直接取自表头行；列格式按输出表（required_columns顺序）的列字母记录
+        column_formats = {}
+        header_styles = {}
+        for col in existing_columns:
+            cell = header_cells[column_index[col]]
+            if cell.number_format:
+                column_formats[get_column_letter(required_columns.index(col) + 1)] = cell.number_format
+            header_styles[col] = extract_header_style(cell)
+
+        # 数据行只取需要的列，跳过整行为空的行（与 pd.read_excel 一致）
+        data = []
+        for row in ws.iter_rows(min_row=header_row + 2, values_only=True):
+            if not any(value is not None for value in row):
+                continue
+            data.append([row[idx] if idx < len(row) else None for idx in indices])
+    finally:
+        wb.close()
+
+    df = pd.DataFrame(data, columns=existing_columns, dtype=object)
+    format_info = {'column_formats': column_formats, 'header_styles': header_styles}
+    return df, format_info, missing_columns
+
+
 # 读取文件函数，保留格式信息
-def read_file(file_path, logger, required_columns):
-    """读取不同格式的表格文件并保留格式信息，只保留需要的列"""
+def read_file(file_path, logger, required_columns, schema=None):
+    """读取不同格式的表格文件并保留格式信息，只保留需要的列
+
+    schema 为表头结构映射中该文件的条目，提供时跳过表头识别，直接按列位置读取
+    """
     file_ext = os.path.splitext(file_path)[1].lower()
 
     try:
-        if file_ext in ['.xlsx', '.xls']:
-            # 读取Excel文件数据，使用只读模式提高性能
-            df = pd.read_excel(file_path, dtype=object)
-
-            # 只保留需要的列，不存在的列会被忽略
-            existing_columns = [col for col in required_columns if col in df.columns]
-            missing_columns = [col for col in required_columns if col not in df.columns]
+        if file_ext == '.xlsx':
+            # 只读流式读取一遍：定位表头行取表头和样式，数据行只取需要的列
+            df, format_info, missing_columns = read_xlsx_single_pass(file_path, required_columns, schema, logger)
             if missing_columns:
                 logger.warning(f"文件 {os.path.basename(file_path)} 缺少以下列: {missing_columns}")
-            df = df[existing_columns]
-
-            # 尝试加载格式信息，使用非只读模式
-            format_info = None
-            try:
-                # 使用非只读模式加载工作簿以获取格式信息
-                wb_format = load_workbook(file_path, read_only=False, data_only=True)
-                ws_format = wb_format.active
-
-                # 获取列格式
-                column_formats = {}
-                for col_idx in range(1, ws_format.max_column + 1):
-                    col_letter = get_column_letter(col_idx)
-                    if ws_format[f'{col_letter}1'].value in required_columns:  # 只关注需要的列
-                        if ws_format[f'{col_letter}1'].number_format:
-                            column_formats[col_letter] = ws_format[f'{col_letter}1'].number_format
-
-                # 获取表头样式
-                header_styles = {}
-                for col_idx in range(1, ws_format.max_column + 1):
-                    col_letter = get_column_letter(col_idx)
-                    header_value = ws_format[f'{col_letter}1'].value
-                    if header_value in required_columns:  # 只关注需要的列
-                        cell = ws_format[f'{col_letter}1']
-                        header_style = {
-                            'font': {
-                                'name': cell.font.name,
-                                'size': cell.font.size,
-                                'bold': cell.font.bold,
-                                'italic': cell.font.italic,
-                                'color': cell.font.color.rgb if cell.font.color else None
-                            },
-                            'alignment': {
-                                'horizontal': cell.alignment.horizontal,
-                                'vertical': cell.alignment.vertical,
-                                'wrap_text': cell.alignment.wrap_text
-                            },
-                            'border': {
-                                'left': cell.border.left.style,
-                                'right': cell.border.right.style,
-                                'top': cell.border.top.style,
-                                'bottom': cell.border.bottom.style
-                            },
-                            'fill': {
-                                'fill_type': cell.fill.fill_type,
-                                'start_color': cell.fill.start_color.rgb if cell.fill.start_color else None
-                            }
-                        }
-                        header_styles[header_value] = header_style  # 使用表头值作为键，而不是列字母
-
-                wb_format.close()
-                format_info = {'column_formats': column_formats, 'header_styles': header_styles}
-            except Exception as e:
-                logger.warning(f"获取文件 {os.path.basename(file_path)} 格式信息失败: {str(e)}")
-
             return df, format_info
 
-        elif file_ext == '.csv':
-            # 读取CSV文件，无法保留格式信息
-            df = pd.read_csv(file_path, dtype=object)
-            # 只保留需要的列
-            existing_columns = [col for col in required_columns if col in df.columns]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                logger.warning(f"文件 {os.path.basename(file_path)} 缺少以下列: {missing_columns}")
-            df = df[existing_columns]
-            return df, None
-
-        elif file_ext == '.tsv':
-            # 读取TSV文件，无法保留格式信息
-            df = pd.read_csv(file_path, sep='\t', dtype=object)
-            # 只保留需要的列
-            existing_columns = [col for col in required_columns if col in df.columns]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                logger.warning(f"文件 {os.path.basename(file_path)} 缺少以下列: {missing_columns}")
-            df = df[existing_columns]
-            return df, None
+        elif file_ext == '.xls':
+            # xls 不支持 openpyxl，无法获取格式信息；先定位表头行，再只解析需要的列
+            if schema:
+                header_values = pd.read_excel(file_path, header=None, skiprows=schema['header_row'], nrows=1,
+                                              dtype=object).iloc[0].tolist()
+                schema = validate_schema(schema, [value if pd.notna(value) else None for value in header_values],
+                                         required_columns, file_path, logger)
+            if schema:
+                usecols, names = schema_usecols(schema, required_columns)
+                df = pd.read_excel(file_path, dtype=object, header=schema['header_row'], usecols=usecols)
+                df.columns = names
+            else:
+                preview = pd.read_excel(file_path, header=None, nrows=HEADER_SCAN_ROWS, dtype=object)
+                header_row = detect_header_row(preview.itertuples(index=False), required_columns)
+                df = pd.read_excel(file_path, dtype=object, header=header_row,
+                                   usecols=lambda col: str(col).strip() in required_columns)
+
+        elif file_ext in ['.csv', '.tsv']:
+            # 读取CSV/TSV文件，无法保留格式信息，只解析需要的列
+            df = read_delimited_projected(file_path, '\t' if file_ext == '.tsv' else ',', required_columns,
+                                          schema, logger)
+
         else:
             logger.error(f"不支持的文件格式: {file_ext}")
             return None, None
 
+        # xls/csv/tsv：统一整理列名和列顺序
+        df.columns = [str(col).strip() for col in df.columns]
+        existing_columns = [col for col in required_columns if col in df.columns]
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            logger.warning(f"文件 {os.path.basename(file_path)} 缺少以下列: {missing_columns}")
+        return df[existing_columns], None
+
     except Exception as e:
         logger.error(f"读取文件 {os.path.basename(file_path)} 失败: {str(e)}")
         return None, None
 
 
-# 应用格式到Excel工作表
-def apply_formatting(ws, format_info, headers):
-    """应用格式信息到工作表"""
-    if not format_info:
-        return
+class _MessageBuffer:
+    """子进程中代替logger收集日志，随结果返回主进程统一输出"""
+
+    def __init__(self):
+        self.messages = []
 
-    # 应用表头样式
-    header_styles = format_info.get('header_styles', {})
-    for col_idx, header in enumerate(headers, 1):
-        column_letter = get_column_letter(col_idx)
-        cell = ws[f'{column_letter}1']
+    def info(self, msg):
+        self.messages.append((logging.INFO, msg))
+
+    def warning(self, msg):
+        self.messages.append((logging.WARNING, msg))
+
+    def error(self, msg):
+        self.messages.append((logging.ERROR, msg))
+
+
+# 进程池工作函数（必须是模块级函数才能被pickle）
+def ingest_file(file_path, required_columns, schema=None):
+    """在子进程中读取单个文件，并投影/补齐为required_columns的列顺序"""
+    file_start_time = time.time()
+    buffer = _MessageBuffer()
+
+    df, format_info = read_file(file_path, buffer, required_columns, schema)
+    if df is not None:
+        # 添加缺失的列并填充为None，再按需要的顺序排列
+        for col in required_columns:
+            if col not in df.columns:
+                df[col] = None
+        df = df[required_columns]
+
+    return df, format_info, buffer.messages, time.time() - file_start_time
+
+
+def iter_ingested_files(all_files, required_columns, max_workers, schemas=None):
+    """多进程并行解析文件，按输入顺序逐个产出结果
+
+    同时在途的任务数限制为 max_workers * 2，写入端较慢时不会把所有结果堆在内存中；
+    schemas 为 {文件路径: 表头结构映射条目}
+    """
+    schemas = schemas or {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        files = iter(all_files)
+
+        for file_path in files:
+            pending.append((file_path, executor.submit(ingest_file, file_path, required_columns, schemas.get(file_path))))
+            if len(pending) >= max_workers * 2:
+                break
+
+        while pending:
+            file_path, future = pending.popleft()
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append((next_file, executor.submit(ingest_file, next_file, required_columns, schemas.get(next_file))))
+            yield (file_path, *future.result())
+
+
+# 生成带格式的表头单元格（write_only 模式下样式必须在写入前设置）
+def build_header_cells(ws, format_info, headers):
+    """按格式信息生成表头行的单元格"""
+    header_styles = (format_info or {}).get('header_styles', {})
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
 
         if header in header_styles:  # 使用表头值查找样式
             style = header_styles[header]
@@ -189,11 +411,197 @@ def apply_formatting(ws, format_info, headers):
                     start_color=fill['start_color']
                 )
 
-    # 应用列格式
-    column_formats = format_info.get('column_formats', {})
-    for col_letter, fmt in column_formats.items():
-        for row in range(2, ws.max_row + 1):
-            ws[f'{col_letter}{row}'].number_format = fmt
+        cells.append(cell)
+    return cells
+
+
+class StreamingExcelWriter:
+    """write_only 模式的流式写入器
+
+    行到即写入临时文件，内存占用与总行数无关；数字格式按列注册为命名样式，
+    每种格式只创建一次。超过 max_rows_per_sheet 行时自动新建工作表。
+    """
+
+    def __init__(self, output_path, headers, max_rows_per_sheet=800000):
+        self.output_path = output_path
+        self.headers = headers
+        self.max_rows_per_sheet = max_rows_per_sheet
+        self.wb = Workbook(write_only=True)
+        self.ws = None
+        self.sheet_count = 0
+        self.sheet_rows = 0
+        self._format_styles = {}  # 数字格式 -> 命名样式名
+
+    def _style_for_format(self, fmt):
+        """每种数字格式只注册一次命名样式"""
+        if fmt not in self._format_styles:
+            name = f"列格式{len(self._format_styles) + 1}"
+            self.wb.add_named_style(NamedStyle(name=name, number_format=fmt))
+            self._format_styles[fmt] = name
+        return self._format_styles[fmt]
+
+    def _new_sheet(self, format_info):
+        self.sheet_count += 1
+        self.ws = self.wb.create_sheet(title=f'Sheet{self.sheet_count}')
+        self.sheet_rows = 0
+        self.ws.append(build_header_cells(self.ws, format_info, self.headers))
+
+    def write_frame(self, df, format_info):
+        """写入一个文件的数据，返回是否新建了工作表"""
+        new_sheet = self.ws is None or self.sheet_rows + len(df) > self.max_rows_per_sheet
+        if new_sheet:
+            self._new_sheet(format_info)
+
+        # 每列的样式只计算一次，General 格式无需设置
+        column_formats = (format_info or {}).get('column_formats', {})
+        column_styles = [None] * len(self.headers)
+        for col_letter, fmt in column_formats.items():
+            col_idx = column_index_from_string(col_letter) - 1
+            if fmt and fmt != 'General' and col_idx < len(column_styles):
+                column_styles[col_idx] = self._style_for_format(fmt)
+        styled = [(idx, name) for idx, name in enumerate(column_styles) if name]
+
+        # 空值统一为 None，写出为空单元格
+        df = df.astype(object).where(df.notna(), None)
+        for row in df.itertuples(index=False, name=None):
+            if styled:
+                row = list(row)
+                for idx, name in styled:
+                    cell = WriteOnlyCell(self.ws, value=row[idx])
+                    cell.style = name
+                    row[idx] = cell
+            self.ws.append(row)
+
+        self.sheet_rows += len(df)
+        return new_sheet
+
+    def close(self):
+        # 一个文件都没写入时也输出带表头的空表
+        if self.ws is None:
+            self._new_sheet(None)
+        self.wb.save(self.output_path)
+
+
+class PartitionedOutputWriter:
+    """列式分区输出（Parquet/CSV），附带已合并文件清单
+
+    每个源文件写成独立的分区文件（按源文件或按省份划分），写完后登记到清单。
+    重新运行时跳过清单中大小和修改时间都未变的文件，中断后或新增文件后只处理新内容。
+    """
+
+    MANIFEST_NAME = '_merge_manifest.json'
+
+    def __init__(self, output_dir, output_format='parquet', partition_by='file', logger=None):
+        if output_format == 'parquet' and not (importlib.util.find_spec('pyarrow')
+                                               or importlib.util.find_spec('fastparquet')):
+            if logger:
+                logger.warning("未安装 pyarrow/fastparquet，改为输出CSV分区")
+            output_format = 'csv'
+
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.partition_by = partition_by
+        self.logger = logger
+        self.manifest_path = os.path.join(output_dir, self.MANIFEST_NAME)
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        empty = {'output_format': self.output_format, 'partition_by': self.partition_by, 'files': {}}
+        if not os.path.exists(self.manifest_path):
+            return empty
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            if self.logger:
+                self.logger.warning(f"合并清单读取失败，将重新合并全部文件: {str(e)}")
+            return empty
+
+        # 输出格式或分区方式变化后，旧的分区文件不能复用
+        if (manifest.get('output_format') != self.output_format
+                or manifest.get('partition_by') != self.partition_by):
+            if self.logger:
+                self.logger.warning("输出格式或分区方式已变化，将重新合并全部文件")
+            return empty
+        return manifest
+
+    def _save_manifest(self):
+        # 先写临时文件再替换，避免中断时清单损坏
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _file_signature(file_path):
+        stat = os.stat(file_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def is_merged(self, file_path):
+        """文件是否已合并且之后未被修改"""
+        entry = self.manifest['files'].get(os.path.abspath(file_path))
+        if not entry:
+            return False
+        signature = self._file_signature(file_path)
+        return entry['size'] == signature['size'] and entry['mtime'] == signature['mtime']
+
+    def _part_name(self, file_path):
+        """分区文件名：源文件名 + 路径哈希，同名文件不冲突，重跑时覆盖同一文件"""
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        digest = hashlib.md5(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:8]
+        return f"{_safe_name(stem)}_{digest}.{self.output_format}"
+
+    def _write_part(self, df, path):
+        tmp_path = path + '.tmp'
+        if self.output_format == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        os.replace(tmp_path, path)
+
+    def write_frame(self, file_path, df):
+        """写入一个源文件的数据并登记到清单，返回写出的分区文件列表"""
+        df = df.astype(str).where(df.notna(), None) if self.output_format == 'parquet' else df
+        part_name = self._part_name(file_path)
+
+        outputs = []
+        if self.partition_by == 'province':
+            provinces = df['所属省份'].fillna('未知省份')
+            for province, group in df.groupby(provinces, sort=False):
+                part_dir = os.path.join(self.output_dir, f"所属省份={_safe_name(str(province))}")
+                os.makedirs(part_dir, exist_ok=True)
+                path = os.path.join(part_dir, part_name)
+                # 省份已体现在目录名中，文件内不再保留该列，否则读取分区目录时两者类型冲突
+                self._write_part(group.drop(columns='所属省份'), path)
+                outputs.append(path)
+        else:
+            path = os.path.join(self.output_dir, part_name)
+            self._write_part(df, path)
+            outputs.append(path)
+
+        # 源文件修改后重新合并：删除旧清单中这次没有再写出的分区文件（例如省份已不存在）
+        previous = self.manifest['files'].get(os.path.abspath(file_path), {})
+        for rel_path in previous.get('outputs', []):
+            stale_path = os.path.join(self.output_dir, rel_path)
+            if stale_path not in outputs and os.path.exists(stale_path):
+                os.remove(stale_path)
+
+        entry = self._file_signature(file_path)
+        entry.update({
+            'rows': len(df),
+            'outputs': [os.path.relpath(path, self.output_dir) for path in outputs],
+            'merged_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        self.manifest['files'][os.path.abspath(file_path)] = entry
+        self._save_manifest()
+        return outputs
+
+
+def _safe_name(name):
+    """去掉文件名中不允许的字符"""
+    return re.sub(r'[\\/:*?"<>|]', '_', name).strip() or '_'
 
 
 # 主函数
@@ -225,6 +633,16 @@ def main():
     # 支持的文件扩展名
     SUPPORTED_EXTS = ['.xlsx', '.xls', '.csv', '.tsv']
 
+    # 解析文件的进程数，默认使用全部CPU核心
+    MAX_WORKERS = os.cpu_count() or 1
+
+    # 输出格式：'xlsx' 单个工作簿；'parquet' / 'csv' 列式分区输出，支持断点续跑和增量合并
+    OUTPUT_FORMAT = 'xlsx'
+    # 分区方式（仅 parquet / csv）：'file' 按源文件，'province' 按所属省份
+    PARTITION_BY = 'file'
+    # 分区输出目录固定不带时间戳，重跑时才能复用已合并的结果
+    partition_dir = os.path.join(output_dir, "汇总分区")
+
     # 配置日志
     logger = setup_logger(log_path)
 
@@ -235,7 +653,7 @@ def main():
     failed_files = []
 
     logger.info(f"开始处理文件夹: {folder_path}")
-    logger.info(f"输出文件: {output_path}")
+    logger.info(f"输出: {output_path if OUTPUT_FORMAT == 'xlsx' else partition_dir}")
     logger.info(f"将只保留以下表头: {REQUIRED_COLUMNS}")
 
     # 获取所有文件路径
@@ -246,92 +664,78 @@ def main():
                 all_files.append(os.path.join(root, file))
 
     logger.info(f"找到 {len(all_files)} 个表格文件")
+    logger.info(f"并行解析进程数: {MAX_WORKERS}")
+
+    # 表头检测工具生成的结构映射：命中的文件直接按列位置读取
+    schemas = load_schema_map(folder_path)
+    if schemas:
+        logger.info(f"使用表头结构映射: {len(schemas)} 个文件跳过表头识别")
 
     if not all_files:
         logger.info("没有找到可处理的表格文件，程序退出")
         return
 
-    # 创建ExcelWriter对象
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        current_sheet = 1
-        current_sheet_rows = 0
-
-        # 设置表头为我们需要的列
-        headers = REQUIRED_COLUMNS
-
-        # 创建进度条
-        with tqdm(total=len(all_files), desc="处理进度") as pbar:
-            # 处理所有文件
-            for file_path in all_files:
-                file_start_time = time.time()
-
-                # 读取文件并只保留需要的列
-                df, format_info = read_file(file_path, logger, REQUIRED_COLUMNS)
-                if df is None:
-                    failed_files.append(file_path)
-                    pbar.update(1)
-                    continue
-
-                # 确保列的顺序与我们定义的一致
-                existing_columns = df.columns.tolist()
-                # 添加缺失的列并填充为None
-                for col in REQUIRED_COLUMNS:
-                    if col not in existing_columns:
-                        df[col] = None
-                # 重新排序列以匹配我们需要的顺序
-                df = df[REQUIRED_COLUMNS]
-
-                # 检查是否需要创建新工作表
-                if current_sheet_rows + len(df) > 800000:  # 每个工作表最大行数
-                    current_sheet += 1
-                    current_sheet_rows = 0
-                    sheet_name = f'Sheet{current_sheet}'
-                    logger.info(f"创建新工作表: {sheet_name}")
-
-                # 写入数据到当前工作表
-                sheet_name = f'Sheet{current_sheet}'
-                startrow = current_sheet_rows + 1  # +1 是因为Excel行从1开始
-
-                # 如果是新工作表，需要写入表头
-                write_header = (current_sheet_rows == 0)
-                df.to_excel(writer, sheet_name=sheet_name, index=False, header=write_header, startrow=startrow)
-
-                # 应用格式
-                ws = writer.sheets[sheet_name]
-                if write_header:  # 如果是新工作表，应用表头格式
-                    apply_formatting(ws, format_info, headers)
-                else:  # 否则只应用列格式
-                    if format_info and 'column_formats' in format_info:
-                        column_formats = format_info['column_formats']
-                        for col_letter, fmt in column_formats.items():
-                            for row in range(startrow + 1, startrow + len(df) + 1):
-                                ws[f'{col_letter}{row}'].number_format = fmt
-
-                # 更新统计信息
-                file_rows = len(df)
-                total_rows += file_rows
-                current_sheet_rows += file_rows
-                processed_files += 1
-
-                # 打印处理信息
-                file_size = os.path.getsize(file_path) / (1024 * 1024)
-                file_elapsed = time.time() - file_start_time
-                pbar.set_postfix({
-                    "文件": os.path.basename(file_path),
-                    "行数": f"{file_rows:,}",
-                    "大小": f"{file_size:.2f}MB",
-                    "耗时": f"{file_elapsed:.2f}s"
-                })
+    if OUTPUT_FORMAT == 'xlsx':
+        # 流式写入：行到即写，内存占用恒定
+        writer = StreamingExcelWriter(output_path, REQUIRED_COLUMNS, max_rows_per_sheet=800000)
+    else:
+        writer = PartitionedOutputWriter(partition_dir, OUTPUT_FORMAT, PARTITION_BY, logger)
+
+        # 跳过清单中已合并且未修改的文件
+        merged_files = [f for f in all_files if writer.is_merged(f)]
+        if merged_files:
+            logger.info(f"跳过已合并的文件: {len(merged_files)} 个")
+            all_files = [f for f in all_files if not writer.is_merged(f)]
+
+    # 创建进度条
+    with tqdm(total=len(all_files), desc="处理进度") as pbar:
+        # 多进程并行解析，按文件顺序依次写入
+        for file_path, df, format_info, messages, file_elapsed in iter_ingested_files(
+                all_files, REQUIRED_COLUMNS, MAX_WORKERS, schemas):
+            for level, msg in messages:
+                logger.log(level, msg)
+
+            if df is None:
+                failed_files.append(file_path)
                 pbar.update(1)
+                continue
+
+            if OUTPUT_FORMAT == 'xlsx':
+                # 写入数据（超过每个工作表最大行数时自动新建工作表）
+                if writer.write_frame(df, format_info) and writer.sheet_count > 1:
+                    logger.info(f"创建新工作表: Sheet{writer.sheet_count}")
+            else:
+                writer.write_frame(file_path, df)
+
+            # 更新统计信息
+            file_rows = len(df)
+            total_rows += file_rows
+            processed_files += 1
+
+            # 打印处理信息（耗时为子进程解析耗时）
+            file_size = os.path.getsize(file_path) / (1024 * 1024)
+            pbar.set_postfix({
+                "文件": os.path.basename(file_path),
+                "行数": f"{file_rows:,}",
+                "大小": f"{file_size:.2f}MB",
+                "耗时": f"{file_elapsed:.2f}s"
+            })
+            pbar.update(1)
+
+    if OUTPUT_FORMAT == 'xlsx':
+        writer.close()
 
     # 输出汇总统计
     total_elapsed = time.time() - start_time
     logger.info("\n===== 处理完成 =====")
-    logger.info(f"输出文件: {output_path}")
+    logger.info(f"输出: {output_path if OUTPUT_FORMAT == 'xlsx' else partition_dir}")
     logger.info(f"处理文件数: {processed_files}/{len(all_files)}")
     logger.info(f"失败文件数: {len(failed_files)}")
     logger.info(f"汇总总行数: {total_rows:,}")
-    logger.info(f"工作表数量: {current_sheet}")
+    if OUTPUT_FORMAT == 'xlsx':
+        logger.info(f"工作表数量: {writer.sheet_count}")
+    else:
+        logger.info(f"清单中已合并文件总数: {len(writer.manifest['files'])}")
     logger.info(f"总耗时: {total_elapsed:.2f} 秒 ({total_elapsed / 60:.2f} 分钟)")
     logger.info(f"处理速度: {total_rows / total_elapsed:.0f} 行/秒")
 
@@ -345,4 +749,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Windows下打包为exe时多进程需要
+    multiprocessing.freeze_support()
     main()
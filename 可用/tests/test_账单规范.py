@@ -0,0 +1,95 @@
+import importlib.util
+import os
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '账单规范.py')
+spec = importlib.util.spec_from_file_location('账单规范', MODULE_PATH)
+账单规范 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(账单规范)
+
+
+TIANJI_RECORD = {
+    '账号': '甲公司', '账单ID': 'B1', '交易类型': '提现', '交易金额(利润)': '-10.00', '交易时间': '2025/10/19 10:00:00',
+    '实际交易时间': '无', '订单编号': '无', '公司名称': '甲公司', '收入金额': '无', '成本金额': '无',
+    '手续费': '1.00', '备注': '无', '提现单号': 'W9', '账单状态': '成功',
+}
+XIAOTAIFENG_RECORD = {
+    'username': 'u01', 'id': '101', 'amount': '30', 'profit': '5.5', 'createtime': '2025-10-19 10:00:00',
+    'account': '客户甲', 'productname': '流量套餐', 'yunyingshang': 'CMCC', 'incometype': '出售套餐',
+}
+
+
+def test_make_bill_fixes_field_types():
+    bill = 账单规范.make_bill(sale_price='12.50 元', commission='-', iccid='89860abc', trans_time='1760839200')
+
+    assert list(bill) == 账单规范.BILL_CODES
+    assert bill['sale_price'] == 12.5
+    assert bill['commission'] is None and bill['cost_price'] is None
+    assert bill['iccid'] == '89860ABC'
+    assert bill['order_no'] == ''
+    assert len(bill['trans_time']) == 19
+
+
+def test_v1_and_v2_layouts_convert_to_the_same_bill():
+    v2 = {'order_no': 'A1', 'trans_time': '2025-10-19 10:00:00', 'commission': '3', 'platform': '天机',
+          'income_type': '佣金收入'}
+    v1 = {账单规范.FIELD_NAMES[code]: value for code, value in v2.items()}
+
+    assert 账单规范.from_v1(v1, 'u01') == 账单规范.from_v2(v2, 'u01')
+    assert 账单规范.from_v2(v2, 'u01')['account'] == 'u01'
+
+
+def test_v1_miaoyue_zero_prices_become_missing():
+    bill = 账单规范.from_v1({'平台': '妙月', '售价（元）': 0.0, '成本（元）': 0.0, '佣金（元）': 2.0})
+    assert bill['sale_price'] is None and bill['cost_price'] is None and bill['commission'] == 2.0
+
+
+def test_tianji_converter_keeps_unmapped_columns_in_remark():
+    bill = 账单规范.from_tianji_script(TIANJI_RECORD, 'u01')
+
+    assert bill['trans_time'] == '2025-10-19 10:00:00'
+    assert bill['commission'] == -10.0
+    assert bill['income_type'] == '提现支出'
+    assert bill['remark'] == '账单ID:B1 手续费:1.00 提现单号:W9 账单状态:成功'
+    assert (bill['platform'], bill['account']) == ('天机', 'u01')
+
+
+def test_xiaotaifeng_converter_maps_id_and_derives_cost():
+    bill = 账单规范.from_xiaotaifeng_script(XIAOTAIFENG_RECORD)
+
+    assert bill['order_no'] == '101'
+    assert (bill['sale_price'], bill['commission'], bill['cost_price']) == (30.0, 5.5, 24.5)
+    assert bill['operator'] == '中国移动'
+    assert bill['income_type'] == '出售套餐'
+    assert bill['account'] == 'u01'
+
+
+def test_miaoyue_converter_classifies_by_bill_type():
+    bill = 账单规范.from_miaoyue_script({'orderNo': 'M1', 'billAmount': 8, 'billType': 'orderCommissionBill',
+                                         'createTime': '2025-10-19 10:00:00', 'cardIccid': 'abc'}, 'u02')
+    assert bill['income_type'] == '佣金收入'
+    assert bill['product_name'] == '订单号: M1'
+    assert bill['iccid'] == 'ABC'
+
+
+def test_bill_key_distinguishes_bills_that_differ_only_by_source_id():
+    """同一时间、同样金额的两条账单只有账单ID不同，不能被当作同一条"""
+    assert (账单规范.bill_key(账单规范.from_tianji_script(TIANJI_RECORD))
+            != 账单规范.bill_key(账单规范.from_tianji_script({**TIANJI_RECORD, '账单ID': 'B2'})))
+    assert (账单规范.bill_key(账单规范.from_xiaotaifeng_script(XIAOTAIFENG_RECORD))
+            != 账单规范.bill_key(账单规范.from_xiaotaifeng_script({**XIAOTAIFENG_RECORD, 'id': '102'})))
+    assert (账单规范.bill_key(账单规范.from_xiaotaifeng_script(XIAOTAIFENG_RECORD))
+            == 账单规范.bill_key(账单规范.from_xiaotaifeng_script(dict(XIAOTAIFENG_RECORD))))
+
+
+def test_bill_store_deduplicates_and_filters(tmp_path):
+    db_path = str(tmp_path / '账单.db')
+    bills = 账单规范.convert_bills([XIAOTAIFENG_RECORD, {**XIAOTAIFENG_RECORD, 'id': '102'}], '小台风')
+
+    assert 账单规范.save_bills(bills, 'test', db_path) == 2
+    assert 账单规范.save_bills(bills, 'test', db_path) == 0
+
+    store = 账单规范.BillStore(db_path)
+    assert sorted(bill['order_no'] for bill in store.load(platform='小台风', account='u01')) == ['101', '102']
+    assert store.load(platform='天机') == []
+    # 读回的账单与写入的规范账单完全一致（金额仍为float/None）
+    assert sorted(store.load(), key=lambda bill: bill['order_no']) == bills
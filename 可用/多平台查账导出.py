@@ -1,10 +1,11 @@
 # multi_platform_query_system_optimized.py
 import re
 import json
+import math
 import time
 import os
-import pandas as pd
-import numpy as np
+import random
+import threading
 import configparser
 import concurrent.futures
 from datetime import datetime, timedelta
@@ -12,14 +13,13 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 import requests
 from requests import Session
-from bs4 import BeautifulSoup
 from colorama import Fore, init, Style, Back
-from openpyxl import Workbook
-from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 import warnings
 import logging
-from fake_useragent import UserAgent
+from 账单规范 import BILL_DB_PATH, convert_bills, save_bills, write_bill_sheet
+
+# pandas / bs4 / openpyxl / fake_useragent 较重，只在用到的代码路径中延迟导入，
+# 只查余额时无需加载，缩短启动时间
 
 warnings.filterwarnings('ignore')
 
@@ -27,6 +27,55 @@ warnings.filterwarnings('ignore')
 init(autoreset=True)
 
 
+# ======================== 启动优化工具 ========================
+# 内置UA列表：fake_useragent 不可用时使用
+STATIC_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) Gecko/20100101 Firefox/133.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.6 Safari/605.1.15",
+]
+
+_ua_lock = threading.Lock()
+_ua_instance = None
+_ua_loaded = False
+
+
+def random_user_agent() -> str:
+    """返回随机UA；fake_useragent 数据集每个进程只加载一次"""
+    global _ua_instance, _ua_loaded
+    if not _ua_loaded:
+        with _ua_lock:
+            if not _ua_loaded:
+                try:
+                    from fake_useragent import UserAgent
+                    _ua_instance = UserAgent()
+                except Exception:
+                    _ua_instance = None
+                _ua_loaded = True
+
+    if _ua_instance is not None:
+        try:
+            return _ua_instance.random
+        except Exception:
+            pass
+    return random.choice(STATIC_USER_AGENTS)
+
+
+def is_missing(value: Any) -> bool:
+    """判断None/NaN空值（替代pd.isna，避免启动时加载pandas）"""
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    # pandas.NaT 等缺失值类型与自身比较不相等
+    try:
+        return bool(value != value)
+    except Exception:
+        return False
+
+
 # 配置日志
 def setup_logging():
     """配置日志系统"""
@@ -193,7 +242,7 @@ class DataProcessor:
     @staticmethod
     def standardize_operator(operator: str) -> str:
         """运营商标准化"""
-        if not operator or pd.isna(operator) or operator in ['', '未采集', '未采集 ']:
+        if not operator or is_missing(operator) or operator in ['', '未采集', '未采集 ']:
             return ""
 
         operator = str(operator).strip().upper()
@@ -255,7 +304,7 @@ class DataProcessor:
     @staticmethod
     def safe_float(value, default=0.0) -> float:
         """安全转换为浮点数"""
-        if pd.isna(value) or value is None:
+        if is_missing(value):
             return default
         try:
             return float(value)
@@ -265,7 +314,7 @@ class DataProcessor:
     @staticmethod
     def safe_str(value, default="") -> str:
         """安全转换为字符串，如果是'未采集'返回空字符串"""
-        if pd.isna(value) or value is None:
+        if is_missing(value):
             return default
 
         str_value = str(value).strip()
@@ -276,7 +325,7 @@ class DataProcessor:
     @staticmethod
     def standardize_datetime(dt_str: str) -> str:
         """标准化时间格式"""
-        if not dt_str or pd.isna(dt_str) or str(dt_str).strip() in ['无交易时间', '未知时间', '-']:
+        if not dt_str or is_missing(dt_str) or str(dt_str).strip() in ['无交易时间', '未知时间', '-']:
             return ""
 
         try:
@@ -419,6 +468,7 @@ class TianjiClient:
             html = resp.text
 
             try:
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(html, 'html.parser')
 
                 balance_elements = soup.find_all(text=re.compile(r'余额[:：]?\s*'))
@@ -945,7 +995,6 @@ class MiaoYueClient:
         self.cfg = config
         self.common_cfg = config['common']
         self.base_url = config['miaoyue']['base_url']
-        self.ua = UserAgent()
         self.data_processor = DataProcessor()
         self.account_info = {}
 
@@ -985,7 +1034,7 @@ class MiaoYueClient:
         """获取余额"""
         balance_url = f"{self.base_url}/card/proxy/company/capital/account/info?currencyType=CNY"
         try:
-            headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": self.ua.random}
+            headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": random_user_agent()}
             response = requests.get(balance_url, headers=headers,
                                     timeout=self.common_cfg['request_timeout'])
             response.raise_for_status()
@@ -1041,7 +1090,7 @@ class MiaoYueClient:
                             f"orders[0].column=createTime&orders[0].asc=false&"
                             f"current={current}&size={self.common_cfg['bill_page_size']}")
 
-                headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": self.ua.random}
+                headers = {"x-token": f'{{"token":"{token}"}}', "User-Agent": random_user_agent()}
                 response = requests.get(bill_url, headers=headers,
                                         timeout=self.common_cfg['request_timeout'])
                 response.raise_for_status()
@@ -1416,10 +1465,14 @@ class MultiPlatformManager:
             xiaotaifeng_bills, xiaotaifeng_accounts = self.query_xiaotaifeng_accounts()
             miaoyue_bills, miaoyue_accounts = self.query_miaoyue_accounts()
 
-        self.all_bills = tianji_bills + xiaotaifeng_bills + miaoyue_bills
-        self.platform_bills['天机'] = tianji_bills
-        self.platform_bills['小台风'] = xiaotaifeng_bills
-        self.platform_bills['妙月'] = miaoyue_bills
+        # 统一转换为规范账单，写入共用账单库后再导出
+        self.platform_bills['天机'] = convert_bills(tianji_bills, 'v1')
+        self.platform_bills['小台风'] = convert_bills(xiaotaifeng_bills, 'v1')
+        self.platform_bills['妙月'] = convert_bills(miaoyue_bills, 'v1')
+        self.all_bills = self.platform_bills['天机'] + self.platform_bills['小台风'] + self.platform_bills['妙月']
+        added = save_bills(self.all_bills, 'V1')
+        if added:
+            print(f"{Fore.GREEN}💾 新增{added}条账单已写入账单库：{BILL_DB_PATH}")
 
         self.account_summary = tianji_accounts + xiaotaifeng_accounts + miaoyue_accounts
         self.summary_data['total_bills'] = len(self.all_bills)
@@ -1457,6 +1510,7 @@ class MultiPlatformManager:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         excel_file = output_path / f"多平台账单汇总_{timestamp}.xlsx"
 
+        from openpyxl import Workbook
         wb = Workbook()
 
         if 'Sheet' in wb.sheetnames:
@@ -1465,7 +1519,7 @@ class MultiPlatformManager:
         # 1. 多平台账单汇总表
         if self.all_bills:
             ws_summary = wb.create_sheet(title="多平台账单汇总")
-            self._write_bills_to_sheet(ws_summary, self.all_bills, "多平台账单汇总", sort_by_time=True)
+            write_bill_sheet(ws_summary, self.all_bills, "多平台账单汇总", sort_by_time=True)
 
         # 2. 各平台单独工作表
         for platform in ['天机', '小台风', '妙月']:
@@ -1473,7 +1527,7 @@ class MultiPlatformManager:
             if platform_bills:
                 ws_platform = wb.create_sheet(title=f"{platform}账单")
                 sort_needed = (platform == '天机')
-                self._write_bills_to_sheet(ws_platform, platform_bills, f"{platform}平台账单", sort_by_time=sort_needed)
+                write_bill_sheet(ws_platform, platform_bills, f"{platform}平台账单", sort_by_time=sort_needed)
 
         # 3. 平台账号汇总表
         if self.account_summary:
@@ -1494,102 +1548,11 @@ class MultiPlatformManager:
 
         return excel_file
 
-    def _write_bills_to_sheet(self, ws, bills_data, sheet_title, sort_by_time=False):
-        """将账单数据写入工作表"""
-        if not bills_data:
-            ws.append(["无数据"])
-            return
-
-        df = pd.DataFrame(bills_data)
-
-        if '交易时间' in df.columns and sort_by_time:
-            df['交易时间_temp'] = pd.to_datetime(df['交易时间'], errors='coerce', format='%Y-%m-%d %H:%M:%S')
-            df = df.dropna(subset=['交易时间_temp'])
-            df = df.sort_values('交易时间_temp', ascending=False)
-            df = df.drop('交易时间_temp', axis=1)
-
-        column_order = ['订单号', 'ICCID', '卡号', '交易时间', '售价（元）', '成本（元）',
-                        '佣金（元）', '客户名称', '套餐/产品名称', '运营商', '收入类型',
-                        '备注', '平台', '账号']
-
-        existing_columns = [col for col in column_order if col in df.columns]
-        df = df[existing_columns]
-
-        header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-
-        data_font = Font(name='微软雅黑', size=10)
-        data_alignment_num = Alignment(horizontal='right', vertical='center')
-        data_alignment_str = Alignment(horizontal='left', vertical='center')
-        data_alignment_center = Alignment(horizontal='center', vertical='center')
-
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-
-        column_widths = {
-            '订单号': 18,
-            'ICCID': 20,
-            '卡号': 15,
-            '交易时间': 20,
-            '售价（元）': 10,
-            '成本（元）': 10,
-            '佣金（元）': 10,
-            '客户名称': 20,
-            '套餐/产品名称': 25,
-            '运营商': 10,
-            '收入类型': 10,
-            '备注': 15,
-            '平台': 10,
-            '账号': 15
-        }
-
-        for col_idx, column in enumerate(existing_columns, 1):
-            cell = ws.cell(row=1, column=col_idx, value=column)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
-            width = column_widths.get(column, 12)
-            ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-        for row_idx, row in df.iterrows():
-            for col_idx, column in enumerate(existing_columns, 1):
-                cell_value = row[column]
-
-                if cell_value == "" or pd.isna(cell_value):
-                    cell_value = None
-
-                cell = ws.cell(row=row_idx + 2, column=col_idx, value=cell_value)
-                cell.font = data_font
-                cell.border = thin_border
-
-                if '（元）' in column or column in ['售价（元）', '成本（元）', '佣金（元）']:
-                    cell.alignment = data_alignment_num
-                    if isinstance(cell_value, (int, float)):
-                        cell.number_format = '0.00'
-                elif column in ['平台', '账号', '收入类型']:
-                    cell.alignment = data_alignment_center
-                else:
-                    cell.alignment = data_alignment_str
-
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row):
-            ws.row_dimensions[row[0].row].height = 20
-
-        ws.insert_rows(1)
-        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(existing_columns))
-        title_cell = ws.cell(row=1, column=1, value=sheet_title)
-        title_cell.font = Font(name='微软雅黑', size=14, bold=True, color='000000')
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        title_cell.fill = PatternFill(start_color='FFE699', end_color='FFE699', fill_type='solid')
-
-        ws.freeze_panes = ws['A3']
-
     def _write_account_summary_to_sheet(self, ws):
         """写入平台账号汇总表"""
+        from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         # 更新表头，增加提现和退款统计
         headers = ['平台', '账号', '总余额（元）', '可提现余额（元）', '不可提现余额（元）',
                    f'最近{self.config["common"].get("days_for_recent", 30)}天收益（元）',
@@ -1697,6 +1660,9 @@ class MultiPlatformManager:
 
     def _write_statistics_to_sheet(self, ws):
         """写入数据统计表"""
+        from openpyxl.styles import Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         # 计算净收益
         net_income = self.summary_data['total_recent_income'] - self.summary_data['total_recent_refund']
 
@@ -1773,6 +1739,9 @@ class MultiPlatformManager:
 
     def _write_error_logs_to_sheet(self, ws):
         """写入错误日志表"""
+        from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
         headers = ['时间', '平台', '账号', '错误类型', '错误信息']
 
         header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
@@ -1867,9 +1836,9 @@ class MultiPlatformManager:
 # ======================== 主程序入口 ========================
 def main():
     """主函数"""
-    try:
-        from fake_useragent import UserAgent
-    except ImportError:
+    # 只检查依赖是否存在，不在启动时导入
+    import importlib.util
+    if importlib.util.find_spec('fake_useragent') is None:
         print(f"{Fore.YELLOW}⚠️  缺少依赖库: fake_useragent")
         print(f"{Fore.YELLOW}正在安装依赖库...")
         import subprocess
@@ -10,6 +10,7 @@ from colorama import Fore
 from openpyxl import Workbook
 from openpyxl.styles import Border, Side, Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
+from 账单规范 import BILL_DB_PATH, convert_bills, save_bills, write_bill_sheet
 # 关闭urllib3的HTTPS警告
 import urllib3
 
@@ -88,6 +89,14 @@ def init_excel_style(ws, headers, column_widths):
     return thin_border, content_font, content_align
 
 
+def collect_bills():
+    """BILL_CONTAINER 中的账单转换为统一规范账单（容器的键为登录账号）"""
+    bills = []
+    for account, account_bills in BILL_CONTAINER.items():
+        bills.extend(convert_bills(account_bills, '天机', account))
+    return bills
+
+
 def generate_excel():
     """生成包含天机平台结果的Excel（从全局容器读取数据）"""
     save_path = get_save_path(CONFIG["common"])
@@ -107,22 +116,10 @@ def generate_excel():
             cell.alignment = align
             cell.border = border
 
-    # 天机账单表（从BILL_CONTAINER读取）
-    all_bills = []
-    for account, bills in BILL_CONTAINER.items():
-        all_bills.extend(bills)
+    # 天机账单表（从BILL_CONTAINER读取，按统一账单规范导出）
+    all_bills = collect_bills()
     if all_bills:
-        tj_bill_ws = wb.create_sheet(title="天机平台-账单")
-        tj_bill_headers = list(all_bills[0].keys()) if all_bills else []
-        tj_bill_widths = [15] * len(tj_bill_headers) if tj_bill_headers else []
-        if tj_bill_headers:
-            border, font, align = init_excel_style(tj_bill_ws, tj_bill_headers, tj_bill_widths)
-            for row_idx, bill in enumerate(all_bills, 2):
-                for col_idx, key in enumerate(tj_bill_headers, 1):
-                    cell = tj_bill_ws.cell(row=row_idx, column=col_idx, value=bill[key])
-                    cell.font = font
-                    cell.alignment = align
-                    cell.border = border
+        write_bill_sheet(wb.create_sheet(title="天机平台-账单"), all_bills, "天机平台账单", sort_by_time=True)
 
     wb.save(excel_path)
     print(f"✅ Excel文件已保存：{excel_path}")
@@ -533,6 +530,11 @@ def main():
     # 执行查询（数据自动存入全局容器）
     tianji_client.run()
 
+    # 账单写入共用账单库
+    added = save_bills(collect_bills(), '天机.py')
+    if added:
+        print(f"{Fore.GREEN}💾 新增{added}条账单已写入账单库：{BILL_DB_PATH}")
+
     # 生成结果文件（从全局容器读取数据）
     print(f"\n{Fore.CYAN}===== 开始生成汇总文件 =====\n")
     generate_excel()
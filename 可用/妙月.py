@@ -2,6 +2,7 @@ import requests
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from 账单规范 import BILL_DB_PATH, convert_bills, save_bills
 
 # 配置账号信息
 ACCOUNTS = {
@@ -271,6 +272,14 @@ def main():
     # 全局汇总
     print_total_summary()
 
+    # 账单按统一规范写入共用账单库（运行 账单规范.py 可导出Excel）
+    bills = []
+    for username, bill_data in all_bill_raw_data.items():
+        bills.extend(convert_bills(bill_data.get("object", {}).get("records", []), '妙月', username))
+    added = save_bills(bills, '妙月.py')
+    if added:
+        print(f"\n💾 新增{added}条账单已写入账单库：{BILL_DB_PATH}")
+
     # 可选：打印备用数据的存储提示
     print(f"\n💾 备用数据说明：")
     print(f"   - 余额全字段已保存至 all_balance_raw_data 字典（key=账号名）")
@@ -3,6 +3,7 @@ import random
 import time
 import os
 from openpyxl import Workbook
+from 账单规范 import BILL_DB_PATH, convert_bills, save_bills, write_bill_sheet
 
 # ===================== 内置配置 =====================
 CONFIG = {
@@ -229,12 +230,11 @@ def export_excel():
     else:
         ws_balance.append(["无有效余额数据"])
 
+    # 账单按统一账单规范导出
     ws_bill = wb.create_sheet("账单汇总")
     if SUMMARY_DATA["bill_summary"]:
-        headers = ["username"] + dc["bill_fields"]
-        ws_bill.append(headers)
-        for item in SUMMARY_DATA["bill_summary"]:
-            ws_bill.append([item.get(h, "-") for h in headers])
+        bills = convert_bills(SUMMARY_DATA["bill_summary"], '小台风')
+        write_bill_sheet(ws_bill, bills, "小台风账单汇总", sort_by_time=True)
     else:
         ws_bill.append(["无有效账单数据"])
 
@@ -351,6 +351,12 @@ def main():
         process_single_account(account)
 
     generate_summary()
+
+    # 账单写入共用账单库
+    added = save_bills(convert_bills(SUMMARY_DATA["bill_summary"], '小台风'), '小台风.py')
+    if added:
+        print(f"\n💾 新增{added}条账单已写入账单库：{BILL_DB_PATH}")
+
     if CONFIG["data_clean"]["output_format"] in ["excel", "both"]:
         export_excel()
 
@@ -0,0 +1,417 @@
+# bill_schema.py
+"""
+多平台账单统一规范：字段编码与类型、旧格式转换、本地存储和Excel导出
+
+各查账脚本产生的账单格式不同：
+  V1      多平台查账导出.py      中文字段名（'订单号'、'佣金（元）'…），空值为""或0
+  V2      YYCX/SK/SK.py          字段编码（'order_no'、'commission'…），空值为""
+  天机    天机.py                BILL_CONTAINER 中的中文字段（'订单编号'、'交易金额(利润)'…），空值为"无"
+  妙月    妙月.py                接口原始字段（'orderNo'、'billAmount'…）
+  小台风  小台风.py              清洗后的接口字段（'profit'、'createtime'…），空值为"-"
+全部先转换成规范账单（字段编码 + 固定类型：文本为str、空值""，金额为float、空值None），
+再由 BillStore 和 write_bill_sheet 统一存储和导出，缓存、去重、导出只需实现一次。
+"""
+import os
+import math
+import sqlite3
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterable
+
+# 规范版本：1=V1中文字段，2=V2字段编码，3=字段编码+固定类型（金额空值为None）
+BILL_SCHEMA_VERSION = 3
+
+# (字段编码, 字段名称, 类型, 列宽)，顺序即导出列顺序
+BILL_FIELDS = [
+    ('order_no', '订单号', str, 18),
+    ('iccid', 'ICCID', str, 20),
+    ('card_number', '卡号', str, 15),
+    ('trans_time', '交易时间', str, 20),
+    ('sale_price', '售价（元）', float, 10),
+    ('cost_price', '成本（元）', float, 10),
+    ('commission', '佣金（元）', float, 10),
+    ('customer_name', '客户名称', str, 20),
+    ('product_name', '套餐/产品名称', str, 25),
+    ('operator', '运营商', str, 10),
+    ('income_type', '收入类型', str, 10),
+    ('remark', '备注', str, 15),
+    ('platform', '平台', str, 10),
+    ('account', '账号', str, 15),
+]
+BILL_CODES = [code for code, _, _, _ in BILL_FIELDS]
+FIELD_NAMES = {code: name for code, name, _, _ in BILL_FIELDS}  # 字段编码 -> 字段名称
+AMOUNT_CODES = {code for code, _, kind, _ in BILL_FIELDS if kind is float}
+CENTER_CODES = {'operator', 'income_type', 'platform', 'account'}
+
+BILL_DB_PATH = os.path.join(os.path.expanduser('~'), "多平台账单.db")  # 各脚本共用的账单库
+
+# 天机账单中规范字段没有对应位置的列，转换时保留在备注里
+TIANJI_EXTRA_COLUMNS = ['账单ID', '手续费', '提现单号', '账单状态']
+
+# 各平台表示“无数据”的占位值
+EMPTY_TEXTS = {'', '未采集', '无', '-', '无交易时间', '未知时间', 'None', 'nan'}
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y%m%d %H:%M:%S',
+    '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M', '%Y年%m月%d日 %H:%M:%S', '%Y-%m-%d'
+]
+
+
+# ======================== 类型转换 ========================
+def to_text(value: Any) -> str:
+    """转为去空白的文本，None/NaN和占位值为空字符串"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    text = str(value).strip()
+    return "" if text in EMPTY_TEXTS else text
+
+
+def to_amount(value: Any) -> Optional[float]:
+    """转为金额（支持“12.50 元”），空值或无法解析时为None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None if isinstance(value, float) and math.isnan(value) else float(value)
+    text = to_text(value).replace('元', '').replace(',', '').strip()
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def to_datetime_text(value: Any) -> str:
+    """时间统一为 YYYY-MM-DD HH:MM:SS，支持常见格式和秒/毫秒时间戳，无法识别时原样保留"""
+    text = to_text(value)
+    if not text:
+        return ""
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    if text.isdigit() and len(text) in (10, 13):
+        timestamp = int(text) / (1000 if len(text) == 13 else 1)
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+    return text
+
+
+def standardize_operator(value: Any) -> str:
+    """运营商统一为 中国移动/中国电信/中国联通，其余原样保留"""
+    text = to_text(value)
+    upper = text.upper()
+    if 'CM' in upper or '移动' in text:
+        return "中国移动"
+    if '电信' in text or 'TELECOM' in upper:
+        return "中国电信"
+    if '联通' in text or 'UNICOM' in upper:
+        return "中国联通"
+    return text
+
+
+def classify_income_type(amount: Optional[float], remarks: str = "", bill_type: str = "",
+                         income_type: str = "") -> str:
+    """收入类型归类（与V1规则一致），用于本身不带收入类型的独立脚本格式"""
+    remarks = to_text(remarks).lower()
+    income_type = to_text(income_type).lower()
+    bill_type = to_text(bill_type)
+
+    if amount is not None and amount < 0:
+        if "提现" in remarks or "withdraw" in remarks or bill_type == "userWithdraw":
+            return "提现支出"
+        if "退款" in remarks or "refund" in remarks or bill_type == "orderRefundBill":
+            return "退款"
+        return "其他支出"
+
+    if bill_type:
+        return {"orderCommissionBill": "佣金收入", "userWithdraw": "提现支出",
+                "orderRefundBill": "退款"}.get(bill_type, f"其他-{bill_type}")
+    for text in (remarks, income_type):
+        if "续费" in text:
+            return "续费"
+        if "出售" in text or "套餐" in text:
+            return "出售套餐"
+    return "未分类"
+
+
+def make_bill(**values: Any) -> Dict[str, Any]:
+    """按规范字段和类型生成账单记录（缺少的字段补空值）"""
+    bill = {}
+    for code, _, kind, _ in BILL_FIELDS:
+        value = values.get(code)
+        bill[code] = to_amount(value) if kind is float else to_text(value)
+    bill['trans_time'] = to_datetime_text(bill['trans_time'])
+    bill['iccid'] = bill['iccid'].upper()
+    return bill
+
+
+# ======================== 旧格式转换 ========================
+def from_v1(record: Dict[str, Any], account: str = "") -> Dict[str, Any]:
+    """V1（多平台查账导出.py，中文字段名）"""
+    values = {code: record.get(name) for code, name, _, _ in BILL_FIELDS}
+    # V1 中妙月没有售价和成本，填的是0.0
+    if record.get('平台') == '妙月':
+        values['sale_price'] = values['cost_price'] = None
+    values['account'] = values['account'] or account
+    return make_bill(**values)
+
+
+def from_v2(record: Dict[str, Any], account: str = "") -> Dict[str, Any]:
+    """V2（SK.py，字段编码，空值为""）"""
+    values = {code: record.get(code) for code in BILL_CODES}
+    values['account'] = values['account'] or account
+    return make_bill(**values)
+
+
+def from_tianji_script(record: Dict[str, Any], account: str = "") -> Dict[str, Any]:
+    """天机.py 的 BILL_CONTAINER 记录（其中“账号”实为公司名称，登录账号取容器的键）"""
+    commission = to_amount(record.get('交易金额(利润)'))
+    remarks = f"{to_text(record.get('备注'))} {to_text(record.get('交易类型'))}"
+    # 规范字段里没有的列放进备注，账单ID也因此参与指纹，同一订单的多条流水不会被合并
+    extras = [f"{name}:{to_text(record.get(name))}" for name in TIANJI_EXTRA_COLUMNS if to_text(record.get(name))]
+    return make_bill(
+        order_no=record.get('订单编号'),
+        trans_time=to_text(record.get('实际交易时间')) or record.get('交易时间'),
+        sale_price=record.get('收入金额'),
+        cost_price=record.get('成本金额'),
+        commission=commission,
+        customer_name=record.get('公司名称'),
+        income_type=classify_income_type(commission, remarks),
+        remark=" ".join([to_text(record.get('备注'))] + extras).strip(),
+        platform='天机',
+        account=account,
+    )
+
+
+def from_miaoyue_script(record: Dict[str, Any], account: str = "") -> Dict[str, Any]:
+    """妙月.py 保存的接口原始账单（all_bill_raw_data[账号]['object']['records']）"""
+    amount = to_amount(record.get('billAmount'))
+    order_no = to_text(record.get('orderNo'))
+    return make_bill(
+        order_no=order_no,
+        iccid=record.get('cardIccid'),
+        card_number=record.get('cardNumber'),
+        trans_time=record.get('createTime'),
+        commission=amount,
+        product_name=f"订单号: {order_no}" if order_no else "",
+        income_type=classify_income_type(amount, record.get('remarks'), record.get('billType')),
+        remark=record.get('remarks'),
+        platform='妙月',
+        account=account,
+    )
+
+
+def from_xiaotaifeng_script(record: Dict[str, Any], account: str = "") -> Dict[str, Any]:
+    """小台风.py 清洗后的账单（SUMMARY_DATA['bill_summary']，空值为"-"）"""
+    amount = to_amount(record.get('amount'))
+    profit = to_amount(record.get('profit'))
+    cost = round(amount - profit, 2) if amount is not None and profit is not None and amount > 0 else None
+    return make_bill(
+        order_no=record.get('id'),  # 小台风没有订单号，用账单ID区分同一时间的多条账单
+        trans_time=record.get('createtime'),
+        sale_price=amount,
+        cost_price=cost,
+        commission=profit,
+        customer_name=record.get('account'),
+        product_name=record.get('productname'),
+        operator=standardize_operator(record.get('yunyingshang')),
+        income_type=classify_income_type(profit, income_type=record.get('incometype')),
+        platform='小台风',
+        account=to_text(record.get('username')) or account,
+    )
+
+
+LEGACY_CONVERTERS = {
+    'v1': from_v1,
+    'v2': from_v2,
+    '天机': from_tianji_script,
+    '妙月': from_miaoyue_script,
+    '小台风': from_xiaotaifeng_script,
+}
+
+
+def convert_bills(records: Iterable[Dict[str, Any]], layout: str, account: str = "") -> List[Dict[str, Any]]:
+    """把某种旧格式的账单批量转换为规范账单"""
+    converter = LEGACY_CONVERTERS[layout]
+    return [converter(record, account) for record in records]
+
+
+def bill_key(bill: Dict[str, Any]) -> str:
+    """账单指纹：全部规范字段相同视为同一条账单（重复查询不会重复入库）"""
+    raw = "\x1f".join("" if bill[code] is None else str(bill[code]) for code in BILL_CODES)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# ======================== 本地存储 ========================
+class BillStore:
+    """规范账单的SQLite存储，所有查账脚本写入同一个库，按账单指纹去重"""
+
+    def __init__(self, db_path: str = BILL_DB_PATH):
+        self.db_path = db_path
+        columns = ", ".join(
+            f"{code} {'REAL' if kind is float else 'TEXT'}" for code, _, kind, _ in BILL_FIELDS
+        )
+        with self._connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > BILL_SCHEMA_VERSION:
+                raise RuntimeError(f"账单库版本({version})高于当前程序支持的版本({BILL_SCHEMA_VERSION})，请更新程序")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS bills (bill_key TEXT PRIMARY KEY, {columns}, "
+                f"source TEXT, saved_at TEXT) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bills_account ON bills (platform, account, trans_time)")
+            conn.execute(f"PRAGMA user_version = {BILL_SCHEMA_VERSION}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save(self, bills: List[Dict[str, Any]], source: str) -> int:
+        """保存规范账单，返回新增条数"""
+        saved_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [(bill_key(bill), *(bill[code] for code in BILL_CODES), source, saved_at) for bill in bills]
+        placeholders = ", ".join("?" * (len(BILL_CODES) + 3))
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO bills (bill_key, {', '.join(BILL_CODES)}, source, saved_at) "
+                f"VALUES ({placeholders})",
+                rows
+            )
+            return conn.total_changes - before
+
+    def load(self, platform: Optional[str] = None, account: Optional[str] = None) -> List[Dict[str, Any]]:
+        """读取规范账单（按交易时间降序），可按平台、账号筛选"""
+        conditions, params = [], []
+        if platform:
+            conditions.append("platform = ?")
+            params.append(platform)
+        if account:
+            conditions.append("account = ?")
+            params.append(account)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(BILL_CODES)} FROM bills {where} ORDER BY trans_time DESC", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def save_bills(bills: List[Dict[str, Any]], source: str, db_path: str = BILL_DB_PATH) -> int:
+    """把规范账单写入共用账单库，返回新增条数；入库失败不影响各脚本的正常导出"""
+    if not bills:
+        return 0
+    try:
+        return BillStore(db_path).save(bills, source)
+    except (sqlite3.Error, RuntimeError, OSError) as e:
+        print(f"⚠️  账单入库失败：{e}")
+        return 0
+
+
+# ======================== Excel导出 ========================
+BILL_STYLES = ('账单标题', '账单表头', '账单文本', '账单居中', '账单金额')
+
+
+def _register_bill_styles(wb):
+    """注册账单表的命名样式（每个工作簿一次），单元格只需引用样式名"""
+    if BILL_STYLES[0] in wb.named_styles:
+        return
+    from openpyxl.styles import NamedStyle, Border, Side, Font, PatternFill, Alignment
+
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    data_font = Font(name='微软雅黑', size=10)
+
+    title = NamedStyle(name='账单标题')
+    title.font = Font(name='微软雅黑', size=14, bold=True, color='000000')
+    title.alignment = Alignment(horizontal='center', vertical='center')
+    title.fill = PatternFill(start_color='FFE699', end_color='FFE699', fill_type='solid')
+
+    header = NamedStyle(name='账单表头')
+    header.font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
+    header.fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header.alignment = Alignment(horizontal='center', vertical='center')
+    header.border = border
+
+    text = NamedStyle(name='账单文本', font=data_font, border=border,
+                      alignment=Alignment(horizontal='left', vertical='center'))
+    center = NamedStyle(name='账单居中', font=data_font, border=border,
+                        alignment=Alignment(horizontal='center', vertical='center'))
+    amount = NamedStyle(name='账单金额', font=data_font, border=border, number_format='0.00',
+                        alignment=Alignment(horizontal='right', vertical='center'))
+    for style in (title, header, text, center, amount):
+        wb.add_named_style(style)
+
+
+def write_bill_sheet(ws, bills: List[Dict[str, Any]], sheet_title: str, sort_by_time: bool = False):
+    """把规范账单写入工作表：第1行标题、第2行表头、第3行起数据，冻结表头
+
+    sort_by_time 时按交易时间降序，没有交易时间的账单排在最后。
+    样式按列预先确定，逐行追加后只引用命名样式名，不逐格创建字体、边框对象。
+    """
+    from openpyxl.utils import get_column_letter
+
+    if not bills:
+        ws.append(["无数据"])
+        return
+    _register_bill_styles(ws.parent)
+
+    if sort_by_time:
+        bills = sorted(bills, key=lambda bill: bill['trans_time'], reverse=True)
+
+    ws.append([sheet_title])
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(BILL_FIELDS))
+    ws.cell(row=1, column=1).style = '账单标题'
+    ws.append([name for _, name, _, _ in BILL_FIELDS])
+    for col_idx, (_, _, _, width) in enumerate(BILL_FIELDS, 1):
+        ws.cell(row=2, column=col_idx).style = '账单表头'
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    column_styles = [
+        '账单金额' if code in AMOUNT_CODES else '账单居中' if code in CENTER_CODES else '账单文本'
+        for code in BILL_CODES
+    ]
+    for row_idx, bill in enumerate(bills, 3):
+        for col_idx, (code, style) in enumerate(zip(BILL_CODES, column_styles), 1):
+            value = bill[code]
+            ws.cell(row=row_idx, column=col_idx, value=None if value == "" else value).style = style
+
+    ws.sheet_format.defaultRowHeight = 20
+    ws.sheet_format.customHeight = True
+    ws.freeze_panes = ws['A3']
+
+
+def export_bills_to_excel(excel_file: str, sheets: Dict[str, List[Dict[str, Any]]]):
+    """把若干组规范账单写入新工作簿（{工作表名: 账单列表}），全部按交易时间降序"""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    del wb[wb.active.title]
+    for title, bills in sheets.items():
+        write_bill_sheet(wb.create_sheet(title=title), bills, title, sort_by_time=True)
+    if not wb.worksheets:
+        wb.create_sheet(title="无数据")
+    wb.save(excel_file)
+
+
+# ======================== 主程序入口 ========================
+def main():
+    """导出共用账单库中的全部账单到桌面（总表 + 各平台分表）"""
+    bills = BillStore().load()
+    if not bills:
+        print(f"⚠️  账单库中暂无数据：{BILL_DB_PATH}")
+        return
+
+    sheets = {"多平台账单汇总": bills}
+    for platform in ['天机', '小台风', '妙月']:
+        platform_bills = [bill for bill in bills if bill['platform'] == platform]
+        if platform_bills:
+            sheets[f"{platform}账单"] = platform_bills
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    excel_file = os.path.join(os.path.expanduser('~'), 'Desktop', f"账单库导出_{timestamp}.xlsx")
+    export_bills_to_excel(excel_file, sheets)
+    print(f"✅ 共导出{len(bills)}条账单：{excel_file}")
+
+
+if __name__ == "__main__":
+    main()